@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+'''
+Project serialization benchmark
+
+Compares serializing and deep-copying a generated project with the
+per-call MRO walk used previously by
+:meth:`esppy.base.ESPObject._get_attributes` and with the descriptor
+tables computed once per class.
+
+Usage::
+
+    python benchmarks/bench_attributes.py [--windows N] [--repeat N]
+
+'''
+
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import argparse
+import copy
+import time
+from esppy.base import Attribute, ESPObject
+from esppy.contquery import ContinuousQuery
+from esppy.project import Project
+from esppy.windows import SourceWindow, CopyWindow, FilterWindow, ComputeWindow
+
+SCHEMA = ('id*:int64', 'symbol:string', 'price:double', 'qty:int32')
+
+
+def legacy_get_attributes(self, use_xml_values=True):
+    ''' Attribute lookup by walking the MRO, as done before the class tables '''
+    xml_map = dict(getattr(type(self), 'xml_map', {}))
+    xml_map['name'] = 'name'
+    xml_map['contquery'] = 'contquery'
+    xml_map['project'] = 'project'
+
+    out = {}
+
+    for cls in reversed(type(self).__mro__):
+        for key, value in vars(cls).items():
+            if isinstance(value, Attribute):
+                if use_xml_values:
+                    val = value.get_xml_value(self)
+                    if val is not None:
+                        out[value.name] = val
+                else:
+                    val = value.get_value(self)
+                    if val is not None:
+                        out[key] = val
+
+    for attr_name, xml_name in xml_map.items():
+        value = getattr(self, attr_name, None)
+        if value is not None:
+            if use_xml_values:
+                if type(value) is bool:
+                    out[xml_name] = value and 'true' or 'false'
+                else:
+                    out[xml_name] = '%s' % value
+            else:
+                out[attr_name] = value
+
+    return out
+
+
+def make_project(nwindows):
+    ''' Generate a project with chains of windows '''
+    proj = Project('p', n_threads=4, pubsub='auto')
+    query = ContinuousQuery('cq', trace='src_0')
+    proj.add_query(query)
+
+    classes = [CopyWindow, FilterWindow, ComputeWindow]
+    src = None
+    for i in range(nwindows):
+        if i % 10 == 0:
+            src = SourceWindow(schema=SCHEMA, name='src_%d' % i, index_type='pi_HASH',
+                               insert_only=True, autogen_key=False)
+            query.add_window(src)
+            continue
+        wcls = classes[i % len(classes)]
+        win = wcls(name='w_%d' % i, pubsub=True, output_insert_only=False,
+                   index_type='pi_RBTREE')
+        if wcls is ComputeWindow:
+            win.schema = SCHEMA
+        query.add_window(win)
+        src.add_target(win)
+        src = win
+
+    return proj
+
+
+def timeit(func, repeat):
+    ''' Return the best time of `repeat` calls '''
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--windows', type=int, default=3000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    proj = make_project(args.windows)
+
+    cases = [
+        ('to_xml', lambda: proj.to_xml()),
+        ('copy', lambda: copy.deepcopy(proj)),
+    ]
+
+    current = ESPObject._get_attributes
+
+    print('%-8s %12s %12s %8s' % ('case', 'before (s)', 'after (s)', 'speedup'))
+    for name, func in cases:
+        ESPObject._get_attributes = legacy_get_attributes
+        try:
+            tbefore = timeit(func, args.repeat)
+        finally:
+            ESPObject._get_attributes = current
+        tafter = timeit(func, args.repeat)
+        print('%-8s %12.3f %12.3f %7.1fx' % (name, tbefore, tafter, tbefore / tafter))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,342 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+'''
+Binary message codec benchmark
+
+Compares the byte-at-a-time ubjson decoder previously used by
+:class:`esppy.espapi.codec.JsonDecoder` with the memoryview-based
+decoder, in both nested and column output modes.  The second table
+includes building the event DataFrame.  The last table compares
+encoding a DataFrame row by row, as publishing did previously, with
+the column block encoder of :class:`esppy.espapi.codec.JsonEncoder`.
+
+Frames are generated, or read from a file of recorded frames where
+each frame is preceded by its length as a 4-byte big-endian integer.
+
+Usage::
+
+    python benchmarks/bench_codec.py [--events N] [--frames FILE] [--repeat N]
+
+'''
+
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import argparse
+import io
+import struct
+import time
+import numpy as np
+import pandas as pd
+from base64 import b64encode
+from esppy.espapi import codec
+from esppy.schema import Schema
+from esppy.utils.events import get_decoder
+
+SCHEMA = 'id*:int64,symbol:string,price:double,qty:int32,stamp:stamp'
+
+
+class LegacyJsonDecoder(object):
+    ''' The decoder as it was before the memoryview rewrite '''
+
+    def __init__(self, data):
+        self._data = data
+        self._size = len(self._data)
+        self._index = 0
+        self._o = None
+        self.addTo(None, None)
+
+    def addTo(self, name, to):
+        type = self.getType(True)
+        if type == '{':
+            self.addObject(name, to)
+        elif type == '[':
+            self.addArray(name, to)
+        else:
+            self.addValue(name, to)
+
+    def addObject(self, name, to):
+        o = {}
+        if self._o is None:
+            self._o = o
+        elif isinstance(to, list):
+            to.append(o)
+        else:
+            to[name] = o
+        while self._index < self._size:
+            type = self.getType(False)
+            if type == '}':
+                self._index += 1
+                break
+            length = self.getLength()
+            name = self.getString(length)
+            type = self.getType(False)
+            if type in '{[':
+                self.addTo(name, o)
+            else:
+                self.addValue(name, o)
+
+    def addArray(self, name, to):
+        a = []
+        if self._o is None:
+            self._o = a
+        elif isinstance(to, list):
+            to.append(a)
+        else:
+            to[name] = a
+        while self._index < self._size:
+            type = self.getType(False)
+            if type == ']':
+                self._index += 1
+                break
+            elif type in '{[':
+                self.addTo('', a)
+            else:
+                self.addValue('', a)
+
+    def addValue(self, name, to):
+        type = self.getType(True)
+        value = None
+        if type == 'S':
+            length = self.getLength()
+            if length > 0:
+                value = self._data[self._index:self._index + length].decode('utf-8')
+                self._index += length
+        elif type == 'B':
+            length = self.getLength()
+            if length > 0:
+                value = b64encode(self._data[self._index:self._index + length]).decode('utf-8')
+                self._index += length
+        elif type == 'l':
+            value = self.getI32()
+        elif type == 'L':
+            value = self.getI64()
+        elif type == 'D':
+            value = self.getDouble()
+        if value is not None:
+            if isinstance(to, list):
+                to.append(value)
+            else:
+                to[name] = value
+
+    def getType(self, increment):
+        type = chr(self._data[self._index])
+        if increment:
+            self._index += 1
+        return type
+
+    def getLength(self):
+        length = int.from_bytes(self._data[self._index:self._index + 4], byteorder='big')
+        self._index += 4
+        return length
+
+    def getString(self, length):
+        value = self._data[self._index:self._index + length].decode('utf-8')
+        self._index += length
+        return value
+
+    def getI32(self):
+        value = int.from_bytes(self._data[self._index:self._index + 4], byteorder='big')
+        self._index += 4
+        return value
+
+    def getI64(self):
+        value = int.from_bytes(self._data[self._index:self._index + 8], byteorder='big')
+        self._index += 8
+        return value
+
+    def getDouble(self):
+        value = struct.unpack('>d', self._data[self._index:self._index + 8])[0]
+        self._index += 8
+        return value
+
+    @property
+    def data(self):
+        return self._o
+
+
+class LegacyJsonEncoder(object):
+    ''' The encoder as it was before typed values and column blocks '''
+
+    def __init__(self, o):
+        self._data = io.BytesIO()
+        self.encode(o, None)
+
+    def encode(self, o, name):
+        if isinstance(o, list):
+            self.writeName(name)
+            self._data.write(b'[')
+            for item in o:
+                self.encode(item, None)
+            self._data.write(b']')
+        elif isinstance(o, dict):
+            self.writeName(name)
+            self._data.write(b'{')
+            for x in o:
+                self.encode(o[x], x)
+            self._data.write(b'}')
+        else:
+            s = str(o)
+            self.writeName(name)
+            self._data.write(b'S')
+            self._data.write(len(s).to_bytes(4, byteorder='big'))
+            self._data.write(s.encode('utf-8'))
+
+    def writeName(self, name):
+        if name is not None and len(name) > 0:
+            self._data.write(len(name).to_bytes(4, byteorder='big'))
+            self._data.write(name.encode('utf-8'))
+
+    @property
+    def data(self):
+        return self._data.getvalue()
+
+
+def make_dataframe(nevents):
+    ''' Generate a DataFrame of events to publish '''
+    return pd.DataFrame({'id': np.arange(nevents, dtype=np.int64),
+                         'symbol': ['SYM%d' % (i % 100) for i in range(nevents)],
+                         'price': np.arange(nevents) * 1.5,
+                         'qty': np.arange(nevents, dtype=np.int32) % 1000,
+                         'stamp': 1500000000000000 + np.arange(nevents, dtype=np.int64)})
+
+
+def legacy_encode(df, size):
+    ''' Row-by-row publishing as done before the column block encoder '''
+    out = []
+    data = []
+    for index, row in df.iterrows():
+        o = {}
+        for col in df.columns:
+            o[col] = row[col]
+        data.append(o)
+        if len(data) == size:
+            out.append(LegacyJsonEncoder({'publisher': {'id': 'bench', 'data': data}}).data)
+            data = []
+    if data:
+        out.append(LegacyJsonEncoder({'publisher': {'id': 'bench', 'data': data}}).data)
+    return out
+
+
+def block_encode(df, size):
+    ''' Column block encoding into a reused buffer '''
+    encoder = codec.JsonEncoder()
+    out = []
+    for start in range(0, len(df), size):
+        encoder.reset()
+        encoder.encode({'publisher': {'id': 'bench', 'data': df.iloc[start:start + size]}}, None)
+        out.append(encoder.data)
+    return out
+
+
+def make_frames(nevents, blocksize=500):
+    ''' Generate event frames like those sent to event collections '''
+    frames = []
+    for start in range(0, nevents, blocksize):
+        entries = []
+        for i in range(start, min(nevents, start + blocksize)):
+            entries.append({'@opcode': 'insert', 'id': str(i), 'symbol': 'SYM%d' % (i % 100),
+                            'price': str(i * 1.5), 'qty': str(i % 1000),
+                            'stamp': str(1500000000000000 + i)})
+        frames.append(codec.JsonEncoder({'events': {'@id': 'bench',
+                                                    'entries': entries}}).data)
+    return frames
+
+
+def read_frames(path):
+    ''' Read length-prefixed recorded frames '''
+    frames = []
+    with open(path, 'rb') as infile:
+        data = infile.read()
+    index = 0
+    while index + 4 <= len(data):
+        length = struct.unpack_from('>I', data, index)[0]
+        frames.append(data[index + 4:index + 4 + length])
+        index += 4 + length
+    return frames
+
+
+def timeit(func, repeat):
+    ''' Return the best time of `repeat` calls '''
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--events', type=int, default=20000)
+    parser.add_argument('--frames', help='file of length-prefixed recorded frames')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    frames = args.frames and read_frames(args.frames) or make_frames(args.events)
+    nbytes = sum(len(x) for x in frames)
+
+    cases = [
+        ('legacy', lambda: [LegacyJsonDecoder(x).data for x in frames]),
+        ('nested', lambda: [codec.JsonDecoder(x).data for x in frames]),
+        ('columns', lambda: [codec.JsonDecoder(x, columns=True).data for x in frames]),
+    ]
+
+    decoder = get_decoder(Schema.from_string(SCHEMA))
+
+    def entries(message):
+        return message['events']['entries']
+
+    frame_cases = [
+        ('legacy', lambda: [decoder.decode_records(entries(LegacyJsonDecoder(x).data))
+                            for x in frames]),
+        ('nested', lambda: [decoder.decode_records(entries(codec.JsonDecoder(x).data))
+                            for x in frames]),
+        ('columns', lambda: [decoder.decode_columns(
+                                 entries(codec.JsonDecoder(x, columns=True).data))
+                             for x in frames]),
+    ]
+
+    print('%d frames, %.1f MB' % (len(frames), nbytes / 1e6))
+    for title, items in [('decode', cases), ('decode + DataFrame', frame_cases)]:
+        print('\n%s' % title)
+        print('%-8s %10s %8s' % ('decoder', 'MB/s', 'speedup'))
+        baseline = None
+        for name, func in items:
+            elapsed = timeit(func, args.repeat)
+            baseline = baseline or elapsed
+            print('%-8s %10.1f %7.1fx' % (name, nbytes / elapsed / 1e6, baseline / elapsed))
+
+    df = make_dataframe(args.events)
+    encode_cases = [
+        ('legacy', lambda: legacy_encode(df, 500)),
+        ('blocks', lambda: block_encode(df, 500)),
+    ]
+
+    print('\nencode DataFrame (%d events)' % args.events)
+    print('%-8s %10s %8s' % ('encoder', 'ev/s', 'speedup'))
+    baseline = None
+    for name, func in encode_cases:
+        elapsed = timeit(func, args.repeat)
+        baseline = baseline or elapsed
+        print('%-8s %10.0f %7.1fx' % (name, args.events / elapsed, baseline / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+'''
+Event decoding benchmark
+
+Compares the per-cell event parsing used previously by
+:func:`esppy.utils.events.get_events` with the schema-compiled
+column decoder.
+
+Usage::
+
+    python benchmarks/bench_events.py [--events N] [--repeat N]
+
+'''
+
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import argparse
+import time
+import xml.etree.ElementTree as ET
+import pandas as pd
+from esppy.schema import Schema
+from esppy.utils.events import ESP2PY_MAP, get_events
+
+SCHEMA = 'id*:int64,symbol:string,price:double,qty:int32,stamp:stamp,flag:int64'
+
+
+def make_xml(nevents):
+    ''' Generate an XML event block '''
+    out = ['<events>']
+    for i in range(nevents):
+        out.append('<event opcode="insert" window="p/cq/w">'
+                   '<id key="true">%d</id><symbol>SYM%d</symbol>'
+                   '<price>%f</price><qty>%d</qty><stamp>%d</stamp>'
+                   '<flag>%d</flag></event>' %
+                   (i, i % 100, i * 1.5, i % 1000, 1500000000000000 + i, i % 2))
+    out.append('</events>')
+    return ''.join(out)
+
+
+def make_csv(nevents):
+    ''' Generate CSV events '''
+    return '\n'.join('I,N,%d,SYM%d,%f,%d,%d,%d' %
+                     (i, i % 100, i * 1.5, i % 1000, 1500000000000000 + i, i % 2)
+                     for i in range(nevents))
+
+
+def legacy_xml(schema, data):
+    ''' Per-cell XML parsing as done before the column decoder '''
+    transformers = {}
+    columns = []
+    index = []
+    for field in schema.fields.values():
+        transformers[field.name] = ESP2PY_MAP.get(field.type, lambda x: x)
+        columns.append(field.name)
+        if field.key:
+            index.append(field.name)
+    rows = []
+    for event in ET.fromstring(data).findall('./event'):
+        row = dict()
+        for item in event.findall('./*'):
+            row[item.tag] = transformers.get(item.tag, lambda x: x)(item.text)
+        rows.append(row)
+    out = pd.DataFrame(rows)[columns]
+    for field in schema.fields.values():
+        if field.type == 'int32':
+            out[field.name] = out[field.name].astype('int32')
+    return out.set_index(index)
+
+
+def legacy_csv(schema, data):
+    ''' Per-cell CSV parsing as done before the column decoder '''
+    import csv
+    transformers = [ESP2PY_MAP.get(x.type, lambda x: x) for x in schema.fields.values()]
+    columns = list(schema.fields.keys())
+    index = [x.name for x in schema.fields.values() if x.key]
+    rows = []
+    for row in csv.reader(data.rstrip().split('\n')):
+        row = list(row)[2:]
+        for i, item in enumerate(row):
+            row[i] = transformers[i](item)
+        rows.append(row)
+    return pd.DataFrame(data=rows, columns=columns).set_index(index)
+
+
+def timeit(func, repeat):
+    ''' Return the best time of `repeat` calls '''
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--events', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    schema = Schema.from_string(SCHEMA)
+    xml_data = make_xml(args.events)
+    csv_data = make_csv(args.events)
+
+    cases = [
+        ('xml', lambda: legacy_xml(schema, xml_data),
+         lambda: get_events(schema, xml_data, single=True)),
+        ('csv', lambda: legacy_csv(schema, csv_data),
+         lambda: get_events(schema, csv_data, format='csv')),
+    ]
+
+    print('%-6s %15s %15s %8s' % ('format', 'before (ev/s)', 'after (ev/s)', 'speedup'))
+    for name, before, after in cases:
+        tbefore = timeit(before, args.repeat)
+        tafter = timeit(after, args.repeat)
+        print('%-6s %15.0f %15.0f %7.1fx' % (name, args.events / tbefore,
+                                             args.events / tafter, tbefore / tafter))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,1008 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+'''
+Asynchronous ESP interface
+
+The classes in this module run the REST requests and the websockets of
+subscribers and publishers on the running asyncio event loop, so any
+number of subscriptions can share one thread.  The `aiohttp` package
+is required.
+
+Examples
+--------
+>>> import esppy.aio
+>>> async with esppy.aio.AsyncESP('http://myesp.com:8777') as esp:
+...     info = await esp.get_server_info()
+...     async for df in esp.stream('project.contquery.window'):
+...         print(df)
+
+'''
+
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import asyncio
+import base64
+import collections
+import os
+import re
+import requests
+import six
+import ssl
+import sys
+import xml.etree.ElementTree as ET
+from six.moves import urllib
+from .config import get_option, ESP_ROOT
+from .project import Project
+from .utils.authorization import Authorization
+from .utils.data import get_project_data, gen_name, parse_server_info
+from .utils.events import get_dataframe, get_events, get_schema_cache
+from .utils.project import expand_path
+from .utils.rest import RESTHelpers, get_params
+from .windows import BaseWindow, get_window_class
+from .windows.publisher import Publisher
+from .windows.subscriber import Subscriber
+
+try:
+    import aiohttp
+    import yarl
+except ImportError:
+    raise ImportError('The esppy.aio module requires the aiohttp package')
+
+Response = collections.namedtuple('Response', ['status_code', 'content'])
+
+# Marks the end of a subscriber stream
+_END = object()
+
+
+def _create_session(hostname=None, port=None, username=None, password=None,
+                    protocol=None, ca_bundle=None):
+    ''' Create a session that holds the URLs and credentials of a server '''
+    if hostname is None and get_option('hostname'):
+        hostname = get_option('hostname')
+    if port is None and get_option('port'):
+        port = int(get_option('port'))
+    if username is None and os.environ.get('ESPUSER'):
+        username = os.environ['ESPUSER']
+    if password is None and os.environ.get('ESPPASSWORD'):
+        password = os.environ['ESPPASSWORD']
+    if not protocol:
+        protocol = get_option('protocol') or (ca_bundle and 'https' or 'http')
+
+    if re.match('^https?://', hostname):
+        conn_url = base_url = hostname.rstrip('/') + '/'
+        if not re.search(r'%s/' % ESP_ROOT, base_url):
+            base_url = urllib.parse.urljoin(base_url, '%s/' % ESP_ROOT)
+    else:
+        conn_url = '%s://%s:%s' % (protocol, hostname, port)
+        base_url = '%s://%s:%s/%s/' % (protocol, hostname, port, ESP_ROOT)
+
+    session = requests.Session()
+    session.conn_url = conn_url
+    session.base_url = base_url
+
+    if ca_bundle:
+        session.verify = ca_bundle != '_noverify_' and ca_bundle or False
+
+    auth = Authorization.getInstance(session)
+    if username and password:
+        auth.setBasic(username, password)
+        basic = base64.b64encode((username + ':' + password).encode()).decode()
+        session.headers.update({'Authorization': ('Basic ' + basic).encode('utf-8')})
+    elif password:
+        auth.setBearer(password)
+        session.headers.update({'Authorization': ('Bearer ' + password).encode('utf-8')})
+
+    return session
+
+
+class AsyncESP(RESTHelpers):
+    '''
+    Asynchronous ESP connection
+
+    The REST methods are coroutines that mirror the methods of
+    :class:`ESP`.  All requests and websockets share one
+    :class:`aiohttp.ClientSession`, which is created on the running
+    event loop when it is first used.
+
+    Parameters
+    ----------
+    hostname : string, optional
+        Hostname of ESP server or ESP connection URL
+    port : int, optional
+        Port number of ESP server.  This is not needed if
+        a URL is used in the first parameter.
+    username : string, optional
+        Username for authentication
+    password : string, optional
+        Password for authentication.  If a password is specified,
+        without a username, this is assumed to be an OAUTH token.
+    protocol : string, optional
+        The protocol to use: http or https.  This is not
+        needed if a URL is used in the first parameter.
+    ca_bundle : string, optional
+        Path to the certificate bundle if using SSL
+    session : requests.Session, optional
+        The session of an existing connection to take the URLs and
+        credentials from.  See :meth:`from_esp`.
+
+    Examples
+    --------
+    >>> esp = AsyncESP('http://esp-host.com:8080')
+    >>> await esp.get_running_projects()
+    >>> await esp.close()
+
+    Returns
+    -------
+    :class:`AsyncESP`
+
+    '''
+
+    def __init__(self, hostname=None, port=None, username=None, password=None,
+                 protocol=None, ca_bundle=None, session=None):
+        if session is None:
+            session = _create_session(hostname=hostname, port=port,
+                                      username=username, password=password,
+                                      protocol=protocol, ca_bundle=ca_bundle)
+        RESTHelpers.__init__(self, session=session)
+        self._client = None
+        self._server_info = None
+
+    @classmethod
+    def from_esp(cls, esp):
+        '''
+        Create an asynchronous connection to the server of a connection
+
+        Parameters
+        ----------
+        esp : ESP
+            The connection to take the URLs and credentials from
+
+        Returns
+        -------
+        :class:`AsyncESP`
+
+        '''
+        return cls(session=esp.session)
+
+    def __str__(self):
+        return '%s(%s)' % (type(self).__name__,
+                           repr(self.base_url.replace('/%s/' % ESP_ROOT, '')))
+
+    def __repr__(self):
+        return str(self)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    @property
+    def client(self):
+        ''' The HTTP client session of the connection '''
+        if self._client is None or self._client.closed:
+            verify = self.session.verify
+            if isinstance(verify, six.string_types):
+                verify = ssl.create_default_context(cafile=verify)
+            elif verify:
+                verify = None
+            connector = aiohttp.TCPConnector(limit_per_host=get_option('http.pool_size'),
+                                             ssl=verify)
+            self._client = aiohttp.ClientSession(connector=connector)
+        return self._client
+
+    @property
+    def headers(self):
+        ''' The headers sent with each request '''
+        out = {}
+        for key, value in self.session.headers.items():
+            if key.lower() in ['authorization', 'cookie']:
+                if isinstance(value, bytes):
+                    value = value.decode('utf-8')
+                out[key] = value
+        auth = Authorization.getInstance(self.session)
+        if 'Authorization' not in out and auth.isEnabled and auth.authorization:
+            out['Authorization'] = auth.authorization
+        return out
+
+    async def close(self):
+        ''' Close the HTTP client session '''
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+    async def _request(self, method, path=None, raw=False, data=None, **kwargs):
+        '''
+        Run a REST request
+
+        Parameters
+        ----------
+        method : string
+            The HTTP method
+        path : string, optional
+            Absolute or relative URL
+        raw : boolean, optional
+            Should the raw content be returned rather than an Element?
+        data : string or bytes, optional
+            The body of the request
+        **kwargs : keyword parameters, optional
+            URL parameters
+
+        Returns
+        -------
+        :class:`ElementTree.Element` or string
+
+        '''
+        if path and (path.startswith('http:') or path.startswith('https:')):
+            url = path
+        elif path:
+            url = urllib.parse.urljoin(self.url, path)
+        else:
+            url = self.url
+
+        url, kwargs = self._insert_params(url, **kwargs)
+
+        if get_option('debug.requests'):
+            sys.stderr.write('%s %s\n' % (method, url))
+
+        if get_option('debug.request_bodies') and data:
+            sys.stderr.write('%s\n' % data)
+
+        # The parameters are already encoded the way the server expects
+        async with self.client.request(method, yarl.URL(url, encoded=True),
+                                       data=data, headers=self.headers) as resp:
+            content = await resp.read()
+
+        self._error_check(Response(resp.status, content))
+
+        content = content.decode('utf-8')
+
+        if get_option('debug.responses'):
+            sys.stderr.write('%s\n' % content)
+
+        if method != 'GET':
+            self._invalidate_cache()
+
+        if raw:
+            return content
+
+        return ET.fromstring(content)
+
+    async def _get(self, path=None, raw=False, **kwargs):
+        ''' GET the specified path '''
+        return await self._request('GET', path, raw=raw, **kwargs)
+
+    async def _post(self, path=None, **kwargs):
+        ''' POST the specified path '''
+        return await self._request('POST', path, **kwargs)
+
+    async def _put(self, path=None, **kwargs):
+        ''' PUT the specified path '''
+        return await self._request('PUT', path, **kwargs)
+
+    async def _delete(self, path=None, **kwargs):
+        ''' DELETE the specified path '''
+        return await self._request('DELETE', path, **kwargs)
+
+    async def get_server_info(self):
+        '''
+        Retrieve information about the server
+
+        Returns
+        -------
+        dict
+
+        '''
+        if self._server_info is None:
+            self._server_info = parse_server_info(
+                await self._get('server', params=get_params(config=True)))
+        return self._server_info
+
+    def _projects_from_xml(self, data):
+        ''' Create projects from XML content '''
+        projects = dict()
+        for item in data.findall('./project'):
+            proj = Project.from_xml(item, session=self.session)
+            projects[proj.name] = proj
+        return projects
+
+    async def get_projects(self, name=None, filter=None):
+        '''
+        Retrieve projects from the server
+
+        Parameters
+        ----------
+        name : string or list-of-strings, optional
+            Names of the projects to return
+        filter : string or list-of-strings, optional
+            Functional filter which specifies projects to return
+
+        Returns
+        -------
+        dict of :class:`Project`
+
+        '''
+        out = await self._get('projectXml', params=get_params(name=name, filter=filter))
+        return self._projects_from_xml(out)
+
+    async def get_project(self, name):
+        '''
+        Retrieve the specified project
+
+        Parameters
+        ----------
+        name : string
+            Name of the project
+
+        Returns
+        -------
+        :class:`Project`
+
+        '''
+        out = await self.get_projects(name=name)
+        try:
+            return out[name]
+        except KeyError:
+            raise KeyError("No project with name '%s' found." % name)
+
+    async def _get_projects_of(self, endpoint, name=None, filter=None):
+        out = await self._get(endpoint, params=get_params(name=name, filter=filter,
+                                                          schema=False))
+        names = list(self._projects_from_xml(out).keys())
+        if names:
+            return await self.get_projects(name=names)
+        return {}
+
+    async def get_running_projects(self, name=None, filter=None):
+        '''
+        Retrieve running projects
+
+        Parameters
+        ----------
+        name : string or list-of-strings, optional
+            Names of running projects to return
+        filter : string or list-of-strings, optional
+            Functional filters indicating running projects to return
+
+        Returns
+        -------
+        dict of :class:`Project`
+
+        '''
+        return await self._get_projects_of('runningProjects', name=name, filter=filter)
+
+    async def get_stopped_projects(self, name=None, filter=None):
+        '''
+        Retrieve stopped projects
+
+        Parameters
+        ----------
+        name : string or list-of-strings, optional
+            Names of stopped projects to return
+        filter : string or list-of-strings, optional
+            Functional filters indicating stopped projects to return
+
+        Returns
+        -------
+        dict of :class:`Project`
+
+        '''
+        return await self._get_projects_of('stoppedProjects', name=name, filter=filter)
+
+    async def load_project(self, project, name=None, overwrite=True, start=True,
+                           start_connectors=True):
+        '''
+        Load a project from a project definition
+
+        Parameters
+        ----------
+        project : string or Project or file-like
+            If a Project object, the project is exported to an XML definition
+            then loaded.  If it is a string containing a URL, the URL must
+            contain an XML definiton of a project.  Any other string or
+            file-like object, must contain XML defining a project.
+        name : string, optional
+            Name of the project.  By default, the name is retrieved from
+            the XML definition.
+        overwrite : bool, optional
+            Should an existing project with the same name be overwritten?
+        start : bool, optional
+            Should the project be started?
+        start_connectors : bool, optional
+            Should the connectors be started?
+
+        Returns
+        -------
+        :class:`Project`
+
+        '''
+        if isinstance(project, six.string_types) and re.match(r'\w+://', project):
+            data = ''
+            project_url = project
+        else:
+            data = get_project_data(project)
+            project_url = None
+
+        if name is None:
+            if data:
+                proj = ET.fromstring(data)
+                if proj.tag == 'project':
+                    name = proj.attrib.get('name')
+                else:
+                    name = proj.findall('.//project')[0].attrib.get('name')
+            if name is None:
+                name = gen_name(prefix='p_')
+
+        get_schema_cache(self.session).invalidate(name)
+        await self._put('projects/%s' % name,
+                        params=get_params(overwrite=overwrite,
+                                          connectors=start_connectors,
+                                          projectUrl=project_url,
+                                          start=start,
+                                          log=True),
+                        data=data.encode('utf-8'))
+
+        return await self.get_project(name)
+
+    async def delete_projects(self, *name, **kwargs):
+        '''
+        Delete projects
+
+        Parameters
+        ----------
+        *name : zero-or-more-strings, optional
+            Names of the projects to delete
+        filter : string or list-of-strings, optional
+            Functional filter indicating the projects to delete
+
+        '''
+        await self._delete('projects', params=get_params(name=list(name),
+                                                         filter=kwargs.get('filter')))
+        if name and not kwargs.get('filter'):
+            for item in name:
+                get_schema_cache(self.session).invalidate(item)
+        else:
+            get_schema_cache(self.session).invalidate()
+
+    async def delete_project(self, name):
+        '''
+        Delete specified project
+
+        Parameters
+        ----------
+        name : string
+            Name of the project to delete
+
+        '''
+        await self._delete('projects/%s' % name)
+        get_schema_cache(self.session).invalidate(name)
+
+    async def start_projects(self, name=None, filter=None):
+        '''
+        Start projects
+
+        Parameters
+        ----------
+        name : string or list-of-strings, optional
+            Names of projects to start
+        filter : string or list-of-strings, optional
+            Functional filters indicating which projects to start
+
+        '''
+        await self._post('runningProjects', params=get_params(name=name, filter=filter))
+
+    async def start_project(self, name):
+        '''
+        Start specified project
+
+        Parameters
+        ----------
+        name : string
+            Name of the project to start
+
+        '''
+        await self._post('runningProjects/%s' % name, params=get_params(name=name))
+
+    async def stop_projects(self, name=None, filter=None):
+        '''
+        Stop projects
+
+        Parameters
+        ----------
+        name : string or list-of-strings, optional
+            Names of the projects to stop
+        filter : string or list-of-strings, optional
+            Functional filters indicating which projects to stop
+
+        '''
+        await self._post('stoppedProjects', params=get_params(name=name, filter=filter))
+
+    async def stop_project(self, name):
+        '''
+        Stop specified project
+
+        Parameters
+        ----------
+        name : string
+            Name of the project to stop
+
+        '''
+        await self._post('stoppedProjects/%s' % name, params=get_params(name=name))
+
+    async def get_windows(self, path='*.*.*', type=None, filter=None):
+        '''
+        Retrieve windows from the server
+
+        Parameters
+        ----------
+        path : string or list-of-strings, optional
+            '.' delimited path to windows to retrieve.  '*' can be used as
+            a wildcard for any component.  Multiple component names can
+            be delimited by '|'.  The windows of a list of paths are
+            retrieved concurrently.
+        type : string or list-of-strings, optional
+            Types of windows you want to retrieve
+        filter : string or list-of-strings, optional
+            Function filter indicating which windows to retrieve
+
+        Returns
+        -------
+        dict of :class:`Window`
+
+        '''
+        if isinstance(path, (list, tuple, set)):
+            windows = dict()
+            for item in await asyncio.gather(*[self.get_windows(x, type=type,
+                                                                filter=filter)
+                                               for x in path]):
+                windows.update(item)
+            return windows
+
+        path = [None, None, None] + expand_path(path)
+        res = await self._get('windowXml', params=get_params(project=path[-3],
+                                                             contquery=path[-2],
+                                                             name=path[-1], type=type,
+                                                             filter=filter))
+        windows = dict()
+        for item in res.findall('./*'):
+            try:
+                wcls = get_window_class(item.tag)
+            except KeyError:
+                raise TypeError('Unknown window type: %s' % item.tag)
+            window = wcls.from_xml(item, session=self.session)
+            windows[window.fullname] = window
+        return windows
+
+    async def get_window(self, path):
+        '''
+        Retrieve specified window
+
+        Parameters
+        ----------
+        path : string
+            '.' delimited path to the window
+
+        Returns
+        -------
+        :class:`Window`
+
+        '''
+        out = await self.get_windows(path)
+        if len(out) > 1:
+            raise ValueError(("More than one window with the path '%s' exists. " % path) +
+                             'Use a more explicit path or use the get_windows method.')
+        if out:
+            return out.popitem()[1]
+        raise KeyError("No window with the path '%s'" % path)
+
+    async def get_schema(self, path):
+        '''
+        Retrieve the schema of a window
+
+        Schemas are stored in the schema cache of the session.
+
+        Parameters
+        ----------
+        path : string
+            '.' delimited path to the window
+
+        Returns
+        -------
+        :class:`Schema`
+
+        '''
+        path = path.replace('.', '/')
+        cache = get_schema_cache(self.session)
+        entry = cache.get(path)
+        if entry is None:
+            res = await self._get('windows/%s' % path, params=dict(schema='true'))
+            for item in res.findall('./*'):
+                schema = get_window_class(item.tag).from_xml(item,
+                                                             session=self.session).schema
+                cache.set(path, schema)
+                return schema.copy(deep=True)
+            raise KeyError("No window with the path '%s'" % path)
+        return entry[0].copy(deep=True)
+
+    async def get_events(self, path, filter=None, sort_by=None, limit=None):
+        '''
+        Retrieve the events of a window
+
+        Parameters
+        ----------
+        path : string
+            '.' delimited path to the window
+        filter : string or list-of-strings, optional
+            Functional filter indicating events to retrieve
+        sort_by : string, optional
+            The field to sort results on.  It should be of the
+            form: ``sortfield:ascending``.
+        limit : int, optional
+            The maximum number of events to retrieve
+
+        Returns
+        -------
+        :class:`pandas.DataFrame`
+
+        '''
+        schema = await self.get_schema(path)
+        res = await self._get('events/%s/' % path.replace('.', '/'),
+                              params=get_params(filter=filter, sort_by=sort_by,
+                                                limit=limit))
+        out = get_events(schema, res, server_info=await self.get_server_info())
+        if out:
+            return list(out.values())[0]
+        return get_dataframe(schema)
+
+    async def _get_window_object(self, window):
+        if isinstance(window, BaseWindow):
+            return window
+        return await self.get_window(window)
+
+    async def subscribe(self, window, **kwargs):
+        '''
+        Create and start an asynchronous subscriber
+
+        Parameters
+        ----------
+        window : string or Window
+            The window or the '.' delimited path of the window
+        **kwargs : keyword-arguments, optional
+            The parameters of :class:`AsyncSubscriber`
+
+        Returns
+        -------
+        :class:`AsyncSubscriber`
+
+        '''
+        sub = AsyncSubscriber(self, await self._get_window_object(window), **kwargs)
+        await sub.start()
+        return sub
+
+    async def stream(self, window, **kwargs):
+        '''
+        Iterate over the events of a window
+
+        The subscriber is stopped when the iteration ends.
+
+        Parameters
+        ----------
+        window : string or Window
+            The window or the '.' delimited path of the window
+        **kwargs : keyword-arguments, optional
+            The parameters of :class:`AsyncSubscriber`
+
+        Examples
+        --------
+        >>> async for df in esp.stream('project.contquery.window'):
+        ...     print(df)
+
+        Returns
+        -------
+        async iterator of :class:`pandas.DataFrame`
+
+        '''
+        sub = await self.subscribe(window, **kwargs)
+        try:
+            async for df in sub:
+                yield df
+        finally:
+            await sub.stop()
+
+    async def publisher(self, window, **kwargs):
+        '''
+        Create an asynchronous publisher
+
+        Parameters
+        ----------
+        window : string or Window
+            The window or the '.' delimited path of the window
+        **kwargs : keyword-arguments, optional
+            The parameters of :class:`AsyncPublisher`
+
+        Returns
+        -------
+        :class:`AsyncPublisher`
+
+        '''
+        pub = AsyncPublisher(self, await self._get_window_object(window), **kwargs)
+        await pub.connect()
+        return pub
+
+    async def publish(self, window, data, **kwargs):
+        '''
+        Publish data to a window
+
+        Parameters
+        ----------
+        window : string or Window
+            The window or the '.' delimited path of the window
+        data : string or list-of-strings
+            The events to publish
+        **kwargs : keyword-arguments, optional
+            The parameters of :class:`AsyncPublisher`
+
+        '''
+        pub = await self.publisher(window, **kwargs)
+        try:
+            if isinstance(data, (six.string_types, bytes)):
+                data = [data]
+            for item in data:
+                await pub.send(item)
+        finally:
+            await pub.close()
+
+
+class AsyncSubscriber(Subscriber):
+    '''
+    Asynchronous subscriber
+
+    The events are read by a task on the running event loop rather
+    than by a thread, and the DataFrames of events are delivered by
+    iterating over the subscriber.  The `on_event` callback and the
+    other parameters are the same as those of :class:`Subscriber`.
+
+    Parameters
+    ----------
+    esp : AsyncESP
+        The connection of the window
+    window : Window
+        The window object to create the subscriber for
+    maxsize : int, optional
+        The maximum number of DataFrames waiting to be iterated.  When
+        the queue is full, the oldest DataFrame is dropped.  Zero
+        means no limit.
+    **kwargs : keyword-arguments, optional
+        The parameters of :class:`Subscriber`
+
+    Examples
+    --------
+    >>> async with AsyncSubscriber(esp, window, mode='streaming') as sub:
+    ...     async for df in sub:
+    ...         print(df)
+
+    Returns
+    -------
+    :class:`AsyncSubscriber`
+
+    '''
+
+    def __init__(self, esp, window, maxsize=0, **kwargs):
+        kwargs['shared'] = False
+        Subscriber.__init__(self, window, **kwargs)
+        self._esp = esp
+        self._reader = None
+        self._finished = False
+        self._queue = asyncio.Queue(maxsize=maxsize)
+        self._on_event = self.callbacks.get('on_event')
+        self.callbacks['on_event'] = self._put
+        self.dropped = 0
+
+    def _update(self, message):
+        ''' Send changed settings to the server '''
+        if self._ws is not None:
+            asyncio.ensure_future(self._ws.send_str(message))
+
+    def _put(self, sock, df):
+        if self._on_event is not None:
+            self._on_event(sock, df)
+        self._put_nowait(df)
+
+    def _put_nowait(self, item):
+        ''' Queue an item, dropping the oldest one if the queue is full '''
+        if self._queue.maxsize and self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(item)
+
+    async def start(self):
+        '''
+        Open the web socket and start reading events
+
+        '''
+        if self.is_active:
+            return
+
+        self._event_schema = None
+        self._empty = None
+        self._status = None
+        self._finished = False
+        self._server_info = await self._esp.get_server_info()
+
+        if get_option('debug.requests'):
+            sys.stderr.write('WEBSOCKET %s\n' % self.url)
+
+        self._ws = await self._esp.client.ws_connect(self.url,
+                                                     headers=self._esp.headers,
+                                                     max_msg_size=0)
+        self._on_open(self._ws)
+        self._reader = asyncio.ensure_future(self._read(self._ws))
+
+    async def _read(self, ws):
+        try:
+            async for msg in ws:
+                if msg.type == aiohttp.WSMsgType.TEXT:
+                    self._on_text(ws, msg.data)
+                elif msg.type == aiohttp.WSMsgType.BINARY:
+                    self._on_data(ws, msg.data)
+                elif msg.type == aiohttp.WSMsgType.ERROR:
+                    raise ws.exception()
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            self._on_error(ws, exc)
+            self._finished = True
+            self._put_nowait(exc)
+        else:
+            self._on_close(ws, ws.close_code)
+            self._finished = True
+            self._put_nowait(_END)
+
+    async def stop(self):
+        '''
+        Stop reading events and close the web socket
+
+        '''
+        ws, self._ws = self._ws, None
+        if ws is not None:
+            await ws.close()
+        if self._reader is not None:
+            await asyncio.wait([self._reader])
+            self._reader = None
+
+    close = stop
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.stop()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if (self._ws is None or self._finished) and self._queue.empty():
+            raise StopAsyncIteration
+        item = await self._queue.get()
+        if item is _END:
+            raise StopAsyncIteration
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+
+class AsyncPublisher(Publisher):
+    '''
+    Asynchronous publisher
+
+    The parameters are the same as those of :class:`Publisher`, except
+    that there is no send queue: :meth:`send` is a coroutine that
+    returns once the data is written to the web socket.
+
+    Parameters
+    ----------
+    esp : AsyncESP
+        The connection of the window
+    window : Window
+        The window object to publish to
+    **kwargs : keyword-arguments, optional
+        The parameters of :class:`Publisher`
+
+    Examples
+    --------
+    >>> async with await esp.publisher('project.contquery.window') as pub:
+    ...     await pub.send('i,n,1,2,3')
+
+    Returns
+    -------
+    :class:`AsyncPublisher`
+
+    '''
+
+    def __init__(self, esp, window, blocksize=1, rate=0, pause=0,
+                 dateformat='%Y%m%dT%H:%M:%S.%f', opcode='insert',
+                 format='csv', separator=None):
+        self._esp = esp
+        self._ws = None
+        self._sender = None
+        self._error = None
+        self.blocksize = int(blocksize)
+        self.rate = int(rate)
+        self.pause = int(pause)
+        self.dateformat = dateformat
+        self.opcode = opcode
+        self.format = format
+        self.separator = separator
+        self.queue_size = 0
+        self.session = window.session
+        self.window_fullname = window.fullname
+        self.window_schema = window.schema
+        self.window_url = window.publisher_url
+        self._metrics = dict(queued=0, sent=0, dropped=0, messages=0, max_depth=0,
+                             total_latency=0.0, max_latency=0.0)
+
+    async def connect(self):
+        ''' Open the web socket '''
+        if self._ws is not None:
+            return
+
+        if get_option('debug.requests'):
+            sys.stderr.write('WEBSOCKET %s\n' % self.url)
+
+        self._ws = await self._esp.client.ws_connect(yarl.URL(self.url, encoded=True),
+                                                     headers=self._esp.headers,
+                                                     max_msg_size=0)
+
+    async def send(self, data):
+        '''
+        Send data to the web socket
+
+        Parameters
+        ----------
+        data : string or bytes
+            The data to send
+
+        '''
+        if self._ws is None:
+            raise ValueError('The connection is closed')
+        if isinstance(data, bytes):
+            await self._ws.send_bytes(data)
+        else:
+            await self._ws.send_str(data)
+        self._metrics['sent'] += 1
+        self._metrics['messages'] += 1
+
+    async def flush(self, timeout=None):
+        ''' The data is written by :meth:`send`, so there is nothing to flush '''
+        return True
+
+    async def close(self):
+        ''' Close the web socket connection '''
+        ws, self._ws = self._ws, None
+        if ws is not None:
+            await ws.close()
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
@@ -165,22 +165,56 @@ class ESPObject(RESTHelpers):
         RESTHelpers.__init__(self, session=session)
         self._set_attributes(attrs)
 
-    def _set_attributes(self, kwargs):
-        kwargs = kwargs or {}
-        xml_map = dict(getattr(type(self), 'xml_map', {}))
+    @classmethod
+    def _get_attribute_table(cls):
+        '''
+        Return the attribute descriptors of the class
+
+        The table is computed on first use for each class and then kept
+        on the class, so :class:`Attribute` descriptors must be added to
+        a class before its objects are used.
+
+        Returns
+        -------
+        (fields, names, xml_map)
+            The (key, descriptor) pairs, the mapping of attribute and XML
+            names to keys, and the mapping of extra attributes to XML names
+
+        '''
+        if '_attribute_fields' not in cls.__dict__:
+            cls._build_attribute_table()
+        return cls._attribute_fields, cls._attribute_names, cls._attribute_xml_map
+
+    @classmethod
+    def _build_attribute_table(cls):
+        ''' Collect the attribute descriptors of the class '''
+        # Descriptors in MRO order from the base class down.  Overridden
+        # descriptors are kept so that the output order is unchanged.
+        fields = []
+        names = {}
+        for base in reversed(cls.__mro__):
+            for key, value in vars(base).items():
+                if isinstance(value, Attribute):
+                    fields.append((key, value))
+                    names[key] = key
+                    names[value.name] = key
+
+        xml_map = dict(getattr(cls, 'xml_map', {}))
 
         # Always add these keys
         xml_map['name'] = 'name'
         xml_map['contquery'] = 'contquery'
         xml_map['project'] = 'project'
 
-        attrs = {}
+        cls._attribute_fields = tuple(fields)
+        cls._attribute_names = names
+        cls._attribute_xml_map = xml_map
 
-        for cls in reversed(type(self).__mro__):
-            for key, value in vars(cls).items():
-                if isinstance(value, Attribute):
-                    attrs[key] = key
-                    attrs[value.name] = key
+    def _set_attributes(self, kwargs):
+        if not kwargs:
+            return
+
+        _, attrs, xml_map = type(self)._get_attribute_table()
 
         for key, value in kwargs.items():
             if value is not None and key in attrs:
@@ -189,26 +223,19 @@ class ESPObject(RESTHelpers):
                 setattr(self, xml_map[key], value)
 
     def _get_attributes(self, use_xml_values=True):
-        xml_map = dict(getattr(type(self), 'xml_map', {}))
-
-        # Always add these keys
-        xml_map['name'] = 'name'
-        xml_map['contquery'] = 'contquery'
-        xml_map['project'] = 'project'
+        fields, _, xml_map = type(self)._get_attribute_table()
 
         out = {}
 
-        for cls in reversed(type(self).__mro__):
-            for key, value in vars(cls).items():
-                if isinstance(value, Attribute):
-                    if use_xml_values:
-                        val = value.get_xml_value(self)
-                        if val is not None:
-                            out[value.name] = val
-                    else:
-                        val = value.get_value(self)
-                        if val is not None:
-                            out[key] = val
+        for key, value in fields:
+            if use_xml_values:
+                val = value.get_xml_value(self)
+                if val is not None:
+                    out[value.name] = val
+            else:
+                val = value.get_value(self)
+                if val is not None:
+                    out[key] = val
 
         for attr_name, xml_name in xml_map.items():
             value = getattr(self, attr_name, None)
@@ -24,22 +24,63 @@ Initialization of ESP options
 from __future__ import print_function, division, absolute_import, unicode_literals
 
 import functools
-import pandas as pd
+import os
 from .utils.config import (register_option, check_boolean, check_int, get_option,
                            set_option, reset_option, describe_option, check_url,
                            ESPOptionError, check_string, options, get_suboptions,
                            get_default, check_float, option_context)
+from .utils.lazy import lazy_import, lazy_attributes
+
+pd = lazy_import('pandas')
 
 
 # Root of server URLs
 ESP_ROOT = 'SASESP'
 
-# Store pandas version
-PANDAS_VERSION = tuple([int(x) for x in pd.__version__.split('.')])
 
-CONCAT_OPTIONS = {}
-if PANDAS_VERSION >= (0, 23, 0):
-    CONCAT_OPTIONS['sort'] = True
+_PANDAS_VERSION = None
+_CONCAT_OPTIONS = None
+
+
+def get_pandas_version():
+    '''
+    Return the version of the installed pandas package
+
+    The version is determined on first use, so that importing the
+    package does not import pandas.
+
+    Returns
+    -------
+    tuple of ints
+
+    '''
+    global _PANDAS_VERSION
+    if _PANDAS_VERSION is None:
+        _PANDAS_VERSION = tuple([int(x) for x in pd.__version__.split('.')])
+    return _PANDAS_VERSION
+
+
+def get_concat_options():
+    '''
+    Return the keyword arguments to use with :func:`pandas.concat`
+
+    Returns
+    -------
+    dict
+
+    '''
+    global _CONCAT_OPTIONS
+    if _CONCAT_OPTIONS is None:
+        opts = {}
+        if get_pandas_version() >= (0, 23, 0):
+            opts['sort'] = True
+        _CONCAT_OPTIONS = opts
+    return _CONCAT_OPTIONS
+
+
+# PANDAS_VERSION and CONCAT_OPTIONS are computed on first access
+lazy_attributes(__name__, PANDAS_VERSION=get_pandas_version,
+                CONCAT_OPTIONS=get_concat_options)
 
 #
 # Connection options
@@ -77,6 +118,74 @@ register_option('display.max_fields', 'int',
                 'Specifies the maximum number of schema fields per window to display\n'
                 'when rendering a project diagram.')
 
+#
+# Cache options
+#
+
+register_option('cache.schema_ttl', 'float',
+                functools.partial(check_float, minimum=0), 300.0,
+                'Specifies the number of seconds that window schemas retrieved\n'
+                'from the server are cached for a session.  A value of zero\n'
+                'disables the schema cache.')
+
+register_option('cache.rest', 'boolean', check_boolean, False,
+                'Should the responses of metadata GET requests (server information,\n'
+                'algorithms, projects, and windows) be cached for a session?')
+
+register_option('cache.rest_server_ttl', 'float',
+                functools.partial(check_float, minimum=0), 300.0,
+                'Specifies the number of seconds that cached server information\n'
+                'responses are valid.')
+
+register_option('cache.rest_algorithms_ttl', 'float',
+                functools.partial(check_float, minimum=0), 3600.0,
+                'Specifies the number of seconds that cached algorithm responses\n'
+                'are valid.')
+
+register_option('cache.rest_projects_ttl', 'float',
+                functools.partial(check_float, minimum=0), 30.0,
+                'Specifies the number of seconds that cached project and window\n'
+                'responses are valid.  These entries are also invalidated by any\n'
+                'POST, PUT, or DELETE request of the session.')
+
+register_option('cache.algorithm_dir', 'string', check_string,
+                os.path.join(os.path.expanduser('~'), '.cache', 'esppy'),
+                'Specifies the directory where the algorithm definitions of each\n'
+                'server version are cached.  An empty string disables the cache.',
+                environ='ESPPY_CACHE_DIR')
+
+#
+# HTTP options
+#
+
+register_option('http.pool_size', 'int',
+                functools.partial(check_int, minimum=1), 10,
+                'Specifies the maximum number of connections kept alive to\n'
+                'each ESP server.')
+
+register_option('http.retries', 'int',
+                functools.partial(check_int, minimum=0), 3,
+                'Specifies the number of times that dropped connections and\n'
+                'idempotent requests answered with 502, 503, or 504 are retried.')
+
+register_option('http.backoff_factor', 'float',
+                functools.partial(check_float, minimum=0), 0.5,
+                'Specifies the backoff factor of retries.  Retry n waits\n'
+                'backoff_factor * 2 ** (n - 1) seconds.')
+
+register_option('http.max_workers', 'int',
+                functools.partial(check_int, minimum=1), 8,
+                'Specifies the maximum number of concurrent requests of bulk\n'
+                'operations.')
+
+#
+# Subscriber options
+#
+
+register_option('subscriber.shared', 'boolean', check_boolean, False,
+                'Should window subscribers of a session share one websocket\n'
+                'connection rather than opening one each?')
+
 #
 # Debug options
 #
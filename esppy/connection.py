@@ -22,9 +22,9 @@ from __future__ import print_function, division, absolute_import, unicode_litera
 
 import base64
 import collections
+import io
 import os
 import time
-import pandas as pd
 import re
 import requests
 import six
@@ -34,12 +34,12 @@ import logging
 import threading
 import warnings
 import xml.etree.ElementTree as ET
-from numpy import nan
 from six.moves import urllib
 from urllib.parse import urlparse
 from .base import RESTHelpers, ESPObject
 from .algorithm import Algorithm
-from .config import get_option, ESP_ROOT, CONCAT_OPTIONS
+from . import config
+from .config import get_option, ESP_ROOT
 from .connectorinfo import ConnectorInfo
 from .mas import MASModule
 from .router import Router
@@ -54,15 +54,18 @@ from .metadata import Metadata
 from .utils import xml
 from .utils.authorization import Authorization
 from .utils.authinfo import query_authinfo
-from .utils.rest import get_params
-from .utils.data import get_project_data, gen_name, get_server_info
-from .utils.events import get_events
+from .utils.rest import get_params, get_response_cache, configure_session
+from .utils.data import get_project_body, get_project_data, gen_name, get_server_info
+from .utils.events import get_events, get_schema_cache
 from .utils.keyword import dekeywordify
 from .utils.project import expand_path
 from .websocket import createWebSocket
 from .windows import BaseWindow, get_window_class
 from .espapi import api
 from .espapi import k8s
+from .utils.lazy import lazy_import
+
+pd = lazy_import('pandas')
 
 if os.getenv("ESPPY_LOG") != None:
     for handler in logging.root.handlers[:]:
@@ -193,7 +196,7 @@ class ProjectStats(object):
                 data = data.set_index(['project', 'contquery', 'window'])
                 data = data[['interval'] + list(sorted(x for x in data.columns
                                                        if x != 'interval'))]
-                data = pd.concat([self.stats, data], **CONCAT_OPTIONS)
+                data = pd.concat([self.stats, data], **config.get_concat_options())
                 data = data.sort_index().sort_values(['interval']).tail(self.limit)
                 self.stats = data
 
@@ -339,7 +342,7 @@ class ESP(RESTHelpers):
             conn_url = '%s://%s:%s' % (protocol, hostname, port)
             base_url = '%s://%s:%s/%s/' % (protocol, hostname, port, ESP_ROOT)
 
-        session = requests.Session()
+        session = configure_session(requests.Session())
         session.conn_url = conn_url
         session.base_url = base_url
 
@@ -430,7 +433,9 @@ class ESP(RESTHelpers):
 
         self.check_ESP_server_version()
 
-        self._populate_algorithms()
+        # Algorithm classes are generated on first access of
+        # the train, calculate, and score namespaces
+        self._algorithms = {}
 
         if self._k8s == None:
             if model_file != None:
@@ -440,6 +445,7 @@ class ESP(RESTHelpers):
 
     def check_ESP_server_version(self):
         version = self.server_info["version"]
+        self._server_version = version
         regex_for_server_version = ".*\(([0-9]*)\.([0-9]*)\)"
         if not re.match(regex_for_server_version, version):
             return
@@ -491,6 +497,36 @@ class ESP(RESTHelpers):
 
         return(authorization)
 
+    @property
+    def schema_cache(self):
+        '''
+        The window schema cache for the session
+
+        The cache is invalidated for a project when it is loaded or
+        deleted through this connection.
+
+        Returns
+        -------
+        :class:`SchemaCache`
+
+        '''
+        return get_schema_cache(self.session)
+
+    @property
+    def response_cache(self):
+        '''
+        The REST response cache for the session
+
+        The cache is disabled unless the ``cache.rest`` option is set
+        or caching is enabled on the cache itself.
+
+        Returns
+        -------
+        :class:`ResponseCache`
+
+        '''
+        return get_response_cache(self.session)
+
     @property
     def metadata(self):
         ''' Engine metadata '''
@@ -534,25 +570,119 @@ class ESP(RESTHelpers):
         out.session = self.session
         return out
 
+    @property
+    def train(self):
+        ''' Train algorithm window classes '''
+        return self._get_algorithm_namespace('train')
+
+    @property
+    def calculate(self):
+        ''' Calculate algorithm window classes '''
+        return self._get_algorithm_namespace('calculate')
+
+    @property
+    def score(self):
+        ''' Score algorithm window classes '''
+        return self._get_algorithm_namespace('score')
+
     def _populate_algorithms(self):
         ''' Generate algorithm classes '''
         for alg in ['train', 'calculate', 'score']:
-            doc = []
-            doc.append('%s Algorithms' % alg.title())
-            doc.append('-' * len(doc[-1]))
-            members = {}
-            algorithms = []
-            for key, value in sorted(self.get_algorithms(alg, properties=True).items()):
-                algorithms.append(key)
-                members[str(key)] = self._new_algorithm(value,
-                                                        get_window_class('window-%s' %
-                                                                         alg))
-                doc.append(key)
-            members['__doc__'] = '\n'.join(doc)
-            members['supported_algorithms'] = tuple(algorithms)
-            setattr(self, alg,
-                    type(str('%s%s' % (alg.title(), 'Algorithms')),
-                         (object,), members))
+            self._get_algorithm_namespace(alg)
+
+    def _get_algorithm_namespace(self, alg):
+        '''
+        Return the namespace of algorithm classes of the given type
+
+        The namespace is generated on first use from the algorithm
+        definitions of the server.
+
+        Parameters
+        ----------
+        alg : string
+            Type of the algorithms: train, calculate, or score
+
+        Returns
+        -------
+        class
+
+        '''
+        algorithms = self.__dict__.setdefault('_algorithms', {})
+        if alg in algorithms:
+            return algorithms[alg]
+
+        doc = []
+        doc.append('%s Algorithms' % alg.title())
+        doc.append('-' * len(doc[-1]))
+        members = {}
+        names = []
+        for key, value in sorted(self._get_algorithm_definitions(alg).items()):
+            names.append(key)
+            members[str(key)] = self._new_algorithm(value,
+                                                    get_window_class('window-%s' % alg))
+            doc.append(key)
+        members['__doc__'] = '\n'.join(doc)
+        members['supported_algorithms'] = tuple(names)
+
+        algorithms[alg] = type(str('%s%s' % (alg.title(), 'Algorithms')),
+                               (object,), members)
+        return algorithms[alg]
+
+    def _get_algorithm_definitions(self, alg):
+        '''
+        Return the algorithm definitions of the given type
+
+        The definitions only change with the server version, so the
+        server response is cached on disk for each version in the
+        directory specified by the ``cache.algorithm_dir`` option.
+
+        Parameters
+        ----------
+        alg : string
+            Type of the algorithms: train, calculate, or score
+
+        Returns
+        -------
+        dict of :class:`Algorithm`
+
+        '''
+        path = None
+        root = None
+
+        if get_option('cache.algorithm_dir') and getattr(self, '_server_version', None):
+            version = re.sub(r'[^\w.-]+', '_', self._server_version).strip('_')
+            path = os.path.join(get_option('cache.algorithm_dir'),
+                                'algorithms', version, '%s.xml' % alg)
+            try:
+                with io.open(path, 'r', encoding='utf-8') as infile:
+                    root = ET.fromstring(infile.read())
+            except (IOError, OSError, ValueError, ET.ParseError):
+                pass
+
+        if root is None:
+            content = self._get('algorithms/%s' % alg,
+                                params=get_params(properties=True), raw=True)
+            if path is not None:
+                # Write to a temporary file so that concurrent connections
+                # never read a partial definition
+                try:
+                    if not os.path.isdir(os.path.dirname(path)):
+                        os.makedirs(os.path.dirname(path))
+                    tmp = '%s.%s.tmp' % (path, os.getpid())
+                    with io.open(tmp, 'w', encoding='utf-8') as outfile:
+                        outfile.write(content)
+                    # Python 2 has no os.replace; os.rename only replaces
+                    # an existing file on POSIX systems
+                    getattr(os, 'replace', os.rename)(tmp, path)
+                except (IOError, OSError, ValueError):
+                    pass
+            root = xml.from_xml(content)
+
+        out = {}
+        for item in root.findall('./algorithm'):
+            alg = Algorithm.from_xml(item)
+            out[alg.name] = alg
+        return out
 
     def _new_algorithm(self, data, wcls):
         '''
@@ -883,6 +1013,12 @@ class ESP(RESTHelpers):
         if isinstance(project, six.string_types) and re.match(r'\w+://', project):
             data = ''
             project_url = project
+        elif self._k8s == None and isinstance(project, ESPObject) and hasattr(project, 'iter_xml'):
+            # Project objects are serialized while they are uploaded
+            data = None
+            project_url = None
+            if name is None:
+                name = project.name
         else:
             data = get_project_data(project)
             project_url = None
@@ -901,6 +1037,8 @@ class ESP(RESTHelpers):
             if name is None:
                 name = gen_name(prefix='p_')
 
+        self.schema_cache.invalidate(name)
+
         if self._k8s != None:
             if project_url != None:
                 response = requests.get(project_url)
@@ -911,7 +1049,10 @@ class ESP(RESTHelpers):
             data = ET.tostring(proj,method="xml").decode()
             self._k8s.load(data,overwrite=False,force=force)
         else:
-            data = data.encode("utf-8")
+            if data is None:
+                data = get_project_body(project)
+            else:
+                data = data.encode("utf-8")
             self._put('projects/%s' % name,
                       params=get_params(overwrite=overwrite,
                                         connectors=start_connectors,
@@ -938,6 +1079,11 @@ class ESP(RESTHelpers):
         '''
         self._delete('projects', params=get_params(name=list(name),
                                                    filter=kwargs.get('filter')))
+        if name and not kwargs.get('filter'):
+            for item in name:
+                self.schema_cache.invalidate(item)
+        else:
+            self.schema_cache.invalidate()
 
     def delete_project(self, name):
         '''
@@ -950,6 +1096,7 @@ class ESP(RESTHelpers):
 
         '''
         self._delete('projects/%s' % name)
+        self.schema_cache.invalidate(name)
 
     def get_running_projects(self, name=None, filter=None):
         '''
@@ -1097,10 +1244,11 @@ class ESP(RESTHelpers):
 
         Parameters
         ----------
-        path : string, optional
+        path : string or list-of-strings, optional
             '.' delimited path to windows to retrieve.  '*' can be used as
             a wildcard for any component.  Multiple component names can
-            be delimited by '|'.
+            be delimited by '|'.  The windows of a list of paths are
+            retrieved concurrently.
         type : string or list-of-strings, optional
             Types of windows you want to retrieve
         filter : string or list-of-strings, optional
@@ -1111,6 +1259,14 @@ class ESP(RESTHelpers):
         dict of :class:`Window`
 
         '''
+        if isinstance(path, (list, tuple, set)):
+            windows = dict()
+            for item in self._bulk(lambda x: self.get_windows(x, type=type,
+                                                              filter=filter),
+                                   path):
+                windows.update(item)
+            return windows
+
         path = [None, None, None] + expand_path(path)
         res = self._get('windowXml', params=get_params(project=path[-3],
                                                        contquery=path[-2],
@@ -1419,15 +1575,18 @@ class ESP(RESTHelpers):
 
         Parameters
         ----------
-        name : string, optional
-            Name of the router to retrieve statistics for
+        name : string or list-of-strings, optional
+            Name of the router to retrieve statistics for.  The statistics
+            of a list of routers are retrieved concurrently.
 
         Returns
         -------
         dict
 
         '''
-        if name:
+        if isinstance(name, (list, tuple, set)):
+            elems = self._bulk(lambda x: self._get('routerStats/%s' % x), name)
+        elif name:
             stats = self._get('routerStats/%s' % name)
             elems = [stats]
         else:
@@ -1453,7 +1612,7 @@ class ESP(RESTHelpers):
                 routes[route.attrib['name']] = rte
             out[elem.attrib['name']] = routes
 
-        if name:
+        if name and isinstance(name, six.string_types):
             return out[name]
 
         return out
@@ -562,61 +562,88 @@ class ContinuousQuery(ESPObject, collections.abc.MutableMapping):
         :class:`ElementTree.Element`
 
         '''
-        out = xml.new_elem('contquery', xml.get_attrs(self, exclude='project'))
+        return xml.build_element(self._iter_elements())
+
+    def _iter_elements(self):
+        '''
+        Generate the serialization events of the continuous query
+
+        The window elements are created one at a time, so the
+        definition can be serialized without building the complete
+        tree.  See :func:`esppy.utils.xml.iter_xml`.
+
+        Returns
+        -------
+        generator of (string, ElementTree.Element) tuples
+
+        '''
+        yield 'start', xml.new_elem('contquery', xml.get_attrs(self, exclude='project'))
 
         if self.description:
-            xml.add_elem(out, 'description', text_content=self.description)
+            yield 'element', xml.new_elem('description', text_content=self.description)
 
         if self.metadata:
-            metadata = xml.add_elem(out, 'metadata')
+            metadata = xml.new_elem('metadata')
             for key, value in sorted(six.iteritems(self.metadata)):
                 xml.add_elem(metadata, 'meta', attrib=dict(id=key),
                              text_content=value)
+            yield 'element', metadata
 
-        windows = xml.add_elem(out, 'windows')
+        yield 'start', xml.new_elem('windows')
 
         sources = {}
+        edges = []
+        for name, window in sorted(six.iteritems(self.windows)):
+            for target in window.targets:
+                sources.setdefault(target.name, []).append(window.name)
+                attrib = dict(source=window.name, target=target.name)
+                if target.role:
+                    attrib['role'] = target.role
+                if target.slot:
+                    attrib['slot'] = target.slot
+                edges.append((target._index, attrib))
+
         if self.windows:
-            edges = []
             for name, window in sorted(six.iteritems(self.windows)):
-                xml.add_elem(windows, window.to_element(query=self))
-                for target in window.targets:
-                    sources.setdefault(target.name, []).append(window.name)
-                    attrib = dict(source=window.name, target=target.name)
-                    if target.role:
-                        attrib['role'] = target.role
-                    if target.slot:
-                        attrib['slot'] = target.slot
-                    edges.append((target._index, attrib))
-            if edges:
-                elem = xml.add_elem(out, 'edges')
-                for i, attrib in sorted(edges):
-                    xml.add_elem(elem, 'edge', attrib=attrib)
+                elem = window.to_element(query=self)
+                self._set_inherited_types(elem, sources)
+                yield 'element', elem
 
         else:
-            xml.add_elem(windows,
-                get_window_class('window-source')().to_element(query=self))
-
-        # Replace "inherit" data types with the real data type
-        n_inherit = -1
-        while True:
-            inherit = out.findall('./windows/*/schema/fields/field[@type="inherit"]')
-            if len(inherit) == n_inherit:
-                break
-            n_inherit = len(inherit)
-            for window in out.findall('./windows/*'):
-                for field in window.findall('./schema/fields/field[@type="inherit"]'):
-                    for source in sources[window.attrib['name']]:
-                        fname = field.attrib['name']
-                        if source not in self.windows:
-                            raise ValueError("Could not determine data type of "
-                                             "field '%s' on window '%s'" % (fname, source))
-                        win = self.windows[source]
-                        if hasattr(win, 'schema') and fname in win.schema:
-                            dtype = win.schema[fname].type
-                            field.set('type', dtype)
+            yield 'element', get_window_class('window-source')().to_element(query=self)
 
-        return out
+        yield 'end', None
+
+        if edges:
+            yield 'start', xml.new_elem('edges')
+            for i, attrib in sorted(edges):
+                yield 'element', xml.new_elem('edge', attrib=attrib)
+            yield 'end', None
+
+        yield 'end', None
+
+    def _set_inherited_types(self, elem, sources):
+        '''
+        Replace "inherit" data types with the data types of the source windows
+
+        Parameters
+        ----------
+        elem : ElementTree.Element
+            The window element
+        sources : dict
+            The names of the source windows of each window
+
+        '''
+        for field in elem.findall('./schema/fields/field[@type="inherit"]'):
+            for source in sources[elem.attrib['name']]:
+                fname = field.attrib['name']
+                if source not in self.windows:
+                    raise ValueError("Could not determine data type of "
+                                     "field '%s' on window '%s'" % (fname, source))
+                win = self.windows[source]
+                if hasattr(win, 'schema') and fname in win.schema:
+                    dtype = win.schema[fname].type
+                    field.set('type', dtype)
 
     def to_xml(self, pretty=False):
         '''
@@ -642,17 +669,19 @@ class ContinuousQuery(ESPObject, collections.abc.MutableMapping):
         self.metadata.clear()
 
     def _set_metadata(self, data):
-        for key, value in six.iteritems(data):
-            self._put(urllib.parse.urljoin(self.base_url,
-                                           'projectMetadata/%s/%s/%s' %
-                                           (self.project, self.name, key)),
-                      data='%s' % value)
+        self._bulk(lambda item: self._put(urllib.parse.urljoin(self.base_url,
+                                                               'projectMetadata/%s/%s/%s' %
+                                                               (self.project, self.name,
+                                                                item[0])),
+                                          data='%s' % item[1]),
+                   six.iteritems(data))
 
     def _del_metadata(self, *data):
-        for key in data:
-            self._delete(urllib.parse.urljoin(self.base_url,
-                                              'projectMetadata/%s/%s/%s' %
-                                              (self.project, self.name, key)))
+        self._bulk(lambda key: self._delete(urllib.parse.urljoin(self.base_url,
+                                                                 'projectMetadata/%s/%s/%s' %
+                                                                 (self.project, self.name,
+                                                                  key))),
+                   data)
 
     def save_xml(self, dest, mode='w', pretty=True, **kwargs):
         '''
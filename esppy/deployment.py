@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+''' ESP Project Deployment Planning '''
+
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import collections
+import six
+
+# Kinds of changes
+METADATA = 'metadata'
+CONNECTORS = 'connectors'
+WINDOW_ADDED = 'window-added'
+WINDOW_MODIFIED = 'window-modified'
+REPLACE = 'replace'
+
+# Deployment methods, from the least to the most disruptive
+NONE = 'none'
+UPDATE = 'update'
+OVERWRITE = 'overwrite'
+
+Change = collections.namedtuple('Change', ['kind', 'path', 'detail'])
+
+
+def _canonical(elem):
+    ''' Return a comparable form of an element that ignores attribute order '''
+    if elem is None:
+        return None
+    return (elem.tag, tuple(sorted(elem.attrib.items())),
+            (elem.text or '').strip(),
+            tuple(_canonical(x) for x in elem))
+
+
+def _children(elem, exclude=()):
+    ''' Return the comparable children of an element, grouped by tag '''
+    out = collections.OrderedDict()
+    for item in elem:
+        if item.tag not in exclude:
+            out.setdefault(item.tag, []).append(_canonical(item))
+    return out
+
+
+def _metadata_change(path, local, running):
+    ''' Return the metadata values to set and the keys to delete '''
+    values = dict((k, '%s' % v) for k, v in six.iteritems(local or {}))
+    current = dict((k, '%s' % v) for k, v in six.iteritems(running or {}))
+    to_set = dict((k, v) for k, v in six.iteritems(values) if current.get(k) != v)
+    to_delete = sorted(k for k in current if k not in values)
+    if to_set or to_delete:
+        return Change(METADATA, path, dict(set=to_set, delete=to_delete))
+
+
+class DeploymentPlan(object):
+    '''
+    Changes needed to deploy a project definition to a running project
+
+    The definitions are compared window by window, and each difference
+    is classified as one of the following kinds.
+
+    ``metadata``
+        Project or continuous query metadata values.  These are set
+        with the metadata endpoints.
+    ``connectors``
+        Window connectors, connector groups, or connector edges.
+    ``window-added``
+        A window, and the edges to it, that the running project does
+        not contain.
+    ``window-modified``
+        The expressions, properties, or code of an existing window.
+        Schema and window type changes are ``replace`` changes.
+    ``replace``
+        Changes that can only be deployed by replacing the project:
+        removed windows or queries, schema changes, changed edges between
+        existing windows, and project or query attributes.
+
+    Parameters
+    ----------
+    local : Project
+        The project definition to deploy
+    running : Project or None
+        The definition of the running project, or None if the project
+        is not loaded on the server
+
+    Attributes
+    ----------
+    changes : list of :class:`Change`
+        The (kind, path, detail) tuples of the differences
+
+    Returns
+    -------
+    :class:`DeploymentPlan`
+
+    '''
+
+    def __init__(self, local, running):
+        self.local = local
+        self.running = running
+        if running is None:
+            self.changes = [Change(REPLACE, local.name, 'project is not loaded')]
+        else:
+            self.changes = list(self._diff(local, running))
+
+    @property
+    def method(self):
+        '''
+        The least disruptive way to deploy the changes
+
+        Returns
+        -------
+        string
+            'none' if the definitions are the same, 'metadata' if only
+            metadata changed, 'update' if the running project can be
+            modified in place, or 'overwrite' if the project must be
+            replaced
+
+        '''
+        kinds = set(x.kind for x in self.changes)
+        if not kinds:
+            return NONE
+        if REPLACE in kinds:
+            return OVERWRITE
+        if kinds == set([METADATA]):
+            return METADATA
+        return UPDATE
+
+    def get_changes(self, kind):
+        '''
+        Return the changes of the specified kind
+
+        Parameters
+        ----------
+        kind : string
+            The kind of change
+
+        Returns
+        -------
+        list of :class:`Change`
+
+        '''
+        return [x for x in self.changes if x.kind == kind]
+
+    def _diff(self, local, running):
+        ''' Generate the differences between two projects '''
+        name = local.name
+
+        change = _metadata_change(name, local.metadata, running.metadata)
+        if change is not None:
+            yield change
+
+        lproj = local.to_element().find('.//project')
+        rproj = running.to_element().find('.//project')
+
+        if dict(lproj.attrib) != dict(rproj.attrib):
+            yield Change(REPLACE, name, 'project attributes')
+
+        exclude = ('metadata', 'contqueries', 'project-connectors')
+        lchildren = _children(lproj, exclude=exclude)
+        rchildren = _children(rproj, exclude=exclude)
+        for tag in sorted(set(lchildren) | set(rchildren)):
+            if lchildren.get(tag) != rchildren.get(tag):
+                yield Change(REPLACE, name, tag)
+
+        if (_canonical(lproj.find('./project-connectors')) !=
+                _canonical(rproj.find('./project-connectors'))):
+            yield Change(CONNECTORS, name, 'project-connectors')
+
+        lqueries = dict((x.attrib['name'], x) for x in lproj.findall('./contqueries/contquery'))
+        rqueries = dict((x.attrib['name'], x) for x in rproj.findall('./contqueries/contquery'))
+
+        for qname in sorted(set(lqueries) | set(rqueries)):
+            path = '%s.%s' % (name, qname)
+            if qname not in rqueries:
+                yield Change(REPLACE, path, 'query added')
+            elif qname not in lqueries:
+                yield Change(REPLACE, path, 'query removed')
+            else:
+                change = _metadata_change(path, local.queries[qname].metadata,
+                                          running.queries[qname].metadata)
+                if change is not None:
+                    yield change
+                for item in self._diff_query(path, lqueries[qname], rqueries[qname]):
+                    yield item
+
+    def _diff_query(self, path, local, running):
+        ''' Generate the differences between two continuous query elements '''
+        if dict(local.attrib) != dict(running.attrib):
+            yield Change(REPLACE, path, 'query attributes')
+
+        if (_canonical(local.find('./description')) !=
+                _canonical(running.find('./description'))):
+            yield Change(REPLACE, path, 'description')
+
+        lwindows = dict((x.attrib['name'], x) for x in local.findall('./windows/*'))
+        rwindows = dict((x.attrib['name'], x) for x in running.findall('./windows/*'))
+
+        added = set(lwindows) - set(rwindows)
+
+        for wname in sorted(set(lwindows) | set(rwindows)):
+            wpath = '%s.%s' % (path, wname)
+            if wname in added:
+                yield Change(WINDOW_ADDED, wpath, lwindows[wname].tag)
+                continue
+            if wname not in lwindows:
+                yield Change(REPLACE, wpath, 'window removed')
+                continue
+
+            lwin = lwindows[wname]
+            rwin = rwindows[wname]
+            if lwin.tag != rwin.tag:
+                yield Change(REPLACE, wpath, 'window type')
+                continue
+            if _canonical(lwin.find('./schema')) != _canonical(rwin.find('./schema')):
+                yield Change(REPLACE, wpath, 'schema')
+                continue
+
+            exclude = ('schema', 'connectors')
+            if (dict(lwin.attrib) != dict(rwin.attrib) or
+                    _children(lwin, exclude=exclude) != _children(rwin, exclude=exclude)):
+                yield Change(WINDOW_MODIFIED, wpath,
+                             ', '.join(sorted(self._changed_tags(lwin, rwin, exclude))))
+
+            if (_canonical(lwin.find('./connectors')) !=
+                    _canonical(rwin.find('./connectors'))):
+                yield Change(CONNECTORS, wpath, 'connectors')
+
+        ledges = set(_canonical(x) for x in local.findall('./edges/edge'))
+        redges = set(_canonical(x) for x in running.findall('./edges/edge'))
+
+        for edge in sorted(redges - ledges):
+            attrs = dict(edge[1])
+            yield Change(REPLACE, path, 'edge removed: %s -> %s' %
+                         (attrs.get('source'), attrs.get('target')))
+
+        for edge in sorted(ledges - redges):
+            attrs = dict(edge[1])
+            if attrs.get('source') not in added and attrs.get('target') not in added:
+                yield Change(REPLACE, path, 'edge added: %s -> %s' %
+                             (attrs.get('source'), attrs.get('target')))
+
+    @staticmethod
+    def _changed_tags(local, running, exclude):
+        ''' Return the names of the parts of a window that differ '''
+        out = set()
+        if dict(local.attrib) != dict(running.attrib):
+            out.add('attributes')
+        lchildren = _children(local, exclude=exclude)
+        rchildren = _children(running, exclude=exclude)
+        for tag in set(lchildren) | set(rchildren):
+            if lchildren.get(tag) != rchildren.get(tag):
+                out.add(tag)
+        return out
+
+    def __str__(self):
+        out = ['%s: %s' % (type(self).__name__, self.method)]
+        for item in self.changes:
+            if item.kind == METADATA:
+                detail = ', '.join(sorted(item.detail['set']) +
+                                   ['-%s' % x for x in item.detail['delete']])
+            else:
+                detail = item.detail
+            out.append('  %-16s %s (%s)' % (item.kind, item.path, detail))
+        return '\n'.join(out)
+
+    def __repr__(self):
+        return str(self)
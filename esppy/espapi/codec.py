@@ -4,16 +4,74 @@ import logging
 import struct
 import sys
 import io
+from ..utils.lazy import lazy_import
+
+numpy = lazy_import("numpy")
+pandas = lazy_import("pandas")
+
+OBJECT_BEGIN = ord('{')
+OBJECT_END = ord('}')
+ARRAY_BEGIN = ord('[')
+ARRAY_END = ord(']')
+STRING = ord('S')
+BUFFER = ord('B')
+I32 = ord('l')
+I64 = ord('L')
+DOUBLE = ord('D')
+
+FIXED_TYPES = {
+    I32:">i4",
+    I64:">i8",
+    DOUBLE:">f8"
+}
+
+INT32_MIN = -2**31
+INT32_MAX = 2**31 - 1
+INT64_MIN = -2**63
+INT64_MAX = 2**63 - 1
+
+_UINT32 = struct.Struct(">I")
+_INT32 = struct.Struct(">i")
+_INT64 = struct.Struct(">q")
+_DOUBLE = struct.Struct(">d")
 
 class JsonEncoder(object):
-    def __init__(self,o):
-        size = sys.getsizeof(o)
-        size += (size * .5)
-        size = int(size)
-        self._data = io.BytesIO();
+    '''
+    Encoder for the binary (ubjson-style) message format
+
+    Integers are written with the int32 ('l') or int64 ('L') markers,
+    floats with the double ('D') marker, bytes as buffers ('B'), and
+    everything else as strings ('S').  DataFrames are written as an
+    array of row objects, built column by column from the underlying
+    numpy arrays.
+
+    The output is written into a bytearray that is kept between
+    messages.  Call :meth:`reset` to reuse the encoder.
+
+    Parameters
+    ----------
+    o : any, optional
+        The object to encode
+
+    '''
+
+    def __init__(self,o = None):
+        self._data = bytearray()
         self._index = 0
         self._debug = False
-        self.encode(o,None)
+        if o is not None:
+            self.encode(o,None)
+
+    def reset(self):
+        '''
+        Start a new message, keeping the allocated buffer
+        '''
+        self._index = 0
+
+    def write(self,value):
+        end = self._index + len(value)
+        self._data[self._index:end] = value
+        self._index = end
 
     def encode(self,o,name):
         if isinstance(o,list):
@@ -28,58 +86,151 @@ class JsonEncoder(object):
             for x in o:
                 self.encode(o[x],x)
             self.endObject()
-        elif isinstance(o,bytes):
+        elif isinstance(o,pandas.DataFrame):
+            self.writeDataFrame(o,name)
+        elif isinstance(o,(bytes,bytearray)):
             self.writeBuffer(o,name)
         else:
             self.writeValue(o,name)
 
     def writeValue(self,value,name):
-        s = str(value)
-        self.writeName(name);
-        self.writeType('S');
-        self.writeLength(len(s));
+        if isinstance(value,(bool,numpy.bool_)) == False:
+            if isinstance(value,(int,numpy.integer)):
+                if INT32_MIN <= value <= INT32_MAX:
+                    self.writeName(name)
+                    self.write(b"l" + _INT32.pack(value))
+                    return
+                elif INT64_MIN <= value <= INT64_MAX:
+                    self.writeName(name)
+                    self.write(b"L" + _INT64.pack(value))
+                    return
+            elif isinstance(value,(float,numpy.floating)):
+                self.writeName(name)
+                self.write(b"D" + _DOUBLE.pack(value))
+                return
+
+        s = str(value).encode("utf-8")
+        self.writeName(name)
+        self.write(b"S" + _UINT32.pack(len(s)))
 
         if self._debug:
-            tmp = s
-            if len(tmp) > 50:
-                tmp = tmp.substr(0,20) + "..."
-            print("index: " + str(self._index) + " write string: " + str(tmp))
+            print("index: " + str(self._index) + " write string: " + str(s[:20]))
 
-        self._data.write(s.encode("utf-8"))
-        self._index += len(s)
+        self.write(s)
 
     def writeType(self,type):
         if self._debug:
             print("index: " + str(self._index) + " write type: " + str(type))
-        self._data.write(type.encode("utf-8"))
-        self._index += 1
+        self.write(type.encode("utf-8"))
 
     def writeLength(self,length):
         if self._debug:
             print("index: " + str(self._index) + " write length: " + str(length))
-
-        bytes = length.to_bytes(4,byteorder="big")
-
-        self._data.write(bytes)
-        self._index += 4
+        self.write(_UINT32.pack(length))
 
     def writeBuffer(self,value,name):
         self.writeName(name)
         self.writeType('B')
         self.writeLength(len(value))
-        self._data.write(value)
-        self._index += len(value)
+        self.write(value)
 
     def writeName(self,name):
         if name != None and len(name) > 0:
-            self.writeLength(len(name))
+            s = name.encode("utf-8")
+            self.writeLength(len(s))
 
             if self._debug:
                 print("index: " + str(self._index) + " write name: " + str(name))
 
-            self._data.write(name.encode("utf-8"))
+            self.write(s)
+
+    def writeDataFrame(self,df,name = None,index = False):
+        '''
+        Write the rows of a DataFrame as an array of objects
+
+        Numeric columns are packed for all rows at once into a numpy
+        record array, so only string columns are handled per value.
 
-            self._index += len(name)
+        Parameters
+        ----------
+        df : DataFrame
+            The rows to write
+        name : string, optional
+            The name of the array in the enclosing object
+        index : bool, optional
+            Should the index levels be written as fields?
+
+        '''
+        if index:
+            df = df.reset_index()
+
+        self.writeName(name)
+        self.beginArray()
+
+        nrows = len(df)
+
+        if nrows > 0:
+            # Each segment is either a numpy record array of fixed-size
+            # fields or a list of encoded values, one item per row
+            segments = []
+            fields = [("begin","S1")]
+            values = {"begin":b"{"}
+
+            for i,col in enumerate(df.columns):
+                column = df[col].to_numpy()
+                s = str(col).encode("utf-8")
+                header = _UINT32.pack(len(s)) + s
+                dtype = self.columnType(column)
+
+                if dtype is not None:
+                    marker = b"l" if dtype == FIXED_TYPES[I32] else b"L" if dtype == FIXED_TYPES[I64] else b"D"
+                    fields.append(("h" + str(i),"S" + str(len(header) + 1)))
+                    values["h" + str(i)] = header + marker
+                    fields.append(("v" + str(i),dtype))
+                    values["v" + str(i)] = column
+                else:
+                    if len(fields) > 0:
+                        segments.append(self.packFields(fields,values,nrows))
+                        fields = []
+                        values = {}
+                    prefix = header + b"S"
+                    encoded = [b"" if self.isMissing(v) else str(v).encode("utf-8") for v in column]
+                    segments.append([prefix + _UINT32.pack(len(e)) + e for e in encoded])
+
+            fields.append(("end","S1"))
+            values["end"] = b"}"
+            segments.append(self.packFields(fields,values,nrows))
+
+            if len(segments) == 1:
+                self.write(segments[0])
+            else:
+                for i,segment in enumerate(segments):
+                    if isinstance(segment,bytes):
+                        size = len(segment) // nrows
+                        segments[i] = numpy.frombuffer(segment,dtype = numpy.dtype((numpy.void,size))).tolist()
+                self.write(b"".join(map(b"".join,zip(*segments))))
+
+        self.endArray()
+
+    def columnType(self,column):
+        kind = column.dtype.kind
+        if kind in "iu":
+            if len(column) == 0 or (column.min() >= INT32_MIN and column.max() <= INT32_MAX):
+                return(FIXED_TYPES[I32])
+            if kind == "i" or column.max() <= INT64_MAX:
+                return(FIXED_TYPES[I64])
+        elif kind == "f":
+            return(FIXED_TYPES[DOUBLE])
+        return(None)
+
+    def packFields(self,fields,values,nrows):
+        a = numpy.empty(nrows,dtype = numpy.dtype(fields))
+        for name,value in values.items():
+            a[name] = value
+        return(a.tobytes())
+
+    def isMissing(self,value):
+        return(value is None or (isinstance(value,float) and value != value))
 
     def beginObject(self):
         self.writeType('{')
@@ -95,192 +246,275 @@ class JsonEncoder(object):
 
     @property
     def data(self):
-        return(self._data.getvalue())
+        return(bytes(self._data[:self._index]))
 
 class JsonDecoder(object):
-
-    def __init__(self,data):
-        self._data = data
+    '''
+    Decoder for the binary (ubjson-style) message format
+
+    The decoder reads directly from a memoryview of the message.
+    Scalars are read in place with struct.unpack_from, and runs of
+    fixed-size values in arrays are read with a single strided
+    numpy view.
+
+    Parameters
+    ----------
+    data : bytes-like
+        The encoded message
+    columns : bool, optional
+        If True, each "entries" array of objects is returned as a dict
+        of column lists keyed by field name rather than as a list of
+        dicts.  Missing values are None.  Fields of nested "event"
+        objects are added to the same columns.
+
+    '''
+
+    def __init__(self,data,columns = False):
+        self._data = memoryview(data)
+        if self._data.format != "B" or self._data.ndim != 1:
+            self._data = self._data.cast("B")
         self._size = len(self._data)
         self._index = 0
+        self._columns = columns
         self._o = None
-        self._debug = False
-        self.addTo(None,None)
-
-    def addTo(self,name,to):
+        if self._size > 0:
+            self._o = self.readItem()
 
-        type = self.getType(True)
+    def readItem(self):
+        type = self._data[self._index]
+        self._index += 1
 
-        if type == '{':
-            self.addObject(name,to)
-        elif type == '[':
-            self.addArray(name,to)
-        else:
-            self.addValue(name,to)
+        if type == OBJECT_BEGIN:
+            return(self.readObject())
+        elif type == ARRAY_BEGIN:
+            return(self.readArray())
 
-    def addObject(self,name,to):
-        if self._debug:
-            print("index: " + str(self._index) + " add object: " + str(name) + " to " + str(to))
+        return(self.readValue(type))
 
+    def readObject(self):
         o = {}
+        data = self._data
+        size = self._size
+        getLength = _UINT32.unpack_from
+        index = self._index
+
+        while index < size:
+            if data[index] == OBJECT_END:
+                index += 1
+                break
 
-        if self._o == None:
-            self._o = o
-        elif isinstance(to,list):
-            to.append(o)
-        else:
-            to[name] = o
+            length = getLength(data,index)[0]
+            index += 4
+            name = str(data[index:index + length],"utf-8")
+            index += length
 
-        while self._index < self._size:
-            type = self.getType(False)
+            # Strings are by far the most common values, so read them inline
+            if data[index] == STRING:
+                length = getLength(data,index + 1)[0]
+                index += 5
+                if length > 0:
+                    o[name] = str(data[index:index + length],"utf-8")
+                    index += length
+                continue
 
-            if type == '}':
+            self._index = index
+
+            if self._columns and name == "entries" and data[index] == ARRAY_BEGIN:
                 self._index += 1
-                break
+                value = self.readColumns()
             else:
-                length = self.getLength()
-                name = self.getString(length)
-                type = self.getType(False)
-
-                if type == '{':
-                    self.addTo(name,o)
-                elif type == '[':
-                    self.addTo(name,o)
-                else:
-                    self.addValue(name,o)
+                value = self.readItem()
 
-        if self._debug:
-            print("index: " + str(self._index) + " add object: " + str(name) + " to " + str(to) + " complete")
+            if value is not None:
+                o[name] = value
 
-    def addArray(self,name,to):
+            index = self._index
 
-        if self._debug:
-            print("index: " + str(self._index) + " add array: " + str(name) + " to " + str(to))
+        self._index = index
 
-        a = []
+        return(o)
 
-        if self._o == None:
-            self._o = a
-        elif isinstance(to,list):
-            to.append(a)
-        else:
-            to[name] = a
+    def readArray(self):
+        a = []
+        data = self._data
 
         while self._index < self._size:
-            type = self.getType(False)
+            type = data[self._index]
 
-            if (type == '['):
-                self.addTo("",a)
-            elif type == ']':
+            if type == ARRAY_END:
                 self._index += 1
                 break
-            elif type == '{':
-                self.addTo("",a)
+            elif type in FIXED_TYPES:
+                a.extend(self.readRun(type).tolist())
             else:
-                self.addValue("",a)
+                value = self.readItem()
+                if value is not None:
+                    a.append(value)
 
-        if self._debug:
-            print("index: " + str(self._index) + " add array: " + str(name) + " to " + str(to) + " complete")
+        return(a)
 
-    def addValue(self,name,to):
-        if self._debug:
-            print("index: " + str(self._index) + " add value: " + str(name) + " to " + str(to))
+    def readColumns(self):
+        columns = {}
+        count = 0
+        data = self._data
+
+        while self._index < self._size:
+            type = data[self._index]
+            self._index += 1
+
+            if type == ARRAY_END:
+                break
+            elif type != OBJECT_BEGIN:
+                self.readValue(type)
+                continue
+
+            self.readRow(columns,count)
+            count += 1
 
-        type = self.getType(True)
+        # Columns are only padded when written, so fill in trailing gaps
+        for column in columns.values():
+            if len(column) < count:
+                column.extend([None] * (count - len(column)))
+
+        return(columns)
+
+    def readRow(self,columns,count):
+        data = self._data
+        size = self._size
+        getLength = _UINT32.unpack_from
+        index = self._index
+
+        while index < size:
+            if data[index] == OBJECT_END:
+                index += 1
+                break
+
+            length = getLength(data,index)[0]
+            index += 4
+            name = str(data[index:index + length],"utf-8")
+            index += length
+
+            if data[index] == STRING:
+                length = getLength(data,index + 1)[0]
+                index += 5
+                value = None
+                if length > 0:
+                    value = str(data[index:index + length],"utf-8")
+                    index += length
+            elif name == "event" and data[index] == OBJECT_BEGIN:
+                self._index = index + 1
+                self.readRow(columns,count)
+                index = self._index
+                continue
+            else:
+                self._index = index
+                value = self.readItem()
+                index = self._index
+
+            column = columns.get(name)
+            if column is None:
+                column = columns[name] = []
+            length = len(column)
+            if length == count:
+                column.append(value)
+            elif length > count:
+                column[count] = value
+            else:
+                column.extend([None] * (count - length))
+                column.append(value)
+
+        self._index = index
+
+    def readValue(self,type):
         value = None
 
-        if type == 'S':
+        if type == STRING:
             length = self.getLength()
             if length > 0:
-                if self._debug:
-                    print("index: " + str(self._index) + " get string of " + str(length) + " bytes")
-
-                value = self._data[self._index:self._index + length].decode("utf-8")
-                self._index += length
-        elif type == 'B':
+                value = self.getString(length)
+        elif type == BUFFER:
             length = self.getLength()
             if length > 0:
-                if self._debug:
-                    print("index: " + str(self._index) + " get blob of " + str(length) + " bytes")
-
-                value = self._data[self._index:self._index + length]
-                value = b64encode(value).decode("utf-8")
+                value = b64encode(self._data[self._index:self._index + length]).decode("utf-8")
                 self._index += length
-        elif type == 'l':
+        elif type == I32:
             value = self.getI32()
-        elif type == 'L':
+        elif type == I64:
             value = self.getI64()
-        elif type == 'D':
+        elif type == DOUBLE:
             value = self.getDouble()
+        else:
+            raise ValueError("invalid type '" + chr(type) + "' at index " + str(self._index - 1))
 
-        if value != None:
-            if isinstance(to,list):
-                to.push(value)
-            else:
-                to[name] = value
+        return(value)
+
+    def readRun(self,type):
+        '''
+        Read consecutive values of one fixed-size type from an array
+
+        The markers are checked with a strided view in growing windows
+        so only the values in the run are scanned.
+        '''
+        dtype = numpy.dtype(FIXED_TYPES[type])
+        stride = dtype.itemsize + 1
+        available = (self._size - self._index) // stride
+        count = 0
+        n = min(available,64)
+
+        while True:
+            markers = numpy.ndarray((n - count,),dtype = numpy.uint8,buffer = self._data,
+                                    offset = self._index + count * stride,strides = (stride,))
+            mismatch = numpy.flatnonzero(markers != type)
+            if len(mismatch) > 0:
+                count += int(mismatch[0])
+                break
+            count = n
+            if n == available:
+                break
+            n = min(available,n * 4)
+
+        if count == 0:
+            raise ValueError("truncated value of type '" + chr(type) + "' at index " + str(self._index))
+
+        values = numpy.ndarray((count,),dtype = dtype,buffer = self._data,
+                               offset = self._index + 1,strides = (stride,))
+        self._index += count * stride
+
+        return(values.astype(dtype.newbyteorder("=")))
 
     def getType(self,increment):
         type = chr(self._data[self._index])
 
-        if self._debug:
-            print("index: " + str(self._index) + " get type: " + str(type))
-
         if increment:
             self._index += 1
 
         return(type)
 
     def getLength(self):
-        length = int.from_bytes(self._data[self._index:self._index + 4],byteorder="big")
-
-        if self._debug:
-            print("index: " + str(self._index) + " get length: " + str(length))
-
+        length = _UINT32.unpack_from(self._data,self._index)[0]
         self._index += 4
-
         return(length)
 
     def getString(self,length):
-        value = self._data[self._index:self._index + length].decode("utf-8")
-
-        if self._debug:
-            print("index: " + str(self._index) + " get string: " + str(value))
-
+        value = str(self._data[self._index:self._index + length],"utf-8")
         self._index += length
         return(value)
 
     def getI32(self):
-        value = int.from_bytes(self._data[self._index:self._index + 4],byteorder="big")
-
-        if self._debug:
-            print("index: " + str(self._index) + " get i32: " + str(value))
-
+        value = _INT32.unpack_from(self._data,self._index)[0]
         self._index += 4
-
         return(value)
 
     def getI64(self):
-        value = int.from_bytes(self._data[self._index:self._index + 8],byteorder="big")
-
-        if self._debug:
-            print("index: " + str(self._index) + " get i64: " + str(value))
-
+        value = _INT64.unpack_from(self._data,self._index)[0]
         self._index += 8
-
         return(value)
 
     def getDouble(self):
-        value = struct.unpack(">d",self._data[self._index:self._index + 8])[0]
-
-        if self._debug:
-            print("index: " + str(self._index) + " get double: " + str(value))
-
+        value = _DOUBLE.unpack_from(self._data,self._index)[0]
         self._index += 8
-
         return(value)
 
     @property
     def data(self):
         return(self._o)
-
-
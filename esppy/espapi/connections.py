@@ -4,12 +4,16 @@ from ..utils.authorization import Authorization
 #from ..utils.resources import Resources
 from urllib.parse import urlparse
 from base64 import b16encode, b64encode
+from csv import reader as csvReader
 from esppy.espapi.eventsources import EventSources
-import pandas as pd
 import esppy.espapi.tools as tools
 import esppy.espapi.codec as codec
+import itertools
+import io
 import threading
 import logging
+import requests
+import queue
 import esppy
 from esppy.websocket import createWebSocket
 import json
@@ -18,6 +22,10 @@ import ssl
 import six
 import re
 import os
+from ..utils.lazy import lazy_import
+
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
 
 class Connection(tools.Options):
     def __init__(self,esp,**kwargs):
@@ -50,6 +58,9 @@ class Connection(tools.Options):
         self._headers = None
         self._authorization = None
 
+        self._encoder = codec.JsonEncoder()
+        self._encoderLock = threading.Lock()
+
     def start(self,readyCb = None):
         if (self.isConnected):
             return
@@ -90,8 +101,19 @@ class Connection(tools.Options):
 
     def sendBinary(self,o):
         if self._websocket != None:
-            encoder = codec.JsonEncoder(o)
-            self._websocket.sendBinary(encoder.data)
+            with self._encoderLock:
+                self._encoder.reset()
+                self._encoder.encode(o,None)
+                data = self._encoder.data
+            self._websocket.sendBinary(data)
+
+    def sendEncoded(self,data,binary = False):
+        # Send a message that is already encoded
+        if self._websocket != None:
+            if binary:
+                self._websocket.sendBinary(data)
+            else:
+                self._websocket.send(data)
 
     def getUrl(self):
         return(None)
@@ -297,7 +319,9 @@ class ServerConnection(Connection):
             self.processXml(xml)
 
     def data(self,data):
-        decoder = codec.JsonDecoder(data)
+        # The "columns" option delivers event entries as lists of
+        # column values rather than one object per event
+        decoder = codec.JsonDecoder(data,self.getOpt("columns",False))
         if decoder.data != None:
             if self.getOpt("debug",False):
                 logging.info(decoder.data)
@@ -340,6 +364,7 @@ class ServerConnection(Connection):
                         complete = xml.get("complete")
                         publisher["complete"] = (complete == "true")
                         del self._urlPublishers[id]
+                        publisher["done"].set()
 
         else:
             logging.info("GOT MSG: " + str(xml))
@@ -419,20 +444,39 @@ class ServerConnection(Connection):
         o["url"] = url
         o["blocksize"] = blocksize
 
-        publisher = {"complete":False}
+        publisher = {"complete":False,"done":threading.Event()}
         self._urlPublishers[id] = publisher
 
         self.send(json)
 
         if wait:
-            while publisher["complete"] == False:
-                time.sleep(1)
+            publisher["done"].wait()
 
     def publishDataFrame(self,path,df,**kwargs):
+        size = tools.Options(**kwargs).getOpt("size",100)
+        blocks = (df.iloc[start:start + size] for start in range(0,len(df),size))
+        return(self.publishBlocks(path,blocks,**kwargs))
+
+    def publishList(self,path,l,**kwargs):
+        size = tools.Options(**kwargs).getOpt("size",100)
+        if isinstance(l,list):
+            blocks = (l[start:start + size] for start in range(0,len(l),size))
+        else:
+            it = iter(l)
+            blocks = iter(lambda: list(itertools.islice(it,size)),[])
+        return(self.publishBlocks(path,blocks,**kwargs))
+
+    def publishBlocks(self,path,blocks,**kwargs):
+        # Blocks (DataFrames or lists of dicts) are encoded on this thread
+        # while a SendQueue writes the previous ones to the websocket.
+        # Options: binary, pipeline (default True), depth (default 4).
+        # Returns the rows, blocks, seconds, and rows_per_sec.
+
         opts = tools.Options(**kwargs)
 
-        size = opts.getOpt("size",100)
-        blocksize = opts.getOpt("blocksize",1)
+        binary = opts.getOpt("binary",False)
+        pipeline = opts.getOpt("pipeline",True)
+        depth = opts.getOpt("depth",4)
 
         id = tools.guid()
 
@@ -445,63 +489,59 @@ class ServerConnection(Connection):
 
         request["action"] = "publish"
 
-        data = []
-
-        for index, row in df.iterrows():
-            o = {}
-            for col in df.columns:
-                o[col] = row[col]
-            data.append(o)
-            if len(data) == size:
-                request["data"] = data
-                self.send(json)
-                data = []
-
-        if len(data) > 0:
-            request["data"] = data
-            self.send(request)
+        sender = None
 
-        request["data"] = None
-        request["action"] = "delete"
-        self.send(json)
-
-    def publishList(self,path,l,**kwargs):
-        opts = tools.Options(**kwargs)
+        if pipeline:
+            sender = SendQueue(self,depth)
 
-        size = opts.getOpt("size",100)
-        blocksize = opts.getOpt("blocksize",1)
+        encoder = codec.JsonEncoder()
 
-        id = tools.guid()
+        rows = 0
+        count = 0
+        started = time.time()
 
-        json = {"publisher":{}}
-        request = json["publisher"]
-        request["id"] = id
-        request["action"] = "set"
-        request["window"] = path
-        self.send(json)
+        try:
+            for block in blocks:
+                if len(block) == 0:
+                    continue
 
-        request["action"] = "publish"
+                # Binary requests encode DataFrame blocks straight from
+                # the columns, text requests send them as records
+                if binary:
+                    request["data"] = block
+                    encoder.reset()
+                    encoder.encode(json,None)
+                    data = encoder.data
+                else:
+                    if isinstance(block,pd.DataFrame):
+                        block = block.to_dict("records")
+                    request["data"] = block
+                    data = str(json)
 
-        data = []
+                if sender != None:
+                    sender.put(data,binary)
+                else:
+                    self.sendEncoded(data,binary)
 
-        for i in l:
-            o = {}
-            for key,value in i.items():
-                o[key] = i[key]
-            data.append(o)
-            if len(data) == size:
-                request["data"] = data
-                self.send(json)
-                data = []
+                rows += len(block)
+                count += 1
+        finally:
+            if sender != None:
+                sender.close()
 
-        if len(data) > 0:
-            request["data"] = data
-            self.send(json)
+        elapsed = time.time() - started
 
         request["data"] = None
         request["action"] = "delete"
         self.send(json)
 
+        stats = {"rows":rows,"blocks":count,"seconds":elapsed,"rows_per_sec":(rows / elapsed) if elapsed > 0 else 0.0}
+
+        if self.getOpt("debug",False) or opts.getOpt("debug",False):
+            logging.info("published " + str(rows) + " rows to " + str(path) + " at " + str(int(stats["rows_per_sec"])) + " rows/sec")
+
+        return(stats)
+
     def getStats(self):
         return(self._stats)
 
@@ -578,10 +618,12 @@ class ServerConnection(Connection):
         else:
             self.version = version
 
-        for c in self._datasources.values():
+        # Datasources can be added from other threads while the
+        # handshake completes, so iterate over copies
+        for c in list(self._datasources.values()):
             c.open()
 
-        for p in self._publishers.values():
+        for p in list(self._publishers.values()):
             p.open()
 
         if len(self._log._delegates) > 0:
@@ -597,7 +639,7 @@ class ServerConnection(Connection):
                 delegate.ready(self)
 
     def closed(self):
-        for c in self._datasources.values():
+        for c in list(self._datasources.values()):
             c.clear()
 
         if tools.supports(self._delegate,"closed"):
@@ -628,6 +670,52 @@ class ServerConnection(Connection):
     def version(self,value):
         self._version = float(value)
 
+class SendQueue(object):
+    # Bounded queue of encoded messages written to a connection's
+    # websocket by a background thread
+
+    def __init__(self,connection,depth = 4):
+        self._connection = connection
+        self._queue = queue.Queue(max(depth,1))
+        self._error = None
+        self._thread = threading.Thread(target = self.run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def put(self,data,binary = False):
+        if self._error != None:
+            raise self._error
+        self._queue.put((data,binary))
+
+    def run(self):
+        while True:
+            item = self._queue.get()
+
+            if item == None:
+                break
+
+            if self._error != None:
+                continue
+
+            data,binary = item
+
+            try:
+                websocket = self._connection._websocket
+                if websocket == None:
+                    raise Exception("the connection is closed")
+                if binary:
+                    websocket.sendBinary(data)
+                else:
+                    websocket.send(data)
+            except Exception as e:
+                self._error = e
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        if self._error != None:
+            raise self._error
+
 class Datasource(tools.Options):
     def __init__(self,connection,**kwargs):
         tools.Options.__init__(self,**kwargs)
@@ -642,16 +730,21 @@ class Datasource(tools.Options):
 
     def setSchemaFromXml(self,xml):
         self._schema.fromXml(xml)
+        self.initData()
         for d in self._delegates:
             if tools.supports(d,"schemaSet"):
                 d.schemaSet(self)
 
     def setSchemaFromJson(self,json):
         self._schema.fromJson(json)
+        self.initData()
         for d in self._delegates:
             if tools.supports(d,"schemaSet"):
                 d.schemaSet(self)
 
+    def initData(self):
+        pass
+
     def setFilter(self,value):
         self.setOpt("filter",value)
         self.set()
@@ -727,6 +820,8 @@ class Datasource(tools.Options):
             return(l)
         elif isinstance(self._data,list):
             return(self._data)
+        elif isinstance(self._data,tools.RingBuffer):
+            return(self._data.getRows())
 
     def getValues(self,name):
 
@@ -735,6 +830,9 @@ class Datasource(tools.Options):
         if f == None:
             return(None)
 
+        if isinstance(self._data,tools.Columns) and self._data.hasColumn(name):
+            return(list(self._data.getColumn(name)))
+
         values = []
 
         if isinstance(self._data,dict):
@@ -748,7 +846,7 @@ class Datasource(tools.Options):
                     values.append(0.0)
                 else:
                     values.append("")
-        elif isinstance(self._data,list):
+        elif isinstance(self._data,(list,tools.RingBuffer)):
             for value in self._data:
                 if name in value:
                     if f["isNumber"]:
@@ -791,12 +889,15 @@ class Datasource(tools.Options):
 
         if isinstance(self._data,dict):
             items = self._data.values()
-        elif isinstance(self._data,list):
+        elif isinstance(self._data,(list,tools.RingBuffer)):
             items = self._data
 
         if items == None:
             raise Exception("invalid data")
 
+        if isinstance(self._data,tools.Columns) and all(self._data.hasColumn(f["name"]) for f in valueFields):
+            return(self.getColumnValuesBy(keyFields,valueFields,timeKeys,delimiter))
+
         data = {}
 
         for o in items:
@@ -843,6 +944,32 @@ class Datasource(tools.Options):
 
         return(v)
 
+    def getColumnValuesBy(self,keyFields,valueFields,timeKeys,delimiter):
+        # The group index of the keys is kept up to date as events
+        # arrive, so only the groups are visited here
+        index = self._data.getGroupIndex([f["name"] for f in keyFields],delimiter)
+
+        groups = index.getGroups()
+
+        keyValues = []
+
+        for k in index.getKeys(groups):
+            if timeKeys:
+                keyValues.append(pd.to_datetime(k,unit="us"))
+            else:
+                keyValues.append(k)
+
+        values = {}
+
+        for f in valueFields:
+            name = f["name"]
+            if f["isNumber"]:
+                values[name] = index.getValues(name,groups).tolist()
+            else:
+                values[name] = [0.0] * len(groups)
+
+        return({"keys":keyValues,"values":values})
+
     def getSelectedKeys(self):
         keys = []
 
@@ -868,6 +995,11 @@ class Datasource(tools.Options):
         else:
             fields = self._schema._fields
 
+        if isinstance(self._data,tools.Columns):
+            names = [f["name"] for f in fields]
+            if all(self._data.hasColumn(name) for name in names):
+                return(self._data.getDataFrame(names))
+
         if isinstance(self._data,dict):
             #data["@key"] = []
 
@@ -887,7 +1019,7 @@ class Datasource(tools.Options):
                         data[name].append(0.0)
                     else:
                         data[name].append("")
-        elif isinstance(self._data,list):
+        elif isinstance(self._data,(list,tools.RingBuffer)):
 
             for f in fields:
                 data[f["name"]] = []
@@ -939,7 +1071,7 @@ class Datasource(tools.Options):
                 d.infoChanged(self)
 
     def isList(self):
-        return(self._data != None and isinstance(self._data,list))
+        return(self._data != None and isinstance(self._data,(list,tools.RingBuffer)))
 
     def isDict(self):
         return(self._data != None and isinstance(self._data,dict))
@@ -969,7 +1101,10 @@ class EventCollection(Datasource):
             self._path = path
         self._page = 0
         self._pages = 0
-        self._data = {}
+        self._data = tools.KeyedStore()
+
+    def initData(self):
+        self._data = tools.KeyedStore(self._schema.fields)
 
     def open(self):
         json = {"event-collection":{}}
@@ -1160,8 +1295,7 @@ class EventCollection(Datasource):
 
         if clear:
             #selected = self.getSelectedKeys()
-            self._data = {}
-            self._list = []
+            self._data.clear()
 
         for e in events:
             key = e["@key"]
@@ -1173,14 +1307,10 @@ class EventCollection(Datasource):
                     opcode = e["@opcode"]
 
                 if opcode == "delete":
-                    if key in self._data:
-                        tools.removeFrom(self._list,self._data[key])
-                        del self._data[key]
+                    self._data.remove(key)
                 elif clear:
                     o = {}
                     o["@key"] = key
-                    self._data[key] = o
-                    self._list.append(o)
                     if selected == None:
                         o["_selected_"] = False
                     else:
@@ -1189,21 +1319,22 @@ class EventCollection(Datasource):
                     for column in self._schema._columns:
                         if column in e:
                             o[column] = e[column]
+
+                    self._data.put(key,o)
                 else:
-                    if key in self._data:
-                        o = self._data[key]
-                        tools.setItem(self._list,o)
-                    else:
+                    o = self._data.get(key)
+
+                    if o == None:
                         o = {}
                         o["@key"] = key
                         o["_selected_"] = False
-                        self._data[key] = o
-                        self._list.append(o)
 
                     for column in self._schema._columns:
                         if column in e:
                             o[column] = e[column]
 
+                    self._data.put(key,o)
+
         self.deliverDataChange(events,clear)
 
     def getInfo(self):
@@ -1249,7 +1380,7 @@ class EventCollection(Datasource):
         return({"rows":rows,"columns":columns,"cells":cells})
 
     def clear(self):
-        self._data = {}
+        self._data.clear()
         self.deliverDataChange(None,True)
 
 class EventStream(Datasource):
@@ -1259,7 +1390,7 @@ class EventStream(Datasource):
             self._path = path.path
         else:
             self._path = path
-        self._data = []
+        self._data = tools.RingBuffer(self.getOpt("maxevents",50))
         self._counter = 1
 
     def open(self):
@@ -1367,6 +1498,15 @@ class EventStream(Datasource):
 
         self._counter = 1
 
+        # Events are kept in a ring of maxevents rows, with NumPy
+        # columns for the schema fields unless "columnar" is off
+        fields = None
+
+        if self.getOpt("columnar",True):
+            fields = self._schema.fields
+
+        self._data = tools.RingBuffer(self.getOpt("maxevents",50),fields)
+
     def events(self,data):
 
         if "entries" in data == False:
@@ -1431,6 +1571,8 @@ class EventStream(Datasource):
         self.process(data)
 
     def process(self,events):
+        self._data.setCapacity(self.getOpt("maxevents",50))
+
         for e in events:
             o = {}
 
@@ -1447,14 +1589,6 @@ class EventStream(Datasource):
 
             self._data.append(o)
 
-        maxEvents = self.getOpt("maxevents",50)
-
-        diff = len(self._data) - maxEvents
-
-        if diff > 0:
-            for i in range(0,diff):
-                del self._data[0]
- 
         self.deliverDataChange(events,False)
 
     def getData(self):
@@ -1497,7 +1631,7 @@ class EventStream(Datasource):
         return({"rows":rows,"columns":columns,"cells":cells})
 
     def clear(self):
-        self._data = []
+        self._data.clear()
         self.deliverDataChange(None,True)
 
 class Publisher(tools.Options):
@@ -1563,12 +1697,11 @@ class Publisher(tools.Options):
         self._connection.publishUrl(self._path,url,**kwargs)
 
     def publishCsvFromFile(self,filename,**kwargs):
-        with open(filename) as f:
-            data = f.read()
-            self.publishCsv(data,**kwargs)
+        self._csv = dict(file=filename,options=tools.Options(**kwargs))
+        self.csv()
 
     def publishCsvFromUrl(self,url,**kwargs):
-        data = requests.get(url)
+        data = requests.get(url).text
         self.publishCsv(data,**kwargs)
 
     def publishCsv(self,data,**kwargs):
@@ -1583,18 +1716,30 @@ class Publisher(tools.Options):
 
         args = opts.options.copy()
 
-        self._csv["items"] = self._schema.createDataFromCsv(self._csv["data"],**args)
-
         pause = opts.getOpt("pause",0)
         opcode = opts.getOpt("opcode","insert")
+        blocksize = max(opts.getInt("blocksize",1),1)
 
-        for o in self._csv["items"]:
-            if "@opcode" in o:
-                o["opcode"] = o["@opcode"]
-            else:
-                o["opcode"] = opcode
-            self.add(o)
+        # Files are read in chunks rather than all at once
+        if "file" in self._csv:
+            source = open(self._csv["file"])
+        else:
+            source = self._csv["data"]
+
+        try:
+            for block in self._schema.iterDataFromCsv(source,**args):
+                for o in block:
+                    if "@opcode" in o:
+                        o["opcode"] = o["@opcode"]
+                    else:
+                        o["opcode"] = opcode
+                    self.add(o)
+                    if len(self._data) >= blocksize:
+                        self.publish()
             self.publish()
+        finally:
+            if "file" in self._csv:
+                source.close()
 
         if opts.getOpt("close_on_complete",False):
             self.close()
@@ -2193,93 +2338,103 @@ class Schema(object):
         return(s)
 
     def createDataFromCsv(self,csv,**kwargs):
+        data = []
+
+        for block in self.iterDataFromCsv(csv,**kwargs):
+            data.extend(block)
+
+        return(data)
+
+    def iterDataFromCsv(self,csv,**kwargs):
+        # Parses CSV text, a file object, or an iterable of lines with the
+        # csv module and yields lists of at most "chunksize" events, so
+        # files can be processed without reading them into memory. With
+        # "typed", int and float fields are converted from the text.
+
         opts = tools.Options(**kwargs)
 
         header = opts.getOpt("header",False)
         opcodes = opts.getOpt("opcodes",False)
         flags = opts.getOpt("flags",False)
+        typed = opts.getOpt("typed",False)
+        chunksize = max(opts.getInt("chunksize",10000),1)
 
-        data = []
-        fields = self.getFields()
-        headers = None
-        quotes = 0
+        if isinstance(csv,str):
+            csv = io.StringIO(csv)
 
-        lines = csv.split("\n")
+        reader = csvReader(csv,escapechar = "\\",doublequote = False)
 
-        for row,line in enumerate(lines):
-            if header and row == 0:
-                headers = line
-                row += 1
-                continue
+        names = None
+        offset = 0
 
-            if len(line) == 0:
-                row += 1
-                continue
+        if header == False:
+            names = [f["name"] for f in self.getFields()]
+            if opcodes:
+                offset += 1
+            if flags:
+                offset += 1
 
-            a = []
+        converters = None
+        block = []
 
-            word = ""
+        for a in reader:
+            if len(a) == 0:
+                continue
 
-            for idx in range(0,len(line)):
-                c = line[idx]
+            if names == None:
+                names = []
+                for s in a:
+                    field = self.getField(s.strip())
+                    names.append(field["name"] if field != None else None)
+                continue
 
-                if c == ',':
-                    if quotes > 0:
-                        word += c
-                    else:
-                        a.append(word)
-                        word = ""
-                elif c == '\"':
-                    if prev == '\\':
-                        word += c
-                    else:
-                        quotes ^= 1
-                elif c == '\\':
-                    if prev == '\\':
-                        word += c
-                else:
-                    word += c
-                prev = c
+            if converters == None:
+                converters = [self.getConverter(name) if typed else None for name in names]
 
-            if len(word) > 0:
-                a.append(word)
+            # Empty trailing values are left out of the event
+            if len(a[-1]) == 0:
+                a.pop()
 
             o = {}
-            index = 0
 
-            if headers != None:
-                for j in range(0,len(a)):
-                    field = self.getField(headers[j])
-                    if field != None:
-                        o[field["name"]] = a[j]
-            else:
-                for j in range(0,len(a)):
-                    if opcodes and j == 0:
-                        s = a[j].lower()
-
-                        if s == "i" or s == "u" or s == "p" or s == "d":
-                            if s == "u":
-                                o["@opcode"] = "update"
-                            elif s == "p":
-                                o["@opcode"] = "upsert"
-                            elif s == "d":
-                                o["@opcode"] = "delete"
+            if offset > 0 and len(a) > 0:
+                s = a[0].lower()
+                if s == "u":
+                    o["@opcode"] = "update"
+                elif s == "p":
+                    o["@opcode"] = "upsert"
+                elif s == "d":
+                    o["@opcode"] = "delete"
+
+            for name,converter,value in zip(names,converters,a[offset:]):
+                if name == None:
+                    continue
+                if converter != None:
+                    if len(value) == 0:
                         continue
+                    value = converter(value)
+                o[name] = value
 
-                    if flags and j == 1:
-                        s = a[j].strip().lower()
-                        continue
+            block.append(o)
 
-                    if index < len(fields):
-                        field = fields[index]
-                        o[field["name"]] = a[j]
-                        index += 1
+            if len(block) >= chunksize:
+                yield(block)
+                block = []
 
-            data.append(o)
+        if len(block) > 0:
+            yield(block)
 
-            row += 1
+    def getConverter(self,name):
+        field = self.getField(name) if name != None else None
 
-        return(data)
+        if field == None:
+            return(None)
+        elif field["type"] == "int":
+            return(tools.toInt)
+        elif field["type"] == "float":
+            return(float)
+
+        return(None)
 
     def hasFields(self):
         return(len(self._fields) > 0)
@@ -1,8 +1,12 @@
+from concurrent.futures import ThreadPoolExecutor
+import itertools
+import heapq
 import threading
 import requests
 import datetime
 import logging
 import time
+import types
 
 from urllib.parse import urlparse
 
@@ -11,7 +15,13 @@ import esppy.espapi.tools as tools
 from xml.etree import ElementTree
 
 class EventSources(object):
-    def __init__(self,connection,delegate = None):
+    # Event sources are run from a heap of due times on one scheduler
+    # thread. The processing of the sources and the sending of their
+    # events are run by a bounded pool of worker threads, and senders
+    # with a delay put their next step back on the heap instead of
+    # sleeping in a worker.
+
+    def __init__(self,connection,delegate = None,workers = 4):
         self._connection = connection
         self._delegate = delegate
         self._eventsources = {}
@@ -19,6 +29,15 @@ class EventSources(object):
         self._paused = False
         self._restart = False
         self._config = None
+        self._workers = workers
+        self._heap = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._pending = 0
+        self._started = set()
+        self._dependents = {}
+        self._pool = None
+        self._thread = None
         self._connection.addDelegate(self)
 
     def configure(self,config,**kwargs):
@@ -117,76 +136,139 @@ class EventSources(object):
             self._restart = False
             self.start()
 
+    def addEdge(self,source,target):
+        if (source in self._eventsources) == False:
+            raise Exception("event source " + source + " not found")
+        if (target in self._eventsources) == False:
+            raise Exception("event source " + target + " not found")
+
+        tools.addTo(self._eventsources[target]._sources,self._eventsources[source])
+
     def start(self):
+        if self._running:
+            return
+
         for es in self._eventsources.values():
             es.init()
 
-        self._running = True
+        # Sources are started when their dependencies are done
+        self._dependents = {}
 
-        threading.Timer(1,self.run).start()
+        for es in self._eventsources.values():
+            for source in es._sources:
+                self._dependents.setdefault(source.name,[]).append(es)
 
-    def run(self):
-        while self._running:
+        with self._condition:
+            self._heap = []
+            self._pending = 0
+            self._started = set()
+            self._running = True
+
+            for es in self._eventsources.values():
+                if es.repeat >= 0 and len(es._sources) == 0:
+                    self.schedule(0,self.createTask(es))
+
+        self._pool = ThreadPoolExecutor(max_workers = self._workers)
+        self._thread = threading.Thread(target = self.run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+
+    def schedule(self,delay,task):
+        with self._condition:
+            heapq.heappush(self._heap,(time.time() + delay,next(self._sequence),task))
+            self._condition.notify_all()
+
+    def submit(self,task):
+        with self._condition:
+            self._pending += 1
+        self._pool.submit(self.runTask,task)
+
+    def runTask(self,task):
+        try:
+            task()
+        except Exception:
+            logging.exception("event source task failed")
+        finally:
+            with self._condition:
+                self._pending -= 1
+                self._condition.notify_all()
+
+    def createTask(self,es):
+        return(lambda: self.processSource(es))
+
+    def processSource(self,es):
+        if es.done:
+            return
+
+        sends = es._sends
+
+        if es.process():
+            # Sources that did not send anything are finished right away
+            if es._sends == sends:
+                self.sent(es)
+        else:
+            # The source is not ready, probably still waiting for the
+            # schema of its window
+            self.schedule(1,self.createTask(es))
+
+    def sent(self,es):
+        if es.done == False:
+            delay = max(es.timestamp + es.interval - time.time(),0)
+            self.schedule(delay,self.createTask(es))
+            return
 
-            if self._paused:
-                while True:
-                    time.sleep(1)
-                    if self._paused == False:
+        for target in self._dependents.get(es.name,[]):
+            if target.repeat >= 0 and target.checkDependencies():
+                with self._condition:
+                    if target.name in self._started:
+                        continue
+                    self._started.add(target.name)
+                self.schedule(0,self.createTask(target))
+
+    def run(self):
+        with self._condition:
+            while self._running:
+                if self._paused:
+                    self._condition.wait()
+                    continue
+
+                if len(self._heap) == 0:
+                    if self._pending == 0:
                         break
+                    self._condition.wait()
+                    continue
 
-            current = datetime.datetime.now()
-            eventsources = []
-            depsPending = False
-            minInterval = 5000
-            completed = 0
+                delay = self._heap[0][0] - time.time()
 
-            for es in self._eventsources.values():
-                if es.repeat >= 0 and es.done == False:
-                    if es.sending == False:
-                        if es.checkDependencies():
-                            diff = current.timestamp() - es.timestamp
-                            interval = es.interval
-
-                            if diff > interval:
-                                if interval < minInterval:
-                                    minInterval = interval
-                                eventsources.append(es)
-                            else:
-                                diff = current.getTime() - es.timestamp + interval
-
-                                if diff < minInterval:
-                                    minInterval = diff
-                        else:
-                            depsPending = True
-                else:
-                    completed += 1
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
 
-            for es in eventsources:
-                if es.repeat >= 0:
-                    es.process()
+                due,sequence,task = heapq.heappop(self._heap)
 
-            if completed == len(self._eventsources.values()):
-                self._running = False
-            else:
-                if depsPending:
-                    interval = 1
-                else:
-                    interval = minInterval / 1000
+                self._pending += 1
+                self._pool.submit(self.runTask,task)
+
+            self._running = False
 
-                time.sleep(interval)
+        self._pool.shutdown(wait = False)
 
         if tools.supports(self._delegate,"complete"):
-            threading.Timer(1,self._delegate.complete(self)).start()
+            threading.Timer(1,self._delegate.complete,[self]).start()
 
     def togglePlay(self):
 
         if self._running == False:
-            self.start()
-            self._paused = False
+            self.paused = False
         elif self._paused:
-            self._paused = False
+            self.paused = False
         else:
-            self._paused = True
+            self.paused = True
 
         return(self._paused == False)
 
@@ -208,7 +290,9 @@ class EventSources(object):
 
     @paused.setter
     def paused(self,value):
-        self._paused = value
+        with self._condition:
+            self._paused = value
+            self._condition.notify_all()
 
         if self._paused == False:
             if self._running == False:
@@ -216,6 +300,7 @@ class EventSources(object):
 
 class EventSource(tools.Options):
     def __init__(self,eventsources,**kwargs):
+        self._interval = 30
         tools.Options.__init__(self,**kwargs)
 
         self._window = self.getOpt("window")
@@ -235,8 +320,12 @@ class EventSource(tools.Options):
         self._senders = []
 
         self._publisher = None
+        self._sends = 0
+        self._stats = None
 
-        self._interval = 30000
+    def optionSet(self,name,value):
+        if name == "interval" and value != None:
+            self.interval = value
 
     def configure(self,config):
         xml = None
@@ -251,9 +340,6 @@ class EventSource(tools.Options):
             value = node.text
             self.setOpt(name,value)
 
-            if name == "interval":
-                self.interval = value
-
     def init(self):
         self._times = 0
         self._timestamp = 0
@@ -274,6 +360,13 @@ class EventSource(tools.Options):
                 raise Exception("cyclical dependency detected on " + source.name + " to " + self.name)
             source.checkCycles()
 
+    def dependsOn(self,eventsource):
+        for source in self._sources:
+            if source == eventsource or source.dependsOn(eventsource):
+                return(True)
+
+        return(False)
+
     def checkDependencies(self):
         code = True
 
@@ -289,15 +382,28 @@ class EventSource(tools.Options):
         return(code)
 
     def process(self,**kwargs):
-        if self.run(**kwargs):
-            self._timestamp = datetime.datetime.now()
-            self._times += 1
+        if self.run(**kwargs) == False:
+            return(False)
 
-            if self.repeat > 0 and self._times >= self.repeat:
-                self._done = True
+        self._timestamp = time.time()
+        self._times += 1
+
+        if self.repeat > 0 and self._times >= self.repeat:
+            self._done = True
+
+        return(True)
+
+    def sent(self,sender):
+        self._stats = sender.stats
+
+        if self.getOpt("debug",False):
+            logging.info("event source " + self.name + " sent: " + str(self._stats))
+
+        tools.removeFrom(self._senders,sender)
+        self._eventsources.sent(self)
  
     def send(self,data):
-        #Sender(self,data).run()
+        self._sends += 1
         Sender(self,data)
 
     def run(self,**kwargs):
@@ -321,7 +427,7 @@ class EventSource(tools.Options):
 
     @interval.setter
     def interval(self,value):
-        a = value.split(" ")
+        a = str(value).split(" ")
         value = float(a[0])
         if len(a) == 2:
             unit = a[1]
@@ -365,10 +471,19 @@ class EventSource(tools.Options):
     def sending(self):
         return(len(self._senders) > 0)
 
+    @property
+    def stats(self):
+        # The stats of the current send, or of the last one
+        if len(self._senders) > 0:
+            return(self._senders[0].stats)
+        return(self._stats)
+
 class CsvEventSource(EventSource):
     def __init__(self,eventsources,**kwargs):
         EventSource.__init__(self,eventsources,**kwargs)
         self._data = None
+        self._file = None
+        self._events = None
         self._filter = None
         self._supplement = None
 
@@ -378,20 +493,20 @@ class CsvEventSource(EventSource):
         if self.hasOpt("csv") == False and self.hasOpt("url") == False:
             raise Exception("you must specify CSV data for the event source with either the csv or url option")
 
+        self._data = None
+        self._file = None
+        self._events = None
+
         if self.hasOpt("csv"):
             self._data = self.getOpt("csv")
         else:
-            data = None
             url = urlparse(self.getOpt("url"))
             if url.scheme == "file":
-                with open(url.netloc) as reader:
-                    data = reader.read()
+                # Files are parsed when the events are sent
+                self._file = url.netloc + url.path
             else:
                 response = requests.get(self.getOpt("url"))
-                data = response.text
-
-            #self._data = data.split("\n")
-            self._data = data
+                self._data = response.text
 
         #if self.hasOpt("filter"):
             #self._filter = Function("o",self.getOpt("filter"))
@@ -403,7 +518,7 @@ class CsvEventSource(EventSource):
         code = False
 
         if self._publisher.schema.size > 0:
-            if self._data != None:
+            if self._data != None or self._file != None:
                 code = True
 
                 delegate = {}
@@ -413,64 +528,154 @@ class CsvEventSource(EventSource):
                 if self._supplement != None:
                     delegate["supplement"] = self._supplement
                 opts = self.options.copy()
+                opts.pop("csv",None)
                 opts["delegate"] = delegate
-                data = self._publisher._schema.createDataFromCsv(self._data,**opts)
+
+                # The events are parsed once and reused on each repeat.
+                # With the "cache" option off, files are streamed from
+                # disk in chunks on every repeat instead.
+                if self._events != None:
+                    data = self._events
+                elif self._file != None and self.getOpt("cache",True) in (False,"false"):
+                    data = self.readFile(opts)
+                else:
+                    if self._file != None:
+                        with open(self._file) as reader:
+                            data = self._publisher._schema.createDataFromCsv(reader,**opts)
+                    else:
+                        data = self._publisher._schema.createDataFromCsv(self._data,**opts)
+                    self._events = data
+
                 self.send(data)
 
         return(code)
 
+    def readFile(self,opts):
+        with open(self._file) as reader:
+            for block in self._publisher._schema.iterDataFromCsv(reader,**opts):
+                for o in block:
+                    yield(o)
+
 class Sender(object):
+    # Sends the events of a source in chunks of "chunk_size" events.
+    # The "delay" option waits that many milliseconds between chunks and
+    # the "rate" option paces the events per second with a token bucket.
+    # Steps that have to wait are put back on the scheduler heap.
+
     def __init__(self,eventsource,data):
 
-        if isinstance(data,list) == False:
-            raise Exception("data must be an array")
+        if isinstance(data,(list,types.GeneratorType)) == False:
+            raise Exception("data must be an array or a generator")
 
         self._eventsource = eventsource
-        self._data = data
         self._opcode = eventsource.getOpt("opcode","upsert")
         self._delay = eventsource.getInt("delay",0)
-        self._chunksize = eventsource.getInt("chunk_size",1)
+        self._rate = float(eventsource.getOpt("rate",0))
+        self._chunksize = eventsource.getInt("chunk_size",0)
+
+        # Without a chunk size, paced events are sent about 100 times a
+        # second, one at a time with a delay, and all at once otherwise
+        if self._chunksize <= 0:
+            if self._rate > 0:
+                self._chunksize = max(int(self._rate / 100),1)
+            elif self._delay > 0:
+                self._chunksize = 1
+            else:
+                self._chunksize = None
 
-        tools.addTo(self._eventsource._senders,self)
+        start = eventsource.getInt("start",0)
+        target = eventsource.getInt("maxevents",0)
 
-        thread = threading.Thread(target = self.run)
-        thread.daemon = True
-        thread.start()
+        if target == 0:
+            target = None
 
-    def run(self):
-        if self._eventsource._publisher == None:
-            tools.removeFrom(self._eventsource._senders,self)
-            return
+        self._data = itertools.islice(iter(data),start,target)
 
-        index = self._eventsource.getInt("start",0)
+        self._tokens = float(self._chunksize or 0)
+        self._count = 0
+        self._chunks = 0
+        self._started = time.time()
+        self._last = self._started
+        self._finished = None
 
-        target = self._eventsource.getOpt("maxevents",0)
+        tools.addTo(self._eventsource._senders,self)
 
-        if target == 0:
-            target = len(self._data)
+        self._eventsource._eventsources.submit(self.run)
 
-        if self._delay == 0:
-            for o in self._data:
-                o.opcode = self._opcode
-                self._eventsource._publisher.add(o)
+    def run(self):
+        publisher = self._eventsource._publisher
+
+        try:
+            if publisher == None:
+                self.finish()
+                return
+
+            while True:
+                if self._rate > 0:
+                    wait = self.take()
+                    if wait > 0:
+                        self._eventsource._eventsources.schedule(wait,self.run)
+                        return
+
+                if self.sendChunk(publisher) == 0:
+                    self.finish()
+                    return
+
+                if self._delay > 0:
+                    self._eventsource._eventsources.schedule(self._delay / 1000,self.run)
+                    return
+        except Exception:
+            self.finish()
+            raise
+
+    def take(self):
+        # Returns the time to wait until the bucket holds a chunk
+        now = time.time()
+        self._tokens = min(self._tokens + (now - self._last) * self._rate,self._chunksize)
+        self._last = now
+
+        if self._tokens >= self._chunksize:
+            self._tokens -= self._chunksize
+            return(0)
+
+        return((self._chunksize - self._tokens) / self._rate)
+
+    def sendChunk(self,publisher):
+        count = 0
+
+        for o in itertools.islice(self._data,self._chunksize):
+            o["opcode"] = self._opcode
+            publisher.add(o)
+            count += 1
+
+        if count > 0:
+            publisher.publish()
+            self._count += count
+            self._chunks += 1
+
+        return(count)
+
+    def finish(self):
+        self._finished = time.time()
+        self._eventsource.sent(self)
 
-            self._eventsource._publisher.publish()
+    @property
+    def stats(self):
+        # The achieved rate and, with a target rate, how far the send
+        # is behind the schedule of that rate
+        if self._finished != None:
+            elapsed = self._finished - self._started
         else:
-            while index < target:
-                if self._eventsource._eventsources.paused:
-                    while True:
-                        time.sleep(1)
-                        if self._eventsource._eventsources.paused == False:
-                            break
-                self._data[index]["opcode"] = self._opcode
-                self._eventsource._publisher.add(self._data[index])
-
-                self._eventsource._publisher.publish()
-
-                index += 1
+            elapsed = time.time() - self._started
 
-                delay = self._delay / 1000
+        stats = {}
+        stats["events"] = self._count
+        stats["chunks"] = self._chunks
+        stats["seconds"] = elapsed
+        stats["rate"] = self._count / elapsed if elapsed > 0 else 0.0
 
-                time.sleep(delay)
+        if self._rate > 0:
+            stats["target_rate"] = self._rate
+            stats["lag"] = max(elapsed - self._count / self._rate,0.0)
 
-        tools.removeFrom(self._eventsource._senders,self)
+        return(stats)
@@ -1,5 +1,9 @@
 import logging
 import uuid
+from ..utils.lazy import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
 
 class Options(object):
     def __init__(self,**kwargs):
@@ -156,6 +160,12 @@ def removeFrom(list,o):
         code = True
     return(code)
 
+def toInt(value):
+    try:
+        return(int(value))
+    except ValueError:
+        return(int(float(value)))
+
 def guid():
     return(str(uuid.uuid4()).replace('-', '_'))
 
@@ -166,3 +176,453 @@ def build(o,fields):
         if f in "current" == False:
             current[f] = {}
             current = current[f]
+
+class Columns(object):
+    # Column arrays indexed by slot for the fields of a schema, with
+    # numbers stored as floats in NumPy arrays and everything else in
+    # lists. Rows missing a field get 0.0 or "" like the row getters.
+
+    def initColumns(self,fields,capacity = 0):
+        self._fields = []
+        self._numbers = {}
+        self._columns = {}
+        self._indexes = {}
+        self._columnCapacity = capacity
+        if fields != None:
+            for f in fields:
+                name = f["name"]
+                self._fields.append(name)
+                self._numbers[name] = f.get("isNumber",False)
+                if self._numbers[name]:
+                    self._columns[name] = np.zeros(capacity)
+                else:
+                    self._columns[name] = [""] * capacity
+
+    def growColumns(self,capacity):
+        self._columnCapacity = capacity
+        for index in self._indexes.values():
+            index.grow(capacity)
+        for name in self._fields:
+            column = self._columns[name]
+            if self._numbers[name]:
+                values = np.zeros(capacity)
+                values[:len(column)] = column
+                self._columns[name] = values
+            else:
+                column.extend([""] * (capacity - len(column)))
+
+    def writeColumns(self,slot,o):
+        # The group indexes drop the old values of the slot before they
+        # are overwritten and then add the new ones
+        for index in self._indexes.values():
+            index.remove(slot)
+
+        for name in self._fields:
+            column = self._columns[name]
+            if name in o:
+                column[slot] = self.toNumber(o[name]) if self._numbers[name] else o[name]
+            elif self._numbers[name]:
+                column[slot] = 0.0
+            else:
+                column[slot] = ""
+
+        for index in self._indexes.values():
+            index.add(slot,o)
+
+    def releaseSlot(self,slot):
+        for index in self._indexes.values():
+            index.remove(slot)
+
+    def getGroupIndex(self,names,delimiter = "."):
+        key = (tuple(names),delimiter)
+        index = self._indexes.get(key)
+        if index == None:
+            index = GroupIndex(self,names,delimiter)
+            self._indexes[key] = index
+        return(index)
+
+    def toNumber(self,value):
+        try:
+            return(float(value))
+        except (TypeError,ValueError):
+            return(np.nan)
+
+    def hasColumn(self,name):
+        return(name in self._columns)
+
+    def getSlots(self):
+        return(np.zeros(0,dtype = np.int64))
+
+    def getColumn(self,name,slots = None):
+        if slots is None:
+            slots = self.getSlots()
+        column = self._columns[name]
+        if self._numbers[name]:
+            return(column[slots])
+        return(list(map(column.__getitem__,slots.tolist())))
+
+    def getDataFrame(self,names = None):
+        if names == None:
+            names = self._fields
+
+        slots = self.getSlots()
+
+        data = {}
+
+        for name in names:
+            if name in self._columns:
+                data[name] = self.getColumn(name,slots)
+
+        return(pd.DataFrame(data))
+
+class GroupIndex(object):
+    # Groups the rows of a Columns object by the values of key fields.
+    # The group of each slot and the count and value sums of each group
+    # are updated as rows are written and removed, so the aggregates
+    # are read without visiting the rows. Groups are kept in the order
+    # they were first seen and are left out while they have no rows.
+
+    def __init__(self,columns,names,delimiter = "."):
+        self._columns = columns
+        self._names = list(names)
+        self._delimiter = delimiter
+        self._groups = {}
+        self._keys = []
+        self._counts = np.zeros(0,dtype = np.int64)
+        self._sums = {}
+        self._codes = np.full(columns._columnCapacity,-1,dtype = np.int64)
+
+        for slot,o in zip(columns.getSlots().tolist(),columns.getRows()):
+            self.add(slot,o)
+
+    def getKey(self,o):
+        return(self._delimiter.join([str(o[name]) for name in self._names if name in o]))
+
+    def grow(self,capacity):
+        codes = np.full(capacity,-1,dtype = np.int64)
+        codes[:len(self._codes)] = self._codes
+        self._codes = codes
+
+    def add(self,slot,o):
+        key = self.getKey(o)
+        code = self._groups.get(key)
+
+        if code == None:
+            code = len(self._keys)
+            self._groups[key] = code
+            self._keys.append(key)
+            if code >= len(self._counts):
+                size = max(16,len(self._counts) * 2)
+                self._counts = np.resize(self._counts,size)
+                self._counts[code:] = 0
+                for name,sums in self._sums.items():
+                    sums = np.resize(sums,size)
+                    sums[code:] = 0.0
+                    self._sums[name] = sums
+
+        self._codes[slot] = code
+        self._counts[code] += 1
+
+        for name,sums in self._sums.items():
+            value = self._columns._columns[name][slot]
+            if value == value:
+                sums[code] += value
+
+    def remove(self,slot):
+        code = self._codes[slot]
+
+        if code < 0:
+            return
+
+        self._codes[slot] = -1
+        self._counts[code] -= 1
+
+        for name,sums in self._sums.items():
+            value = self._columns._columns[name][slot]
+            if self._counts[code] == 0:
+                sums[code] = 0.0
+            elif value == value:
+                sums[code] -= value
+
+    def getSums(self,name):
+        sums = self._sums.get(name)
+
+        if sums is None:
+            slots = self._columns.getSlots()
+            weights = np.nan_to_num(self._columns._columns[name][slots],nan = 0.0)
+            sums = np.bincount(self._codes[slots],weights = weights,minlength = len(self._counts))
+            self._sums[name] = sums
+
+        return(sums)
+
+    def getGroups(self):
+        return(np.flatnonzero(self._counts[:len(self._keys)] > 0))
+
+    def getKeys(self,groups = None):
+        if groups is None:
+            groups = self.getGroups()
+        return([self._keys[code] for code in groups.tolist()])
+
+    def getCounts(self,groups = None):
+        if groups is None:
+            groups = self.getGroups()
+        return(self._counts[groups])
+
+    def getValues(self,name,groups = None):
+        if groups is None:
+            groups = self.getGroups()
+        return(self.getSums(name)[groups])
+
+_DELETED = object()
+
+class KeyedStore(dict,Columns):
+    # Ordered dict of rows by key with O(1) upserts and deletes.
+    # Row values are also kept in column arrays indexed by slot, so
+    # DataFrames and columns are built without visiting the rows.
+    # Positional access uses a key list in insertion order. Deletes
+    # leave a marker in the list, and a Fenwick tree of the live
+    # entries maps positions to list entries in O(log n) until the
+    # list is compacted, once the markers outnumber the live keys.
+
+    def __init__(self,fields = None):
+        dict.__init__(self)
+        self._schemaFields = fields
+        self.clear()
+
+    def clear(self):
+        dict.clear(self)
+        self.initColumns(self._schemaFields)
+        self._slots = {}
+        self._free = []
+        self._size = 0
+        self._capacity = 0
+        self._order = []
+        self._positions = {}
+        self._tree = [0]
+        self._deleted = 0
+
+    def __setitem__(self,key,o):
+        self.put(key,o)
+
+    def __delitem__(self,key):
+        if self.remove(key) == False:
+            raise KeyError(key)
+
+    def put(self,key,o):
+        slot = self._slots.get(key)
+
+        if slot == None:
+            slot = self.allocate()
+            self._slots[key] = slot
+            self._positions[key] = len(self._order)
+            self._order.append(key)
+            self.treeAppend()
+
+        dict.__setitem__(self,key,o)
+        self.writeColumns(slot,o)
+
+        return(o)
+
+    def remove(self,key):
+        slot = self._slots.pop(key,None)
+
+        if slot == None:
+            return(False)
+
+        dict.__delitem__(self,key)
+        self.releaseSlot(slot)
+        self._free.append(slot)
+
+        position = self._positions.pop(key)
+        self._order[position] = _DELETED
+        self.treeAdd(position,-1)
+        self._deleted += 1
+
+        if self._deleted > max(len(self),16):
+            self.compact()
+
+        return(True)
+
+    def allocate(self):
+        if len(self._free) > 0:
+            return(self._free.pop())
+
+        slot = self._size
+        self._size += 1
+
+        if self._size > self._capacity:
+            self._capacity = max(self._size,self._capacity * 2,16)
+            self.growColumns(self._capacity)
+
+        return(slot)
+
+    def compact(self):
+        # Drop the delete markers and rebuild the tree in O(n)
+        self._order = [k for k in self._order if k is not _DELETED]
+        self._positions = dict((k,i) for i,k in enumerate(self._order))
+        n = len(self._order)
+        tree = [0] + [1] * n
+        for i in range(1,n + 1):
+            j = i + (i & -i)
+            if j <= n:
+                tree[j] += tree[i]
+        self._tree = tree
+        self._deleted = 0
+
+    def treeAppend(self):
+        # The new node covers the entries (i - lowbit(i), i]
+        i = len(self._tree)
+        low = i - (i & -i)
+        self._tree.append(1 + self.treeSum(i - 1) - self.treeSum(low))
+
+    def treeAdd(self,position,value):
+        i = position + 1
+        tree = self._tree
+        while i < len(tree):
+            tree[i] += value
+            i += i & -i
+
+    def treeSum(self,n):
+        # Number of live keys in the first n list entries
+        total = 0
+        tree = self._tree
+        while n > 0:
+            total += tree[n]
+            n -= n & -n
+        return(total)
+
+    def treeFind(self,index):
+        # List position of the live key at the given index
+        tree = self._tree
+        position = 0
+        remaining = index + 1
+        step = 1
+        while step * 2 < len(tree):
+            step *= 2
+        while step > 0:
+            if position + step < len(tree) and tree[position + step] < remaining:
+                position += step
+                remaining -= tree[position]
+            step //= 2
+        return(position)
+
+    def getKeys(self):
+        if self._deleted > 0:
+            self.compact()
+        return(self._order)
+
+    def getKey(self,index):
+        if self._deleted == 0:
+            return(self._order[index])
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("index out of range")
+        return(self._order[self.treeFind(index)])
+
+    def getItem(self,index):
+        return(dict.__getitem__(self,self.getKey(index)))
+
+    def getKeyRange(self,start = 0,end = None):
+        if self._deleted == 0:
+            return(self._order[start:end])
+        start,end,_ = slice(start,end).indices(len(self))
+        keys = []
+        if start >= end:
+            return(keys)
+        position = self.treeFind(start)
+        while len(keys) < end - start:
+            key = self._order[position]
+            if key is _DELETED:
+                # Skip a run of deleted entries in one step
+                position = self.treeFind(start + len(keys))
+                continue
+            keys.append(key)
+            position += 1
+        return(keys)
+
+    def getItems(self,start = 0,end = None):
+        return([dict.__getitem__(self,key) for key in self.getKeyRange(start,end)])
+
+    def getRows(self):
+        return(self.getItems())
+
+    def indexOf(self,key):
+        position = self._positions.get(key)
+        if position == None:
+            return(-1)
+        if self._deleted == 0:
+            return(position)
+        return(self.treeSum(position + 1) - 1)
+
+    def getSlots(self):
+        keys = self.getKeys()
+        return(np.fromiter(map(self._slots.__getitem__,keys),dtype = np.int64,count = len(keys)))
+
+class RingBuffer(Columns):
+    # Rows in arrival order with a fixed capacity. When the buffer is
+    # full, each new row overwrites the oldest one, so trimming to the
+    # capacity is O(1). With schema fields, the row values are also
+    # kept in column arrays laid out like the rows.
+
+    def __init__(self,capacity,fields = None):
+        self._schemaFields = fields
+        self._capacity = max(int(capacity),1)
+        self.clear()
+
+    def clear(self):
+        self.initColumns(self._schemaFields,self._capacity)
+        self._rows = [None] * self._capacity
+        self._start = 0
+        self._size = 0
+
+    def append(self,o):
+        if self._size == self._capacity:
+            slot = self._start
+            self._start = (self._start + 1) % self._capacity
+        else:
+            slot = (self._start + self._size) % self._capacity
+            self._size += 1
+
+        self._rows[slot] = o
+        self.writeColumns(slot,o)
+
+    def extend(self,rows):
+        for o in rows:
+            self.append(o)
+
+    def setCapacity(self,capacity):
+        capacity = max(int(capacity),1)
+
+        if capacity == self._capacity:
+            return
+
+        rows = self.getRows()[-capacity:]
+        self._capacity = capacity
+        self.clear()
+        self.extend(rows)
+
+    def getCapacity(self):
+        return(self._capacity)
+
+    def getSlots(self):
+        return((np.arange(self._size) + self._start) % self._capacity)
+
+    def getRows(self,start = 0,end = None):
+        return([self._rows[slot] for slot in self.getSlots()[start:end].tolist()])
+
+    def __len__(self):
+        return(self._size)
+
+    def __iter__(self):
+        for slot in self.getSlots().tolist():
+            yield self._rows[slot]
+
+    def __getitem__(self,index):
+        if isinstance(index,slice):
+            return([self._rows[slot] for slot in self.getSlots()[index].tolist()])
+        if index < 0:
+            index += self._size
+        if index < 0 or index >= self._size:
+            raise IndexError("index out of range")
+        return(self._rows[(self._start + index) % self._capacity])
@@ -22,7 +22,6 @@ from __future__ import print_function, division, absolute_import, unicode_litera
 
 import collections
 import os
-import pandas as pd
 import re
 import requests
 import six
@@ -32,6 +31,9 @@ from .utils.rest import get_params
 from .utils.data import get_project_data, gen_name
 from .utils import xml
 from .windows import BaseWindow
+from .utils.lazy import lazy_import
+
+pd = lazy_import('pandas')
 
 MapURL = collections.namedtuple('MapURL', ['url'])
 ListURL = collections.namedtuple('ListURL', ['url'])
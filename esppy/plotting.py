@@ -27,9 +27,7 @@ import csv
 import datetime
 import io
 import json
-import numpy as np
 import os
-import pandas as pd
 import re
 import requests
 import six
@@ -41,12 +39,15 @@ import weakref
 import xml.etree.ElementTree as ET
 from six.moves import urllib
 from .base import ESPObject
-from .config import CONCAT_OPTIONS
 from .schema import Schema
 from .utils import xml
 from .utils.rest import get_params
 from .utils.data import get_project_data, gen_name
 from .utils.events import get_events
+from .utils.lazy import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
 
 #
 # The streaming_* plot methods create a chart automatically so they
@@ -357,21 +358,22 @@ class StreamingChart(object):
 
         '''
         from .windows import BaseWindow
+        from .utils.buffers import ColumnBuffer
         from .utils.events import get_dataframe
 
         if isinstance(data, BaseWindow):
 
             lock = threading.RLock()
             empty_df = get_dataframe(data)
-            state = dict(df=empty_df, reset=False, updated=False)
+            state = dict(df=ColumnBuffer(empty_df, capacity=self.max_data or None),
+                         reset=False, updated=False)
 
             def on_event(sock, event):
                 with lock:
                     if state['reset']:
-                        state['df'] = event.tail(self.max_data)
-                    else:
-                        state['df'] = pd.concat([state['df'], event],
-                                                **CONCAT_OPTIONS).tail(self.max_data)
+                        state['df'].clear()
+                        state['reset'] = False
+                    state['df'].append(event)
                     state['updated'] = True
 
             sub = data.create_subscriber(mode='streaming',
@@ -387,7 +389,7 @@ class StreamingChart(object):
                     return
                 if state['updated']:
                     with lock:
-                        out = state['df'].tail(max_data)
+                        out = state['df'].to_frame().tail(max_data)
                         state['reset'] = True
                         state['updated'] = False
                         return out
@@ -31,12 +31,13 @@ from six.moves import urllib
 from .base import ESPObject, attribute
 from .config import get_option
 from .contquery import ContinuousQuery
+from .deployment import DeploymentPlan
 from .exceptions import ESPError
 from .mas import MASModule
 from .windows import get_window_class
 from .utils.rest import get_params
-from .utils.data import get_project_data, gen_name
-from .utils.events import get_events
+from .utils.data import get_project_body, get_project_data, gen_name
+from .utils.events import get_events, get_schema_cache
 from .utils.notebook import scale_svg
 from .utils.project import expand_path
 from .utils import xml
@@ -417,13 +418,16 @@ class Project(ESPObject, collections.abc.MutableMapping):
             self.queries[self.default_query].windows.project_handle = self
         self.queries[self.default_query].trace = value
 
-    def sync(self, overwrite=True, start=True, start_connectors=True):
+    def sync(self, overwrite=True, start=True, start_connectors=True,
+             incremental=False):
         '''
         Sync the project definition to the server
 
         Notes
         -----
-        This will overwrite the project definition in the server.
+        This will overwrite the project definition in the server,
+        unless `incremental` is set and the changes can be deployed
+        to the running project.
 
         Parameters
         ----------
@@ -433,12 +437,80 @@ class Project(ESPObject, collections.abc.MutableMapping):
             Should the project be started?
         start_connectors : bool, optional
             Should the connectors be started?
+        incremental : bool, optional
+            Should only the changes to the running project be deployed?
+            The definition is compared with the running project (see
+            :meth:`plan_sync`).  Metadata changes are set through the
+            metadata endpoints, and window additions, window changes,
+            and connector changes are applied to the running project
+            without restarting it.  Other changes replace the project.
+            The project and its connectors are started afterward
+            according to `start` and `start_connectors`.
 
-        '''
+        Returns
+        -------
+        :class:`DeploymentPlan`
+            If `incremental` is set
+        None
+            Otherwise
+
+        '''
+        plan = None
+        if incremental:
+            plan = self.plan_sync()
+            if plan.method != 'overwrite':
+                self._apply_plan(plan)
+                if start:
+                    self.start()
+                    if start_connectors:
+                        self.start_connectors()
+                return plan
+
+        get_schema_cache(self.session).invalidate(self.name)
         self._put(params=get_params(overwrite=overwrite,
                                     connectors=start_connectors,
                                     start=start),
-                  data=get_project_data(self).encode())
+                  data=get_project_body(self))
+
+        return plan
+
+    def plan_sync(self):
+        '''
+        Compare the project definition with the running project
+
+        Returns
+        -------
+        :class:`DeploymentPlan`
+
+        '''
+        res = self._get(urllib.parse.urljoin(self.base_url, 'projectXml'),
+                        params=get_params(name=self.name))
+        running = None
+        for item in res.findall('./project'):
+            running = Project.from_xml(item, session=self.session)
+            running._load_metadata()
+        return DeploymentPlan(self, running)
+
+    def _apply_plan(self, plan):
+        '''
+        Deploy the changes of a plan to the running project
+
+        Parameters
+        ----------
+        plan : DeploymentPlan
+            The changes to deploy
+
+        '''
+        if plan.method == 'update':
+            self.update(self)
+
+        for change in plan.get_changes('metadata'):
+            path = change.path.split('.')
+            obj = self if len(path) == 1 else self.queries[path[1]]
+            if change.detail['set']:
+                obj._set_metadata(change.detail['set'])
+            if change.detail['delete']:
+                obj._del_metadata(*change.detail['delete'])
 
     def copy(self, deep=False):
         '''
@@ -591,15 +663,17 @@ class Project(ESPObject, collections.abc.MutableMapping):
         return out
 
     def _set_metadata(self, data):
-        for key, value in six.iteritems(data):
-            self._put(urllib.parse.urljoin(self.base_url,
-                                           'projectMetadata/%s/%s' % (self.name, key)),
-                      data='%s' % value)
+        self._bulk(lambda item: self._put(urllib.parse.urljoin(self.base_url,
+                                                               'projectMetadata/%s/%s' %
+                                                               (self.name, item[0])),
+                                          data='%s' % item[1]),
+                   six.iteritems(data))
 
     def _del_metadata(self, *data):
-        for key in data:
-            self._delete(urllib.parse.urljoin(self.base_url,
-                                              'projectMetadata/%s/%s' % (self.name, key)))
+        self._bulk(lambda key: self._delete(urllib.parse.urljoin(self.base_url,
+                                                                 'projectMetadata/%s/%s' %
+                                                                 (self.name, key))),
+                   data)
 
     def get_property(self, propertyName):
         return self.properties[propertyName]
@@ -620,56 +694,83 @@ class Project(ESPObject, collections.abc.MutableMapping):
         :class:`ElementTree.Element`
 
         '''
-        out = xml.new_elem('engine')
-        projects = xml.add_elem(out, 'projects')
+        return xml.build_element(self._iter_elements())
+
+    def _iter_elements(self):
+        '''
+        Generate the serialization events of the project
+
+        The elements of the windows, MAS modules, and connectors are
+        created one at a time, so the definition can be serialized
+        without building the complete tree.  See
+        :func:`esppy.utils.xml.iter_xml`.
 
-        proj = xml.add_elem(projects, 'project', xml.get_attrs(self, extra='name'))
+        Returns
+        -------
+        generator of (string, ElementTree.Element) tuples
+
+        '''
+        yield 'start', xml.new_elem('engine')
+        yield 'start', xml.new_elem('projects')
+        yield 'start', xml.new_elem('project', xml.get_attrs(self, extra='name'))
 
         if self.description:
-            xml.add_elem(proj, 'description', text_content=self.description)
+            yield 'element', xml.new_elem('description', text_content=self.description)
 
         if self.metadata:
-            metadata = xml.add_elem(proj, 'metadata')
+            metadata = xml.new_elem('metadata')
             for key, value in sorted(six.iteritems(self.metadata)):
                 xml.add_elem(metadata, 'meta', attrib=dict(id=key),
                              text_content=value)
+            yield 'element', metadata
 
         if self.properties:
-            properties = xml.add_elem(proj, 'properties')
+            properties = xml.new_elem('properties')
             for key, value in sorted(six.iteritems(self.properties)):
                 text_content = '<![CDATA[%s]]>' % value
                 xml.add_elem(properties, 'property', attrib=dict(name=key), text_content=text_content)
+            yield 'element', properties
 
         if self.sas_log_location or self.sas_connection_key or self.sas_command:
-            xml.add_elem(proj, 'ds-initialize',
-                         attrib=dict(sas_log_location=self.sas_log_location,
-                                     sas_connection_key=self.sas_connection_key,
-                                     sas_command=self.sas_command))
+            yield 'element', xml.new_elem('ds-initialize',
+                                          attrib=dict(sas_log_location=self.sas_log_location,
+                                                      sas_connection_key=self.sas_connection_key,
+                                                      sas_command=self.sas_command))
 
         if self.mas_modules:
-            mods = xml.add_elem(proj, 'mas-modules')
+            yield 'start', xml.new_elem('mas-modules')
             for item in self.mas_modules:
-                xml.add_elem(mods, item.to_element())
+                yield 'element', xml.ensure_element(item.to_element())
+            yield 'end', None
 
-        queries = xml.add_elem(proj, 'contqueries')
+        yield 'start', xml.new_elem('contqueries')
 
         for name, query in sorted(six.iteritems(self.queries)):
-            xml.add_elem(queries, query.to_element())
+            for item in query._iter_elements():
+                yield item
+
+        yield 'end', None
 
         if self.connector_groups or self.edges:
-            conns = xml.add_elem(proj, 'project-connectors')
+            yield 'start', xml.new_elem('project-connectors')
 
             if self.connector_groups:
-                grps = xml.add_elem(conns, 'connector-groups')
+                yield 'start', xml.new_elem('connector-groups')
                 for name, value in sorted(six.iteritems(self.connector_groups)):
-                    xml.add_elem(grps, value.to_element())
+                    yield 'element', xml.ensure_element(value.to_element())
+                yield 'end', None
 
             if self.edges:
-                edges = xml.add_elem(conns, 'edges')
+                yield 'start', xml.new_elem('edges')
                 for item in self.edges:
-                    xml.add_elem(edges, item.to_element())
+                    yield 'element', xml.ensure_element(item.to_element())
+                yield 'end', None
 
-        return out
+            yield 'end', None
+
+        yield 'end', None
+        yield 'end', None
+        yield 'end', None
 
     def to_xml(self, pretty=False):
         '''
@@ -685,12 +786,39 @@ class Project(ESPObject, collections.abc.MutableMapping):
         string
 
         '''
-        return xml.to_xml(self.to_element(), pretty=pretty)
+        return ''.join(self.iter_xml(pretty=pretty))
+
+    def iter_xml(self, pretty=False, encoding=None, chunk_size=xml.CHUNK_SIZE):
+        '''
+        Export project definition to XML in chunks
+
+        The XML is generated incrementally rather than from a complete
+        ElementTree of the project, which keeps the memory use of large
+        projects low.
+
+        Parameters
+        ----------
+        pretty : bool, optional
+            Should the XML include whitespace for readability?
+        encoding : string, optional
+            The output encoding.  By default, strings are generated.
+        chunk_size : int, optional
+            The minimum number of characters in each chunk
+
+        Returns
+        -------
+        generator of strings or bytes
+
+        '''
+        return xml.iter_xml(self._iter_elements(), pretty=pretty,
+                            encoding=encoding, chunk_size=chunk_size)
 
     def save_xml(self, dest, mode='w', pretty=True, **kwargs):
         '''
         Save the project XML to a file
 
+        The XML is written in chunks as it is generated.
+
         Parameters
         ----------
         dest : string or file-like
@@ -703,9 +831,11 @@ class Project(ESPObject, collections.abc.MutableMapping):
         '''
         if isinstance(dest, six.string_types):
             with open(dest, mode=mode, **kwargs) as output:
-                output.write(self.to_xml(pretty=pretty))
+                for chunk in self.iter_xml(pretty=pretty):
+                    output.write(chunk)
         else:
-            dest.write(self.to_xml(pretty=pretty))
+            for chunk in self.iter_xml(pretty=pretty):
+                dest.write(chunk)
 
     def to_graph(self, graph=None, schema=False, template_detail=False):
         '''
@@ -876,16 +1006,18 @@ class Project(ESPObject, collections.abc.MutableMapping):
 
         Parameters
         ----------
-        project : string
+        project : string or Project
             Location of the project data
 
         '''
+        get_schema_cache(self.session).invalidate(self.name)
         self._put('state', params=get_params(value='modified'),
-                  data=get_project_data(project).encode())
+                  data=get_project_body(project))
 
     def delete(self):
         ''' Delete the project '''
         self._delete()
+        get_schema_cache(self.session).invalidate(self.name)
 
     def create_mas_module(self, language, module, func_names, mas_store=None,
                           mas_store_version=None, description=None,
@@ -33,6 +33,12 @@ from .base import ESPObject, attribute
 from .utils import xml
 
 
+UBJSON2ESP_TYPEMAP = {
+    'utf8str': 'string',
+    'timestamp': 'stamp',
+}
+
+
 def clean_dtype(value):
     '''
     Make sure dtype is normalized
@@ -370,6 +376,45 @@ class Schema(ESPObject, collections.abc.MutableMapping):
 
         return out
 
+    @classmethod
+    def from_ubjson(cls, data, session=None):
+        '''
+        Create schema from binary (ubjson) definition
+
+        Parameters
+        ----------
+        data : bytes or dict
+            The encoded schema definition, or the decoded message
+        session : requests.Session
+            The ESP session object
+
+        Returns
+        -------
+        :class:`Schema`
+
+        '''
+        if isinstance(data, (bytes, bytearray)):
+            from .espapi import codec
+            data = codec.JsonDecoder(data).data
+
+        out = cls()
+        out.session = session
+
+        schema = data['schema']
+        if isinstance(schema, list):
+            schema = schema[0]
+
+        for field in schema['fields']:
+            field = field.get('field', field)
+            field = field.get('attributes', field)
+            key = (field.get('key', field.get('@key')) or 'false') == 'true'
+            name = field.get('name', field.get('@name'))
+            dtype = field.get('type', field.get('@type'))
+            dtype = clean_dtype(UBJSON2ESP_TYPEMAP.get(dtype, dtype))
+            out.fields[name] = SchemaField(name, dtype, key=key)
+
+        return out
+
     @classmethod
     def from_string(cls, data, session=None):
         '''
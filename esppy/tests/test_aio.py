@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import asyncio
+import unittest
+from esppy.exceptions import ESPError
+from . import utils as tm
+
+try:
+    from aiohttp import web
+    from aiohttp.test_utils import TestServer
+    import esppy.aio
+except ImportError:
+    web = None
+
+SCHEMA = ('<schema><fields>'
+          '<field name="id" type="int64" key="true"/>'
+          '<field name="x" type="double"/>'
+          '</fields></schema>')
+
+WINDOWS = ('<windows><window-source name="w" contquery="cq" project="p">' +
+           SCHEMA + '</window-source></windows>')
+
+
+def events(*ids):
+    return ('<events>' +
+            ''.join('<event opcode="insert"><id>%d</id><x>%d.5</x></event>' % (i, i)
+                    for i in ids) +
+            '</events>')
+
+
+@unittest.skipIf(web is None, 'The aiohttp package is not installed')
+class TestAsyncESP(tm.TestCase):
+
+    def setUp(self):
+        self.requests = []
+        self.published = []
+
+    def app(self):
+        def xml(text):
+            return web.Response(text=text, content_type='text/xml')
+
+        async def server(request):
+            self.requests.append(('GET', request.path_qs))
+            return xml('<server version="6.2" />')
+
+        async def window_xml(request):
+            self.requests.append(('GET', request.path_qs))
+            return xml(WINDOWS)
+
+        async def projects(request):
+            self.requests.append((request.method, request.path_qs))
+            if request.method == 'PUT':
+                self.published.append(await request.text())
+            return xml('<response code="0"><message>ok</message></response>')
+
+        async def project_xml(request):
+            self.requests.append(('GET', request.path_qs))
+            return xml('<projects><project name="p" /></projects>')
+
+        async def missing(request):
+            resp = xml('<response><message>missing</message></response>')
+            resp.set_status(404)
+            return resp
+
+        async def subscriber(request):
+            self.requests.append(('WS', request.path_qs))
+            ws = web.WebSocketResponse()
+            await ws.prepare(request)
+            await ws.send_str(SCHEMA)
+            await ws.send_str(events(1, 2))
+            await ws.send_str(events(3))
+            await ws.close()
+            return ws
+
+        async def publisher(request):
+            self.requests.append(('WS', request.path_qs))
+            ws = web.WebSocketResponse()
+            await ws.prepare(request)
+            async for msg in ws:
+                self.published.append(msg.data)
+            return ws
+
+        app = web.Application()
+        app.router.add_get('/SASESP/server', server)
+        app.router.add_get('/SASESP/windowXml', window_xml)
+        app.router.add_get('/SASESP/projectXml', project_xml)
+        app.router.add_route('*', '/SASESP/projects/{name}', projects)
+        app.router.add_get('/SASESP/missing', missing)
+        app.router.add_get('/SASESP/subscribers/p/cq/w/', subscriber)
+        app.router.add_get('/SASESP/publishers/p/cq/w/', publisher)
+        return app
+
+    def run_with_server(self, func):
+        async def main():
+            server = TestServer(self.app())
+            await server.start_server()
+            try:
+                esp = esppy.aio.AsyncESP('http://%s:%s' % (server.host, server.port))
+                async with esp:
+                    return await func(esp)
+            finally:
+                await server.close()
+        return asyncio.run(main())
+
+    def test_rest(self):
+        async def func(esp):
+            info = await esp.get_server_info()
+            self.assertEqual(info['version'], '6.2')
+
+            win = await esp.get_window('p.cq.w')
+            self.assertEqual(win.fullname, 'p.cq.w')
+            self.assertEqual(list(win.schema.fields.keys()), ['id', 'x'])
+
+            wins = await esp.get_windows(['p.cq.w', 'p.cq.*'])
+            self.assertEqual(list(wins.keys()), ['p.cq.w'])
+
+            proj = await esp.load_project('<project name="p" />', start=False)
+            self.assertEqual(proj.name, 'p')
+            self.assertEqual(self.published, ['<project name="p" />'])
+
+            with self.assertRaises(ESPError):
+                await esp._get('missing')
+
+        self.run_with_server(func)
+
+        self.assertEqual(self.requests[0], ('GET', '/SASESP/server?config=true'))
+        self.assertTrue(('PUT', '/SASESP/projects/p?overwrite=true&connectors=true'
+                         '&start=false&log=true') in self.requests)
+        self.assertEqual(len([x for x in self.requests
+                              if x[1].startswith('/SASESP/windowXml')]), 3)
+
+    def test_stream(self):
+        async def func(esp):
+            out = []
+            async for df in esp.stream('p.cq.w', mode='streaming'):
+                out.append(df)
+            return out
+
+        out = self.run_with_server(func)
+
+        self.assertEqual(len(out), 2)
+        self.assertEqual(list(out[0].index), [1, 2])
+        self.assertEqual(list(out[0]['x']), [1.5, 2.5])
+        self.assertEqual(list(out[1].index), [3])
+
+    def test_stream_maxsize(self):
+        async def func(esp):
+            sub = await esp.subscribe('p.cq.w', mode='streaming', maxsize=1)
+            # Let the reader fill the queue before consuming it
+            await asyncio.sleep(0.2)
+            out = []
+
+            async def consume():
+                async for df in sub:
+                    out.append(df)
+
+            await asyncio.wait_for(consume(), timeout=10)
+            await sub.stop()
+            return out, sub.dropped
+
+        out, dropped = self.run_with_server(func)
+
+        self.assertEqual(out, [])
+        self.assertEqual(dropped, 2)
+
+    def test_publish(self):
+        async def func(esp):
+            async with await esp.publisher('p.cq.w') as pub:
+                await pub.send('i,n,1,1.5\n')
+                await pub.send(b'i,n,2,2.5\n')
+            # Give the server a moment to read the messages
+            await asyncio.sleep(0.1)
+
+        self.run_with_server(func)
+
+        self.assertEqual(self.published, ['i,n,1,1.5\n', b'i,n,2,2.5\n'])
+        self.assertTrue(self.requests[-1][1].startswith('/SASESP/publishers/p/cq/w/?'))
+
+
+if __name__ == '__main__':
+    tm.runtests()
@@ -24,9 +24,11 @@
 
 import datetime
 import os
+import shutil
 import six
 import esppy
 import sys
+import tempfile
 import unittest
 from . import utils as tm
 
@@ -77,5 +79,74 @@ class TestAlgorithm(tm.TestCase):
         self.assertRegex(out, r"Summary\(name=u?'w_\w+', contquery=None, project=None\)")
 
 
+ALGORITHMS_XML = b'''<algorithms>
+  <algorithm name="Summary">
+    <description>Summary statistics (\xc2\xb5, \xcf\x83)</description>
+    <parameters>
+      <parameter name="windowLength" type="int" default="5"/>
+    </parameters>
+    <input-map>
+      <input-map-entry name="input" type="var"/>
+    </input-map>
+    <output-map>
+      <output-map-entry name="meanOut" type="var"/>
+    </output-map>
+  </algorithm>
+</algorithms>'''
+
+
+class TestAlgorithmNamespaces(tm.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def connect(self):
+        # Skip the server checks of the constructor
+        session, adapter = tm.fake_session(lambda request: ALGORITHMS_XML)
+        conn = esppy.ESP.__new__(esppy.ESP)
+        conn._k8s = None
+        conn.session = session
+        conn._server_version = '7.1 (7.1)'
+        return conn, adapter
+
+    def test_lazy(self):
+        with esppy.option_context('cache.algorithm_dir', self.cache_dir):
+            conn, adapter = self.connect()
+            self.assertEqual(adapter.requests, [])
+
+            self.assertEqual(conn.calculate.supported_algorithms, ('Summary',))
+            self.assertTrue(conn.calculate is conn.calculate)
+            self.assertEqual(len(adapter.requests), 1)
+            self.assertTrue('algorithms/calculate' in adapter.requests[0].url)
+
+            win = conn.calculate.Summary(windowLength=10)
+            self.assertEqual(win.algorithm, 'Summary')
+            self.assertEqual(win.parameters['windowLength'], 10)
+
+            # Other connections to the same server version use the disk cache
+            path = os.path.join(self.cache_dir, 'algorithms', '7.1_7.1', 'calculate.xml')
+            self.assertTrue(os.path.isfile(path))
+            conn2, adapter2 = self.connect()
+            self.assertEqual(conn2.calculate.supported_algorithms, ('Summary',))
+            self.assertEqual(adapter2.requests, [])
+
+            conn2._server_version = '7.2'
+            conn2._algorithms = {}
+            conn2.calculate
+            self.assertEqual(len(adapter2.requests), 1)
+
+    def test_no_cache(self):
+        with esppy.option_context('cache.algorithm_dir', ''):
+            conn, adapter = self.connect()
+            conn.train
+            conn2, adapter2 = self.connect()
+            conn2.train
+            self.assertEqual(len(adapter2.requests), 1)
+            self.assertEqual(os.listdir(self.cache_dir), [])
+
+
 if __name__ == '__main__':
    tm.runtests()
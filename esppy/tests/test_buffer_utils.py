@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import numpy as np
+import pandas as pd
+import unittest
+from . import utils as tm
+from esppy.utils.buffers import ColumnBuffer, KeyedBuffer
+
+
+def make_events(start, stop):
+    out = pd.DataFrame(dict(id=np.arange(start, stop, dtype=np.int64),
+                            x=np.arange(start, stop, dtype=np.float64) / 2,
+                            s=['s%d' % i for i in range(start, stop)]))
+    return out.set_index('id')[['x', 's']]
+
+
+class TestColumnBuffer(tm.TestCase):
+
+    def setUp(self):
+        self.empty = make_events(0, 0)
+
+    def test_unbounded(self):
+        buf = ColumnBuffer(self.empty)
+        self.assertEqual(len(buf), 0)
+        self.assertEqual(list(buf.to_frame().columns), ['x', 's'])
+
+        for i in range(0, 200, 10):
+            buf.append(make_events(i, i + 10))
+
+        out = buf.to_frame()
+        self.assertEqual(len(out), 200)
+        self.assertEqual(list(out.index.names), ['id'])
+        self.assertEqual(list(out.columns), ['x', 's'])
+        self.assertEqual(list(out.index), list(range(200)))
+        self.assertEqual(out['s'].iloc[-1], 's199')
+
+    def test_ring(self):
+        buf = ColumnBuffer(self.empty, capacity=25)
+        for i in range(0, 100, 7):
+            buf.append(make_events(i, i + 7))
+
+        out = buf.to_frame()
+        self.assertEqual(len(out), 25)
+        self.assertEqual(list(out.index), list(range(80, 105)))
+        self.assertEqual(list(out['x']), [x / 2 for x in range(80, 105)])
+
+        buf.append(make_events(200, 300))
+        self.assertEqual(list(buf.to_frame().index), list(range(275, 300)))
+
+    def test_keep_first(self):
+        buf = ColumnBuffer(self.empty, capacity=15, keep='first')
+        buf.append(make_events(0, 10))
+        buf.append(make_events(10, 20))
+        buf.append(make_events(20, 30))
+        self.assertEqual(list(buf.to_frame().index), list(range(15)))
+
+        buf.clear()
+        self.assertEqual(len(buf.to_frame()), 0)
+        buf.append(make_events(50, 52))
+        self.assertEqual(list(buf.to_frame().index), [50, 51])
+
+    def test_template_rows(self):
+        buf = ColumnBuffer(make_events(0, 5), capacity=8)
+        buf.append(make_events(5, 10))
+        self.assertEqual(list(buf.to_frame().index), list(range(2, 10)))
+
+    def test_cached_frame(self):
+        buf = ColumnBuffer(self.empty)
+        buf.append(make_events(0, 5))
+        out = buf.to_frame()
+        self.assertTrue(buf.to_frame() is out)
+        buf.append(make_events(5, 6))
+        self.assertTrue(buf.to_frame() is not out)
+
+    def test_type_promotion(self):
+        buf = ColumnBuffer(self.empty)
+        buf.append(make_events(0, 2))
+
+        events = make_events(2, 4)
+        events['x'] = [np.nan, 'a']
+        buf.append(events)
+        self.assertEqual(list(buf.to_frame()['x'])[-1], 'a')
+
+        events = make_events(4, 5)[['x']]
+        buf.append(events)
+        self.assertTrue(pd.isnull(buf.to_frame()['s'].iloc[-1]))
+
+    def test_extra_columns(self):
+        buf = ColumnBuffer(self.empty)
+        events = make_events(0, 3)
+        events['extra'] = 1
+        buf.append(events)
+        self.assertEqual(list(buf.to_frame().columns), ['x', 's'])
+
+
+
+class TestKeyedBuffer(tm.TestCase):
+
+    def setUp(self):
+        self.empty = make_events(0, 0)
+
+    def with_opcodes(self, events, opcode):
+        events = events.copy()
+        events['_opcode'] = opcode
+        return events
+
+    def test_upsert_delete(self):
+        buf = KeyedBuffer(self.empty)
+        buf.append(self.with_opcodes(make_events(0, 10), 'insert'))
+        self.assertEqual(len(buf), 10)
+
+        events = make_events(5, 15)
+        events['x'] = -1.0
+        buf.append(self.with_opcodes(events, 'upsert'))
+        self.assertEqual(len(buf), 15)
+
+        buf.append(self.with_opcodes(make_events(0, 3), 'delete'))
+        buf.append(self.with_opcodes(make_events(100, 101), 'delete'))
+        self.assertEqual(len(buf), 12)
+
+        out = buf.to_frame()
+        self.assertEqual(list(out.index.names), ['id'])
+        self.assertEqual(list(out.columns), ['x', 's'])
+        self.assertEqual(sorted(out.index), list(range(3, 15)))
+        self.assertEqual(out.loc[4, 'x'], 2.0)
+        self.assertEqual(out.loc[5, 'x'], -1.0)
+        self.assertEqual(out.loc[14, 's'], 's14')
+
+    def test_slot_reuse(self):
+        buf = KeyedBuffer(self.empty)
+        buf.append(make_events(0, 64))
+        buf.append(make_events(0, 32), opcodes=['delete'] * 32)
+        buf.append(make_events(64, 96))
+        self.assertEqual(len(buf), 64)
+        self.assertEqual(buf._high, 64)
+        self.assertEqual(sorted(buf.to_frame().index), list(range(32, 96)))
+
+    def test_same_key_in_batch(self):
+        buf = KeyedBuffer(self.empty)
+        events = pd.concat([make_events(0, 2), make_events(0, 2)])
+        events['x'] = [1.0, 2.0, 3.0, 4.0]
+        buf.append(events, opcodes=['insert', 'insert', 'update', 'delete'])
+        out = buf.to_frame()
+        self.assertEqual(list(out.index), [0])
+        self.assertEqual(out.loc[0, 'x'], 3.0)
+
+        events = make_events(1, 3)
+        buf.append(events, opcodes=['insert', 'insert'])
+        self.assertEqual(sorted(buf.to_frame().index), [0, 1, 2])
+
+    def test_multiple_keys(self):
+        empty = self.empty.reset_index().set_index(['id', 's'])
+        buf = KeyedBuffer(empty)
+        events = make_events(0, 4).reset_index().set_index(['id', 's'])
+        buf.append(events)
+        buf.append(events.iloc[[1]], opcodes=['delete'])
+        self.assertEqual(list(buf.to_frame().index.names), ['id', 's'])
+        self.assertEqual(list(buf.to_frame().index),
+                         [(0, 's0'), (2, 's2'), (3, 's3')])
+
+    def test_missing_columns(self):
+        buf = KeyedBuffer(self.empty)
+        buf.append(make_events(0, 2))
+        buf.append(make_events(1, 3)[['x']])
+        out = buf.to_frame()
+        self.assertEqual(out.loc[1, 's'], 's1')
+        self.assertTrue(pd.isnull(out.loc[2, 's']))
+
+    def test_no_keys(self):
+        buf = KeyedBuffer(self.empty.reset_index(drop=True))
+        buf.append(make_events(0, 3).reset_index(drop=True))
+        buf.append(make_events(0, 3).reset_index(drop=True))
+        self.assertEqual(len(buf), 6)
+
+    def test_reset(self):
+        buf = KeyedBuffer(make_events(0, 3))
+        self.assertEqual(len(buf), 3)
+        out = buf.to_frame()
+        self.assertTrue(buf.to_frame() is out)
+        buf.clear()
+        self.assertEqual(len(buf.to_frame()), 0)
+        buf.reset(make_events(5, 6))
+        self.assertEqual(list(buf.to_frame().index), [5])
+
+
+if __name__ == '__main__':
+    tm.runtests()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import numpy as np
+import pandas as pd
+import struct
+import unittest
+from . import utils as tm
+from esppy.espapi import codec
+
+
+class TestJsonDecoder(tm.TestCase):
+
+    def setUp(self):
+        self.message = {'events': {'@id': 'abc', 'entries': [
+            {'@opcode': 'insert', 'id': '1', 'x': '1.5'},
+            {'event': {'@opcode': 'delete', 'id': '2', 'y': 'def'}}]}}
+
+    def test_roundtrip(self):
+        data = codec.JsonEncoder(self.message).data
+        self.assertEqual(codec.JsonDecoder(data).data, self.message)
+        self.assertEqual(codec.JsonDecoder(bytearray(data)).data, self.message)
+        self.assertEqual(codec.JsonDecoder(memoryview(data)).data, self.message)
+
+    def test_empty_values(self):
+        data = codec.JsonEncoder({'a': '', 'b': 'x'}).data
+        self.assertEqual(codec.JsonDecoder(data).data, {'b': 'x'})
+        self.assertTrue(codec.JsonDecoder(b'').data is None)
+
+    def test_typed_values(self):
+        data = (b'{' + struct.pack('>I', 1) + b'i' + b'l' + struct.pack('>i', -2) +
+                struct.pack('>I', 1) + b'L' + b'L' + struct.pack('>q', 2**40) +
+                struct.pack('>I', 1) + b'd' + b'D' + struct.pack('>d', 0.25) +
+                struct.pack('>I', 1) + b'b' + b'B' + struct.pack('>I', 3) + b'abc' +
+                b'}')
+        self.assertEqual(codec.JsonDecoder(data).data,
+                         dict(i=-2, L=2**40, d=0.25, b='YWJj'))
+
+    def test_typed_arrays(self):
+        values = list(range(200))
+        data = (b'[' + b''.join(b'D' + struct.pack('>d', x) for x in values) +
+                b''.join(b'l' + struct.pack('>i', -x) for x in values[:3]) +
+                b'S' + struct.pack('>I', 2) + b'hi' + b'[' + b']' + b']')
+        out = codec.JsonDecoder(data).data
+        self.assertEqual(out[:200], [float(x) for x in values])
+        self.assertEqual(out[200:], [0, -1, -2, 'hi', []])
+
+    def test_truncated_array(self):
+        data = b'[l' + struct.pack('>i', 1) + b'l\x00\x00'
+        with self.assertRaises(ValueError):
+            codec.JsonDecoder(data).data
+
+    def test_columns(self):
+        data = codec.JsonEncoder(self.message).data
+        out = codec.JsonDecoder(data, columns=True).data
+        self.assertEqual(out['events']['@id'], 'abc')
+        self.assertEqual(out['events']['entries'],
+                         {'@opcode': ['insert', 'delete'], 'id': ['1', '2'],
+                          'x': ['1.5', None], 'y': [None, 'def']})
+
+
+
+class TestJsonEncoder(tm.TestCase):
+
+    def test_typed_values(self):
+        data = codec.JsonEncoder({'i': -2, 'L': 2**40, 'd': 0.25, 'n': np.int32(3),
+                                  'f': np.float64(1.5), 'b': True, 's': 'abc'}).data
+        self.assertEqual(data[:11], b'{' + struct.pack('>I', 1) + b'i' + b'l' +
+                         struct.pack('>i', -2))
+        self.assertEqual(codec.JsonDecoder(data).data,
+                         dict(i=-2, L=2**40, d=0.25, n=3, f=1.5, b='True', s='abc'))
+
+    def test_dataframe(self):
+        df = pd.DataFrame({'id': np.arange(3, dtype=np.int64),
+                           's': ['a', None, 'c'],
+                           'x': [0.5, 1.5, 2.5],
+                           'big': np.arange(3, dtype=np.int64) * 2**40,
+                           't': ['d', 'e', 'f']})
+        data = codec.JsonEncoder({'publisher': {'id': 'abc', 'data': df}}).data
+        out = codec.JsonDecoder(data).data['publisher']
+        self.assertEqual(out['id'], 'abc')
+        self.assertEqual(out['data'],
+                         [dict(id=0, s='a', x=0.5, big=0, t='d'),
+                          dict(id=1, x=1.5, big=2**40, t='e'),
+                          dict(id=2, s='c', x=2.5, big=2**41, t='f')])
+
+        data = codec.JsonEncoder(df[['id', 'x']]).data
+        self.assertEqual(codec.JsonDecoder(data).data,
+                         [dict(id=0, x=0.5), dict(id=1, x=1.5), dict(id=2, x=2.5)])
+
+        data = codec.JsonEncoder(df.iloc[0:0]).data
+        self.assertEqual(codec.JsonDecoder(data).data, [])
+
+    def test_reset(self):
+        encoder = codec.JsonEncoder({'a': 'x' * 100})
+        encoder.reset()
+        encoder.encode({'b': 1}, None)
+        self.assertEqual(codec.JsonDecoder(encoder.data).data, dict(b=1))
+
+
+if __name__ == '__main__':
+    tm.runtests()
@@ -28,6 +28,7 @@ import six
 import esppy
 import sys
 import unittest
+from esppy.schema import Schema
 from ..utils import xml
 from . import utils as tm
 
@@ -626,6 +627,43 @@ class TestConnection(tm.TestCase):
 #       self.assertTrue(isinstance(stats, dict))
 #       self.assertIn(proj.name, stats)
 
-    
+
+
+class FakeK8s(object):
+
+    project = 'p'
+
+    def __init__(self):
+        self.loaded = []
+
+    def load(self, data, overwrite=False, force=False):
+        self.loaded.append(data)
+
+
+class TestLoadProject(tm.TestCase):
+
+    def connect(self, k8s=None):
+        # Skip the server checks of the constructor
+        conn = esppy.ESP.__new__(esppy.ESP)
+        conn.session, self.adapter = tm.fake_session(lambda request: '<response/>')
+        conn._k8s = k8s
+        conn.get_project = lambda name: name
+        conn.schema_cache.set('p/cq/w', Schema(fields=['id*:int64']))
+        return conn
+
+    def test_invalidate(self):
+        conn = self.connect()
+        self.assertEqual(conn.load_project('<project name="p"/>'), 'p')
+        self.assertEqual(len(conn.schema_cache), 0)
+        self.assertEqual(self.adapter.requests[-1].method, 'PUT')
+
+    def test_invalidate_k8s(self):
+        k8s = FakeK8s()
+        conn = self.connect(k8s)
+        self.assertEqual(conn.load_project('<project name="x"/>'), 'p')
+        self.assertEqual(len(conn.schema_cache), 0)
+        self.assertEqual(len(k8s.loaded), 1)
+
+
 if __name__ == '__main__':
    tm.runtests()
@@ -24,11 +24,14 @@
 
 import datetime
 import esppy
+import io
 import os
 import six
 import sys
+import time
 import unittest
-from esppy.utils.data import get_project_data
+from esppy.utils import xml
+from esppy.utils.data import get_project_data, guess_event_format, iter_event_chunks
 from . import utils as tm
 
 USER, PASSWD = tm.get_user_pass()
@@ -81,5 +84,89 @@ class TestDataUtils(tm.TestCase):
             get_project_data(0)
 
 
+
+class TestEventChunks(tm.TestCase):
+
+    def test_guess_event_format(self):
+        self.assertEqual(guess_event_format('<events>'), 'xml')
+        self.assertEqual(guess_event_format(' {"events"'), 'json')
+        self.assertEqual(guess_event_format('opcode=i\nid=1'), 'properties')
+        self.assertEqual(guess_event_format('i,n,1,2'), 'csv')
+
+    def test_csv(self):
+        data = ''.join('i,n,%d,%d\n' % (i, i * 2) for i in range(100))
+        chunks = list(iter_event_chunks(io.StringIO(data).read, 64))
+        self.assertTrue(len(chunks) > 10)
+        self.assertEqual(''.join(chunks), data)
+        for chunk in chunks:
+            self.assertTrue(chunk.endswith('\n'))
+            self.assertTrue(len(chunk) < 128)
+
+    def test_csv_quoted(self):
+        data = '1,"a\nb"\n2,c\n3,"d\n\ne"\n'
+        chunks = list(iter_event_chunks(io.StringIO(data).read, 5))
+        self.assertEqual(''.join(chunks), data)
+        self.assertTrue(len(chunks) > 1)
+        for chunk in chunks:
+            self.assertTrue(chunk.endswith('\n'))
+            self.assertEqual(chunk.count('"') % 2, 0)
+
+    def test_small_reads(self):
+        data = '1,"a\nb"\n2,c\n'
+        chunks = list(iter_event_chunks(io.StringIO(data).read, 1))
+        self.assertEqual(chunks, ['1,"a\nb"\n', '2,c\n'])
+
+        data = 'opcode=i\nid=1\n\n\nopcode=i\nid=2\n\n'
+        chunks = list(iter_event_chunks(io.StringIO(data).read, 1, format='properties'))
+        self.assertEqual(chunks, ['opcode=i\nid=1\n\n', '\nopcode=i\nid=2\n\n'])
+
+        data = '<events><event><id>1</id></event><event><id>2</id></event></events>'
+        chunks = list(iter_event_chunks(io.StringIO(data).read, 3, format='xml'))
+        self.assertEqual(chunks, ['<events><event><id>1</id></event></events>',
+                                  '<events><event><id>2</id></event></events>'])
+
+    def test_long_quoted_record(self):
+        data = '1,"%s"\n2,c\n' % ('x\n' * 200000)
+        start = time.time()
+        chunks = list(iter_event_chunks(io.StringIO(data).read, 64))
+        self.assertTrue(time.time() - start < 5)
+        self.assertEqual(len(chunks), 1)
+        self.assertEqual(chunks[0], data)
+
+    def test_properties(self):
+        data = ''.join('opcode=i\nid=%d\n\n' % i for i in range(50))
+        chunks = list(iter_event_chunks(io.StringIO(data).read, 40, format='properties'))
+        self.assertEqual(''.join(chunks), data)
+        for chunk in chunks:
+            self.assertTrue(chunk.endswith('\n\n'))
+
+    def test_xml(self):
+        data = ('<events>' +
+                ''.join('<event opcode="insert"><id>%d</id></event>' % i for i in range(30)) +
+                '</events>\n')
+        chunks = list(iter_event_chunks(io.StringIO(data).read, 100, format='xml'))
+        self.assertTrue(len(chunks) > 1)
+        ids = []
+        for chunk in chunks:
+            ids.extend(int(x.text) for x in xml.from_xml(chunk).findall('./event/id'))
+        self.assertEqual(ids, list(range(30)))
+
+    def test_xml_prolog(self):
+        data = ('<?xml version="1.0" encoding="utf-8"?>\n<!-- events -->\n<events>' +
+                ''.join('<event opcode="insert"><id>%d</id></event>' % i for i in range(5)) +
+                '</events>\n')
+        chunks = list(iter_event_chunks(io.StringIO(data).read, 40, format='xml'))
+        ids = []
+        for chunk in chunks:
+            self.assertTrue(chunk.startswith('<events><event'))
+            ids.extend(int(x.text) for x in xml.from_xml(chunk).findall('./event/id'))
+        self.assertEqual(ids, list(range(5)))
+
+    def test_json(self):
+        data = '{"events": [%s]}' % ','.join(['{"id": "1"}'] * 20)
+        chunks = list(iter_event_chunks(io.StringIO(data).read, 16, format='json'))
+        self.assertEqual(chunks, [data])
+
+
 if __name__ == '__main__':
    tm.runtests()
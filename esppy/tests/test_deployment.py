@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+from six.moves import urllib
+from esppy.contquery import ContinuousQuery
+from esppy.deployment import DeploymentPlan
+from esppy.project import Project
+from esppy.windows import SourceWindow, CopyWindow, FilterWindow
+from esppy.utils.xml import to_xml
+from . import utils as tm
+
+
+def make_project():
+    proj = Project('p', n_threads=2)
+    proj.metadata['owner'] = 'a'
+    query = ContinuousQuery('cq')
+    proj.add_query(query)
+    src = SourceWindow(schema=('id*:int64', 'x:double'), name='src')
+    flt = FilterWindow(name='flt')
+    flt.set_expression('x > 1')
+    query.add_windows(src, flt)
+    src.add_target(flt)
+    return proj
+
+
+def serve(project):
+    ''' Return a response function that serves a project definition '''
+    def respond(request):
+        path = urllib.parse.urlparse(request.url).path
+        if request.method == 'GET' and path.endswith('projectXml'):
+            return ('<projects>%s</projects>' %
+                    to_xml(project.to_element().find('.//project')))
+        if request.method == 'GET':
+            return ('<project-metadata><project id="p"><metadata>'
+                    '<meta id="owner">a</meta></metadata></project>'
+                    '</project-metadata>')
+        return '<response/>'
+    return respond
+
+
+class TestDeploymentPlan(tm.TestCase):
+
+    def setUp(self):
+        self.running = make_project()
+        self.local = make_project()
+
+    def plan(self):
+        return DeploymentPlan(self.local, self.running)
+
+    def test_none(self):
+        plan = self.plan()
+        self.assertEqual(plan.method, 'none')
+        self.assertEqual(plan.changes, [])
+
+    def test_not_loaded(self):
+        self.assertEqual(DeploymentPlan(self.local, None).method, 'overwrite')
+
+    def test_metadata(self):
+        self.local.metadata['owner'] = 'b'
+        self.local.metadata['team'] = 'c'
+        self.running.queries['cq'].metadata['old'] = 'x'
+
+        plan = self.plan()
+        self.assertEqual(plan.method, 'metadata')
+        self.assertEqual(plan.changes[0].path, 'p')
+        self.assertEqual(plan.changes[0].detail, dict(set=dict(owner='b', team='c'),
+                                                      delete=[]))
+        self.assertEqual(plan.changes[1].path, 'p.cq')
+        self.assertEqual(plan.changes[1].detail, dict(set={}, delete=['old']))
+
+    def test_window_added(self):
+        cpy = CopyWindow(name='cpy')
+        self.local.queries['cq'].add_window(cpy)
+        self.local.queries['cq']['flt'].add_target(cpy)
+
+        plan = self.plan()
+        self.assertEqual(plan.method, 'update')
+        self.assertEqual([(x.kind, x.path) for x in plan.changes],
+                         [('window-added', 'p.cq.cpy')])
+
+    def test_expression(self):
+        self.local.queries['cq']['flt'].set_expression('x > 2')
+
+        plan = self.plan()
+        self.assertEqual(plan.method, 'update')
+        self.assertEqual([(x.kind, x.path, x.detail) for x in plan.changes],
+                         [('window-modified', 'p.cq.flt', 'expression')])
+
+    def test_connectors(self):
+        self.local.queries['cq']['src'].add_connector(
+            'publish', conn_name='pub', conn_type='publish', type='fs',
+            properties=dict(fsname='in.csv', fstype='csv'))
+        self.local.add_connectors('grp', {'pub': 'running'})
+
+        plan = self.plan()
+        self.assertEqual(plan.method, 'update')
+        self.assertEqual(sorted((x.kind, x.path) for x in plan.changes),
+                         [('connectors', 'p'), ('connectors', 'p.cq.src')])
+
+    def test_replace(self):
+        self.local.queries['cq']['src'].schema = ('id*:int64', 'x:double', 'y:double')
+        del self.local.queries['cq']['flt']
+
+        plan = self.plan()
+        self.assertEqual(plan.method, 'overwrite')
+        self.assertEqual(sorted(x.detail for x in plan.get_changes('replace')),
+                         ['schema', 'window removed'])
+
+
+class TestIncrementalSync(tm.TestCase):
+
+    def setUp(self):
+        self.local = make_project()
+        self.local.session, self.adapter = tm.fake_session(serve(make_project()))
+
+    @property
+    def requests(self):
+        return [(x.method, urllib.parse.urlparse(x.url).path)
+                for x in self.adapter.requests]
+
+    def test_unchanged(self):
+        plan = self.local.sync(incremental=True, start=False)
+        self.assertEqual(plan.method, 'none')
+        self.assertEqual([x[0] for x in self.requests], ['GET', 'GET'])
+
+    def test_start(self):
+        self.local.sync(incremental=True)
+        states = [urllib.parse.parse_qs(urllib.parse.urlparse(x.url).query)['value']
+                  for x in self.adapter.requests if x.method == 'PUT']
+        self.assertEqual(states, [['running'], ['connectorsStarted']])
+
+        # Connectors are only started along with the project
+        self.adapter.requests[:] = []
+        self.local.sync(incremental=True, start_connectors=False)
+        self.assertEqual([x[0] for x in self.requests], ['GET', 'GET', 'PUT'])
+
+    def test_metadata(self):
+        self.local.metadata['team'] = 'c'
+        self.local.sync(incremental=True, start=False)
+        self.assertEqual(self.requests[-1],
+                         ('PUT', '/SASESP/projectMetadata/p/team'))
+
+    def test_update(self):
+        self.local.queries['cq']['flt'].set_expression('x > 2')
+        self.local.sync(incremental=True, start=False)
+        self.assertEqual(self.requests[-1], ('PUT', '/SASESP/projects/p/state'))
+
+    def test_overwrite(self):
+        del self.local.queries['cq']['flt']
+        self.local.sync(incremental=True)
+        self.assertEqual(self.requests[-1], ('PUT', '/SASESP/projects/p/'))
+
+        # Without incremental, the project is always replaced
+        self.local.sync()
+        self.assertEqual(self.requests[-1], ('PUT', '/SASESP/projects/p/'))
+
+
+if __name__ == '__main__':
+    tm.runtests()
@@ -0,0 +1,437 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import io
+import numpy as np
+import requests
+import threading
+import time
+import unittest
+from esppy.espapi import tools
+from esppy.espapi.connections import (EventCollection, EventStream, Schema,
+                                      ServerConnection)
+from esppy.espapi.eventsources import EventSources
+from . import utils as tm
+
+FIELDS = [{'name': 'id', 'isNumber': True},
+          {'name': 'x', 'isNumber': True},
+          {'name': 's', 'isNumber': False}]
+
+
+class TestKeyedStore(tm.TestCase):
+
+    def test_put_remove(self):
+        store = tools.KeyedStore(FIELDS)
+        for i in range(5):
+            store.put(str(i), {'id': i, 'x': '%s.5' % i, 's': 'v%s' % i})
+
+        self.assertEqual(len(store), 5)
+        self.assertEqual(store.getKeys(), ['0', '1', '2', '3', '4'])
+
+        self.assertTrue(store.remove('1'))
+        self.assertFalse(store.remove('1'))
+        del store['3']
+        with self.assertRaises(KeyError):
+            del store['3']
+
+        # Updates keep the position, new keys reuse free slots
+        store.put('2', {'id': 2, 'x': '9.5', 's': 'new'})
+        store['5'] = {'id': 5, 'x': '5.5'}
+
+        self.assertEqual(store.getKeys(), ['0', '2', '4', '5'])
+        self.assertEqual(list(store.keys()), ['0', '2', '4', '5'])
+        self.assertEqual(store.indexOf('4'), 2)
+        self.assertEqual(store.indexOf('1'), -1)
+        self.assertEqual(store.getItem(1)['s'], 'new')
+        self.assertEqual([o['id'] for o in store.getItems(1, 3)], [2, 4])
+
+        df = store.getDataFrame()
+        self.assertEqual(list(df.columns), ['id', 'x', 's'])
+        self.assertEqual(list(df['id']), [0.0, 2.0, 4.0, 5.0])
+        self.assertEqual(list(df['x']), [0.5, 9.5, 4.5, 5.5])
+        self.assertEqual(list(df['s']), ['v0', 'new', 'v4', ''])
+
+        self.assertEqual(list(store.getDataFrame(['s']).columns), ['s'])
+
+    def test_paging_after_deletes(self):
+        store = tools.KeyedStore(FIELDS)
+        expected = []
+        rng = np.random.RandomState(1)
+        for i in range(400):
+            store.put(i, {'id': i})
+            expected.append(i)
+            if i % 3 == 0:
+                key = expected.pop(rng.randint(len(expected)))
+                store.remove(key)
+            if not expected:
+                continue
+
+            # Positional access does not compact the key list
+            deleted = store._deleted
+            self.assertEqual(store.getItem(len(expected) - 1)['id'], expected[-1])
+            self.assertEqual(store.getKey(0), expected[0])
+            self.assertEqual(store.indexOf(expected[-1]), len(expected) - 1)
+            self.assertEqual([o['id'] for o in store.getItems(5, 15)], expected[5:15])
+            self.assertEqual(store._deleted, deleted)
+
+        self.assertEqual([o['id'] for o in store.getItems(-10)], expected[-10:])
+        self.assertEqual(store.getKey(-1), expected[-1])
+        with self.assertRaises(IndexError):
+            store.getKey(len(expected))
+        self.assertEqual(store.getKeys(), expected)
+        self.assertEqual(store._deleted, 0)
+        self.assertEqual(store.indexOf(expected[10]), 10)
+
+    def test_grow(self):
+        store = tools.KeyedStore(FIELDS)
+        for i in range(1000):
+            store.put(i, {'id': i, 'x': i * 2, 's': str(i)})
+        for i in range(0, 1000, 2):
+            store.remove(i)
+
+        df = store.getDataFrame()
+        self.assertEqual(len(df), 500)
+        self.assertTrue(np.array_equal(df['x'].values, np.arange(1, 1000, 2) * 2.0))
+        self.assertEqual(store.getKey(-1), 999)
+
+        store.clear()
+        self.assertEqual(len(store), 0)
+        self.assertEqual(len(store.getDataFrame()), 0)
+
+
+class TestRingBuffer(tm.TestCase):
+
+    def test_append(self):
+        ring = tools.RingBuffer(3, FIELDS)
+        for i in range(5):
+            ring.append({'id': i, 'x': i + 0.5, 's': str(i)})
+
+        self.assertEqual(len(ring), 3)
+        self.assertEqual([o['id'] for o in ring], [2, 3, 4])
+        self.assertEqual(ring[0]['id'], 2)
+        self.assertEqual(ring[-1]['id'], 4)
+        self.assertEqual([o['id'] for o in ring[1:]], [3, 4])
+        with self.assertRaises(IndexError):
+            ring[3]
+
+        df = ring.getDataFrame()
+        self.assertEqual(list(df['x']), [2.5, 3.5, 4.5])
+        self.assertEqual(list(df['s']), ['2', '3', '4'])
+
+    def test_capacity(self):
+        ring = tools.RingBuffer(4, FIELDS)
+        ring.extend([{'id': i, 'x': i} for i in range(6)])
+
+        ring.setCapacity(2)
+        self.assertEqual([o['id'] for o in ring], [4, 5])
+        self.assertEqual(list(ring.getColumn('x')), [4.0, 5.0])
+
+        ring.setCapacity(3)
+        ring.append({'id': 6, 'x': 6})
+        self.assertEqual(list(ring.getColumn('id')), [4.0, 5.0, 6.0])
+        self.assertEqual(ring.getColumn('s'), ['', '', ''])
+
+        ring.clear()
+        self.assertEqual(len(ring), 0)
+        self.assertEqual(ring.getRows(), [])
+
+
+class TestGroupIndex(tm.TestCase):
+
+    def expected(self, rows):
+        groups = {}
+        for o in rows:
+            groups[o['s']] = groups.get(o['s'], 0.0) + float(o['x'])
+        return groups
+
+    def check(self, store):
+        index = store.getGroupIndex(['s'])
+        expected = self.expected(store.getRows())
+        self.assertEqual(sorted(index.getKeys()), sorted(expected))
+        for key, value in zip(index.getKeys(), index.getValues('x')):
+            self.assertAlmostEqual(value, expected[key])
+
+    def test_keyed_store(self):
+        store = tools.KeyedStore(FIELDS)
+        rng = np.random.RandomState(1)
+        for i in range(2000):
+            key = int(rng.randint(100))
+            if rng.rand() < 0.3:
+                store.remove(key)
+            else:
+                store.put(key, {'id': key, 'x': int(rng.randint(10)),
+                                's': 'g%d' % rng.randint(5)})
+            if i == 500:
+                self.check(store)
+        self.check(store)
+
+        index = store.getGroupIndex(['s'])
+        self.assertEqual(int(index.getCounts().sum()), len(store))
+
+    def test_ring_buffer(self):
+        ring = tools.RingBuffer(50, FIELDS)
+        ring.getGroupIndex(['s']).getValues('x')
+        rng = np.random.RandomState(2)
+        for i in range(500):
+            ring.append({'id': i, 'x': int(rng.randint(10)),
+                         's': 'g%d' % rng.randint(8)})
+        self.check(ring)
+
+
+class TestEventStream(tm.TestCase):
+
+    def setUp(self):
+        self.stream = EventStream(None, 'p/cq/w', maxevents=3)
+        self.stream.setSchemaFromJson({'fields': [
+            {'@name': 'id', '@type': 'int64', '@key': 'true'},
+            {'@name': 'g', '@type': 'utf8str'},
+            {'@name': 'x', '@type': 'double'}]})
+
+    def test_process(self):
+        self.stream.events({'entries': [
+            {'@opcode': 'insert', 'id': str(i), 'g': 'ab'[i % 2], 'x': str(i)}
+            for i in range(5)]})
+
+        self.assertEqual(len(self.stream.getList()), 3)
+        self.assertEqual(self.stream.getKeyValues(), [3, 4, 5])
+        self.assertEqual(self.stream.getValues('x'), [2.0, 3.0, 4.0])
+
+        df = self.stream.getDataFrame(['id', 'x'])
+        self.assertEqual(list(df['x']), [2.0, 3.0, 4.0])
+
+        out = self.stream.getValuesBy(['g'], ['x'])
+        self.assertEqual(out['keys'], ['a', 'b'])
+        self.assertEqual(out['values']['x'], [6.0, 3.0])
+
+        self.stream.setOpt('maxevents', 2)
+        self.stream.events({'entries': [{'id': '9', 'g': 'c', 'x': '9'}]})
+        self.assertEqual(self.stream.getValues('x'), [4.0, 9.0])
+
+        self.stream.clear()
+        self.assertEqual(len(self.stream.getData()), 0)
+
+
+class TestEventCollection(tm.TestCase):
+
+    def setUp(self):
+        self.collection = EventCollection(None, 'p/cq/w')
+        self.collection.setSchemaFromJson({'fields': [
+            {'@name': 'id', '@type': 'int64', '@key': 'true'},
+            {'@name': 'x', '@type': 'double'},
+            {'@name': 's', '@type': 'utf8str'}]})
+
+    def events(self, *events):
+        self.collection.events({'entries': [dict(e) for e in events]})
+
+    def test_process(self):
+        self.events({'@opcode': 'insert', 'id': '1', 'x': '1.5', 's': 'a'},
+                    {'@opcode': 'insert', 'id': '2', 'x': '2.5', 's': 'b'},
+                    {'@opcode': 'insert', 'id': '3', 'x': '3.5', 's': 'c'})
+        self.events({'@opcode': 'update', 'id': '1', 'x': '10.5'},
+                    {'@opcode': 'delete', 'id': '2'})
+
+        data = self.collection.getData()
+        self.assertEqual(list(data.keys()), ['1', '3'])
+        self.assertEqual(data['1']['s'], 'a')
+        self.assertEqual(self.collection.getValues('x'), [10.5, 3.5])
+
+        df = self.collection.getDataFrame()
+        self.assertEqual(list(df['x']), [10.5, 3.5])
+        self.assertEqual(list(df['s']), ['a', 'c'])
+
+        # A page replaces the contents
+        self.collection.events({'entries': [{'id': '4', 'x': '4.5', 's': 'd'}],
+                                'info': {'page': 0, 'pages': 1}})
+        self.assertEqual(list(self.collection.getDataFrame()['id']), [4.0])
+
+
+class TestSchemaCsv(tm.TestCase):
+
+    def setUp(self):
+        self.schema = Schema()
+        self.schema.fromJson({'fields': [
+            {'@name': 'id', '@type': 'int64', '@key': 'true'},
+            {'@name': 's', '@type': 'utf8str'},
+            {'@name': 'x', '@type': 'double'}]})
+
+    def test_create(self):
+        data = self.schema.createDataFromCsv('1,"a,b",1.5\n\n2,"say \\"hi\\"",2.5\n3,c,\n')
+        self.assertEqual(data, [{'id': '1', 's': 'a,b', 'x': '1.5'},
+                                {'id': '2', 's': 'say "hi"', 'x': '2.5'},
+                                {'id': '3', 's': 'c'}])
+
+        data = self.schema.createDataFromCsv('i,n,1,a,1.5\nd,n,2,b,2.5\n',
+                                             opcodes=True, flags=True, typed=True)
+        self.assertEqual(data, [{'id': 1, 's': 'a', 'x': 1.5},
+                                {'@opcode': 'delete', 'id': 2, 's': 'b', 'x': 2.5}])
+
+        data = self.schema.createDataFromCsv('x,id,other\n1.5,1,z\n', header=True)
+        self.assertEqual(data, [{'x': '1.5', 'id': '1'}])
+
+    def test_chunks(self):
+        text = ''.join('%d,s%d,%d.5\n' % (i, i, i) for i in range(25))
+        blocks = list(self.schema.iterDataFromCsv(io.StringIO(text), chunksize=10))
+        self.assertEqual([len(b) for b in blocks], [10, 10, 5])
+        self.assertEqual(blocks[2][-1], {'id': '24', 's': 's24', 'x': '24.5'})
+
+
+class StubWebSocket(object):
+
+    def __init__(self):
+        self.messages = []
+
+    def send(self, data):
+        self.messages.append(data)
+
+    def sendBinary(self, data):
+        self.messages.append(data)
+
+
+class TestPublishBlocks(tm.TestCase):
+
+    def setUp(self):
+        session = requests.Session()
+        session.conn_url = 'http://localhost:9/'
+        esp = type(str('ESP'), (object,), dict(session=session))()
+        self.conn = ServerConnection(esp, None)
+
+    def test_closed(self):
+        # Like send, a direct publish to a closed connection sends nothing
+        out = self.conn.publishList('p/cq/w', [{'id': 1}], pipeline=False)
+        self.assertEqual(out['blocks'], 1)
+
+    def test_send(self):
+        ws = self.conn._websocket = StubWebSocket()
+        for binary in [False, True]:
+            del ws.messages[:]
+            out = self.conn.publishList('p/cq/w', [{'id': i} for i in range(5)],
+                                        size=2, binary=binary, pipeline=False)
+            self.assertEqual(out['blocks'], 3)
+            # The set and delete requests surround the blocks
+            self.assertEqual(len(ws.messages), 5)
+            self.assertEqual(type(ws.messages[1]), binary and bytes or str)
+
+
+class FakePublisher(object):
+
+    def __init__(self, name, log):
+        self.name = name
+        self.log = log
+        self.data = []
+        self._schema = Schema()
+        self._schema.fromJson({'fields': [{'@name': 'id', '@type': 'int64', '@key': 'true'}]})
+
+    @property
+    def schema(self):
+        return self._schema
+
+    def add(self, o):
+        self.data.append(o)
+
+    def publish(self):
+        self.log.append((self.name, [o['id'] for o in self.data],
+                         set(o['opcode'] for o in self.data)))
+        self.data = []
+
+
+class FakeConnection(object):
+    version = 7.0
+
+    def __init__(self):
+        self.log = []
+
+    def addDelegate(self, delegate):
+        pass
+
+    def getPublisher(self, window, **kwargs):
+        return FakePublisher(window, self.log)
+
+
+class TestEventSources(tm.TestCase):
+
+    def setUp(self):
+        self.conn = FakeConnection()
+        self.done = threading.Event()
+        self.sources = EventSources(self.conn, self)
+
+    def complete(self, eventsources):
+        self.done.set()
+
+    def test_dependencies(self):
+        self.sources.createEventSource(type='csv', name='a', window='w_a',
+                                       csv='1\n2\n', repeat=2, interval=10)
+        self.sources.createEventSource(type='csv', name='b', window='w_b',
+                                       csv='3\n4\n5\n', delay=1, opcode='insert')
+        self.sources.addEdge('a', 'b')
+
+        self.sources.start()
+        self.assertTrue(self.done.wait(10))
+        self.assertFalse(self.sources.running)
+
+        self.assertEqual(self.conn.log, [('w_a', ['1', '2'], {'upsert'}),
+                                         ('w_a', ['1', '2'], {'upsert'}),
+                                         ('w_b', ['3'], {'insert'}),
+                                         ('w_b', ['4'], {'insert'}),
+                                         ('w_b', ['5'], {'insert'})])
+
+    def test_pause(self):
+        self.sources.createEventSource(type='csv', name='a', window='w_a',
+                                       csv='1\n2\n3\n', delay=50)
+        self.sources.start()
+        time.sleep(0.02)
+        self.sources.paused = True
+        time.sleep(0.2)
+        count = len(self.conn.log)
+        self.assertTrue(count < 3)
+        self.assertFalse(self.done.is_set())
+
+        self.sources.paused = False
+        self.assertTrue(self.done.wait(10))
+        self.assertEqual(len(self.conn.log), 3)
+
+    def test_chunk_size(self):
+        csv = ''.join('%d\n' % i for i in range(7))
+        source = self.sources.createEventSource(type='csv', name='a', window='w_a',
+                                                csv=csv, delay=1, chunk_size=3)
+        self.sources.start()
+        self.assertTrue(self.done.wait(10))
+
+        self.assertEqual([ids for _, ids, _ in self.conn.log],
+                         [['0', '1', '2'], ['3', '4', '5'], ['6']])
+        self.assertEqual(source.stats['events'], 7)
+        self.assertEqual(source.stats['chunks'], 3)
+        self.assertTrue('lag' not in source.stats)
+
+    def test_rate(self):
+        csv = ''.join('%d\n' % i for i in range(500))
+        source = self.sources.createEventSource(type='csv', name='a', window='w_a',
+                                                csv=csv, rate=2000, chunk_size=100)
+        self.sources.start()
+        self.assertTrue(self.done.wait(10))
+
+        # The first chunk goes out at once, the other four are paced
+        stats = source.stats
+        self.assertEqual(len(self.conn.log), 5)
+        self.assertEqual(stats['events'], 500)
+        self.assertTrue(stats['seconds'] >= 0.19)
+        self.assertTrue(stats['rate'] <= 2000 * 1.3)
+        self.assertTrue(stats['lag'] < 0.2)
+
+
+if __name__ == '__main__':
+    tm.runtests()
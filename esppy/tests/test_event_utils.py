@@ -28,8 +28,12 @@ import os
 import six
 import sys
 import time
+import types
 import unittest
-from esppy.utils.events import get_dataframe, get_schema, get_events
+import xml.etree.ElementTree as ET
+from esppy.schema import Schema
+from esppy.utils.events import (get_dataframe, get_schema, get_events, get_decoder,
+                                SchemaCache, get_schema_cache)
 from . import utils as tm
 
 USER, PASSWD = tm.get_user_pass()
@@ -309,5 +313,191 @@ class TestEventUtils(tm.TestCase):
         sub.close()
 
 
+class TestEventDecoder(tm.TestCase):
+
+    def setUp(self):
+        self.schema = Schema.from_string('id*:int64,x_c:double,n:int32,'
+                                         's:string,t:stamp,a:array(dbl)')
+
+    def test_get_decoder(self):
+        decoder = get_decoder(self.schema)
+        self.assertTrue(get_decoder(self.schema) is decoder)
+        self.assertEqual(decoder.columns, ['id', 'x_c', 'n', 's', 't', 'a'])
+        self.assertEqual(decoder.index, ['id'])
+
+        self.schema.add_field('y_c', 'double')
+        self.assertTrue(get_decoder(self.schema) is not decoder)
+        self.assertEqual(get_decoder(self.schema).columns[-1], 'y_c')
+
+    def test_xml_events(self):
+        data = ('<events>'
+                '<event opcode="insert" window="p/cq/w"><id key="true">1</id>'
+                '<x_c>1.5</x_c><n>2</n><s>abc</s><t>1000000</t><a>[1;2]</a></event>'
+                '<event opcode="insert" window="p/cq/w"><id key="true">2</id>'
+                '<x_c>nan</x_c><n>3</n><s>def</s><t>2000000</t><a>[3]</a></event>'
+                '</events>')
+        out = get_events(self.schema, data)
+        self.assertEqual(list(out.keys()), ['p.cq.w'])
+
+        out = out['p.cq.w']
+        self.assertEqual(list(out.index.names), ['id'])
+        self.assertEqual(list(out.index), [1, 2])
+        self.assertEqual(list(out.columns), ['x_c', 'n', 's', 't', 'a'])
+        self.assertEqual(str(out['n'].dtype), 'int32')
+        self.assertEqual(out['x_c'].iloc[0], 1.5)
+        self.assertTrue(out['x_c'].isnull().iloc[1])
+        self.assertEqual(out['t'].iloc[1], datetime.datetime(1970, 1, 1, 0, 0, 2))
+        self.assertEqual(list(out['a'].iloc[0]), [1.0, 2.0])
+
+    def test_xml_missing_fields(self):
+        data = ('<events>'
+                '<event window="p/cq/w"><id>1</id><x_c>1.5</x_c></event>'
+                '<event window="p/cq/w"><id>2</id><n>3</n></event>'
+                '</events>')
+        out = get_events(self.schema, data, single=True)
+        self.assertEqual(list(out.columns), ['x_c', 'n'])
+        self.assertTrue(out['x_c'].isnull().iloc[1])
+        self.assertTrue(out['n'].isnull().iloc[0])
+
+    def test_csv_events(self):
+        data = 'I,N,1,1.5,2,abc,1000000,[1;2]\nI,N,2,,3,def,2000000,[3]\n'
+        out = get_events(self.schema, data, format='csv')
+        self.assertEqual(list(out.index), [1, 2])
+        self.assertEqual(list(out.columns), ['x_c', 'n', 's', 't', 'a'])
+        self.assertEqual(str(out['n'].dtype), 'int32')
+        self.assertTrue(out['x_c'].isnull().iloc[1])
+
+    def test_json_events(self):
+        data = ('{"events": [{"event": {"id": "1", "x_c": "1.5", "n": "2", "s": "abc",'
+                ' "t": "1000000", "a": "[1;2]"}}]}')
+        out = get_events(self.schema, data, format='json')
+        self.assertEqual(list(out.index), [1])
+        self.assertEqual(out['s'].iloc[0], 'abc')
+        self.assertEqual(out['x_c'].iloc[0], 1.5)
+
+    def test_properties_events(self):
+        data = 'opcode=i\nid=1\nx_c=1.5\nn=2\n\nopcode=i\nid=2\nx_c=2.5\nn=3\n'
+        out = get_events(self.schema, data, format='properties')
+        self.assertEqual(list(out.index), [1, 2])
+        self.assertEqual(list(out['x_c']), [1.5, 2.5])
+        self.assertEqual(list(out['n']), [2, 3])
+
+    def test_opcodes(self):
+        data = ('<events>'
+                '<event opcode="upsert" window="p/cq/w"><id>1</id><x_c>1.5</x_c></event>'
+                '<event opcode="delete" window="p/cq/w"><id>2</id><x_c>2.5</x_c></event>'
+                '<event window="p/cq/w"><id>3</id><x_c>3.5</x_c></event>'
+                '</events>')
+        out = get_events(self.schema, data, single=True)
+        self.assertEqual(list(out.columns), ['x_c'])
+        out = get_events(self.schema, data, single=True, opcodes=True)
+        self.assertEqual(list(out.columns), ['x_c', '_opcode'])
+        self.assertEqual(list(out['_opcode']), ['upsert', 'delete', 'insert'])
+
+        data = 'I,N,1,1.5\nP,N,2,2.5\nD,N,3,\n'
+        out = get_events(self.schema, data, format='csv', opcodes=True)
+        self.assertEqual(list(out['_opcode']), ['insert', 'upsert', 'delete'])
+
+        data = 'opcode=u\nid=1\nx_c=1.5\n\nopcode=sd\nid=2\nx_c=2.5\n'
+        out = get_events(self.schema, data, format='properties', opcodes=True)
+        self.assertEqual(list(out['_opcode']), ['update', 'safedelete'])
+
+    def test_ubjson_events(self):
+        from esppy.espapi import codec
+        data = codec.JsonEncoder({'events': {'entries': [
+            {'@opcode': 'insert', 'id': '1', 'x_c': '1.5', 'n': '2', 's': 'abc'},
+            {'@opcode': 'delete', 'id': '2', 'x_c': '2.5', 'n': '3', 's': 'def'}]}}).data
+        out = get_events(self.schema, data, format='ubjson', opcodes=True)
+        self.assertEqual(list(out.index), [1, 2])
+        self.assertEqual(list(out.columns), ['x_c', 'n', 's', 't', 'a', '_opcode'])
+        self.assertEqual(str(out['n'].dtype), 'int32')
+        self.assertEqual(list(out['x_c']), [1.5, 2.5])
+        self.assertEqual(list(out['s']), ['abc', 'def'])
+        self.assertEqual(list(out['_opcode']), ['insert', 'delete'])
+
+
+class TestSchemaCache(tm.TestCase):
+
+    def setUp(self):
+        self.schema = Schema.from_string('id*:int64,x_c:double,y_c:double')
+
+    def test_get_set(self):
+        cache = SchemaCache(ttl=60)
+        self.assertTrue(cache.get('p.cq.w') is None)
+
+        decoder = cache.set('p/cq/w', self.schema)
+        schema, cached = cache.get('p.cq.w')
+        self.assertTrue(schema is self.schema)
+        self.assertTrue(cached is decoder)
+
+        stats = cache.stats
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['size'], 1)
+        self.assertEqual(stats['hit_rate'], 0.5)
+
+    def test_ttl(self):
+        cache = SchemaCache(ttl=0)
+        cache.set('p/cq/w', self.schema)
+        self.assertEqual(len(cache), 0)
+
+        cache = SchemaCache(ttl=0.05)
+        cache.set('p/cq/w', self.schema)
+        self.assertTrue(cache.get('p/cq/w') is not None)
+        time.sleep(0.1)
+        self.assertTrue(cache.get('p/cq/w') is None)
+
+    def test_invalidate(self):
+        cache = SchemaCache(ttl=60)
+        cache.set('p/cq/w1', self.schema)
+        cache.set('p/cq/w2', self.schema)
+        cache.set('p2/cq/w1', self.schema)
+
+        cache.invalidate('p/cq/w1')
+        self.assertEqual(len(cache), 2)
+
+        cache.invalidate('p')
+        self.assertEqual(len(cache), 1)
+        self.assertTrue(cache.get('p2/cq/w1') is not None)
+
+        cache.invalidate()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.stats['invalidations'], 3)
+
+    def test_get_schema(self):
+        requests = []
+        schema_xml = ('<windows><window-source name="w"><schema><fields>'
+                      '<field name="id" type="int64" key="true"/>'
+                      '<field name="x_c" type="double"/>'
+                      '</fields></schema></window-source></windows>')
+
+        def _get(self, url, params=None):
+            requests.append(url)
+            return ET.fromstring(schema_xml)
+
+        conn = types.SimpleNamespace(session=types.SimpleNamespace(),
+                                     base_url='http://localhost/SASESP/')
+        conn._get = types.MethodType(_get, conn)
+
+        sch1 = get_schema(conn, 'p.cq.w')
+        sch2 = get_schema(conn, 'p.cq.w')
+        self.assertEqual(sch1.schema_string, 'id*:int64,x_c:double')
+        self.assertEqual(sch2.schema_string, 'id*:int64,x_c:double')
+        self.assertTrue(sch1 is not sch2)
+        self.assertEqual(len(requests), 1)
+
+        cache = get_schema_cache(conn.session)
+        self.assertEqual(cache.stats['hits'], 1)
+
+        out = get_events(conn, '<events><event window="p/cq/w"><id>1</id>'
+                               '<x_c>2.5</x_c></event></events>')
+        self.assertEqual(list(out['p.cq.w']['x_c']), [2.5])
+        self.assertEqual(len(requests), 1)
+
+        cache.invalidate('p')
+        get_schema(conn, 'p.cq.w')
+        self.assertEqual(len(requests), 2)
+
+
 if __name__ == '__main__':
    tm.runtests()
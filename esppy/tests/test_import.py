@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import os
+import re
+import subprocess
+import sys
+import unittest
+from esppy.utils.lazy import LazyModule, lazy_import
+from . import utils as tm
+
+# Modules that must not be imported by ``import esppy``
+HEAVY_MODULES = ['pandas', 'numpy', 'PIL', 'matplotlib', 'ipywidgets',
+                 'ipyleaflet', 'plotly']
+
+# Upper bound of the cumulative import time of the package, in seconds
+IMPORT_BUDGET = float(os.environ.get('ESPPY_IMPORT_BUDGET', '1.0'))
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def import_times(code):
+    ''' Return the cumulative import time of each module in seconds '''
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([ROOT, env.get('PYTHONPATH', '')])
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          env=env, universal_newlines=True, check=True)
+    out = {}
+    for line in proc.stderr.split('\n'):
+        match = re.match(r'import time:\s+\d+\s+\|\s+(\d+)\s+\|\s*(\S+)', line)
+        if match:
+            out[match.group(2)] = int(match.group(1)) / 1e6
+    return out
+
+
+class TestImport(tm.TestCase):
+
+    def test_lazy_module(self):
+        mod = LazyModule('json.tool')
+        self.assertTrue('main' not in mod.__dict__)
+        self.assertTrue(callable(mod.main))
+        self.assertTrue('main' in mod.__dict__)
+        self.assertTrue(lazy_import('sys') is sys)
+
+    def test_import_time(self):
+        times = import_times('import esppy')
+        self.assertTrue('esppy' in times)
+
+        for name in HEAVY_MODULES:
+            self.assertTrue(name not in times, '%s is imported by esppy' % name)
+
+        self.assertTrue(times['esppy'] < IMPORT_BUDGET,
+                        'import esppy took %.3fs' % times['esppy'])
+
+    def test_first_use(self):
+        times = import_times('import esppy.utils.events as e; e._get_esp2df_typemap()')
+        self.assertTrue('pandas' in times)
+
+    def test_lazy_attributes(self):
+        times = import_times('import esppy.config as c; c.CONCAT_OPTIONS; c.PANDAS_VERSION; '
+                             'from esppy.utils.events import ESP2DF_TYPEMAP')
+        self.assertTrue('pandas' in times)
+
+
+if __name__ == '__main__':
+    tm.runtests()
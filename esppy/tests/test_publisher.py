@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import requests
+import threading
+import time
+import unittest
+from unittest import mock
+from esppy.windows import Publisher, SourceWindow
+from . import utils as tm
+
+
+class StubSocket(object):
+    ''' Web socket that records messages and can hold or fail sends '''
+
+    def __init__(self):
+        self.messages = []
+        self.error = None
+        self.entered = threading.Event()
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def connect(self):
+        pass
+
+    def send(self, data):
+        self.entered.set()
+        self.gate.wait()
+        if self.error is not None:
+            raise self.error
+        self.messages.append(data)
+
+    def close(self):
+        pass
+
+
+class TestQueuedPublisher(tm.TestCase):
+
+    def setUp(self):
+        session = requests.Session()
+        session.base_url = 'http://localhost:9/SASESP/'
+        self.window = SourceWindow(schema=('id*:int64', 'x:double'), name='w')
+        self.window.session = session
+        self.window.project = 'p'
+        self.window.contquery = 'cq'
+        self.ws = StubSocket()
+
+    def publisher(self, **kwargs):
+        with mock.patch('esppy.windows.publisher.verify_window', return_value=True), \
+                mock.patch('esppy.windows.publisher.createWebSocket',
+                           return_value=self.ws):
+            return Publisher(self.window, **kwargs)
+
+    def hold(self, pub):
+        ''' Block the sender thread on the first record '''
+        self.ws.gate.clear()
+        self.assertTrue(pub.send('i,n,0,0.5'))
+        self.assertTrue(self.ws.entered.wait(5))
+
+    def test_synchronous(self):
+        pub = self.publisher()
+        self.assertTrue(pub._sender is None)
+        pub.send('i,n,1,1.5')
+        self.assertEqual(self.ws.messages, ['i,n,1,1.5'])
+        self.assertTrue(pub.flush())
+        pub.close()
+        self.assertFalse(pub.is_active)
+        with self.assertRaises(ValueError):
+            pub.send('i,n,2,2.5')
+
+    def test_block(self):
+        pub = self.publisher(queue_size=2)
+        self.hold(pub)
+        pub.send('i,n,1,1.5')
+        pub.send('i,n,2,2.5')
+
+        thread = threading.Thread(target=pub.send, args=('i,n,3,3.5',))
+        thread.start()
+        thread.join(0.2)
+        self.assertTrue(thread.is_alive())
+        self.assertEqual(pub.stats['depth'], 2)
+
+        self.ws.gate.set()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertTrue(pub.flush(timeout=5))
+        pub.close()
+
+        self.assertEqual(self.ws.messages,
+                         ['i,n,%d,%d.5' % (i, i) for i in range(4)])
+        stats = pub.stats
+        self.assertEqual(stats['queued'], 4)
+        self.assertEqual(stats['sent'], 4)
+        self.assertEqual(stats['dropped'], 0)
+        self.assertEqual(stats['max_depth'], 2)
+
+    def test_drop(self):
+        pub = self.publisher(queue_size=2, on_full='drop')
+        self.hold(pub)
+        self.assertTrue(pub.send('i,n,1,1.5'))
+        self.assertTrue(pub.send('i,n,2,2.5'))
+        self.assertFalse(pub.send('i,n,3,3.5'))
+
+        self.ws.gate.set()
+        pub.close()
+
+        self.assertEqual(self.ws.messages, ['i,n,0,0.5', 'i,n,1,1.5', 'i,n,2,2.5'])
+        self.assertEqual(pub.stats['dropped'], 1)
+        self.assertEqual(pub.stats['queued'], 3)
+
+    def test_drop_oldest(self):
+        pub = self.publisher(queue_size=2, on_full='drop_oldest')
+        self.hold(pub)
+        self.assertTrue(pub.send('i,n,1,1.5'))
+        self.assertTrue(pub.send('i,n,2,2.5'))
+        self.assertTrue(pub.send('i,n,3,3.5'))
+
+        self.ws.gate.set()
+        pub.close()
+
+        self.assertEqual(self.ws.messages, ['i,n,0,0.5', 'i,n,2,2.5', 'i,n,3,3.5'])
+        self.assertEqual(pub.stats['dropped'], 1)
+        self.assertEqual(pub.stats['sent'], 3)
+
+    def test_flush_timeout(self):
+        pub = self.publisher(queue_size=10)
+        self.hold(pub)
+        self.assertFalse(pub.flush(timeout=0.1))
+        self.ws.gate.set()
+        self.assertTrue(pub.flush(timeout=5))
+        pub.close()
+
+    def test_stats(self):
+        pub = self.publisher(queue_size=10, blocksize=3)
+        self.hold(pub)
+        for i in range(1, 5):
+            pub.send('i,n,%d,%d.5\n' % (i, i))
+        time.sleep(0.05)
+        self.ws.gate.set()
+        self.assertTrue(pub.flush(timeout=5))
+
+        # Queued csv records are joined into blocks
+        self.assertEqual(self.ws.messages, ['i,n,0,0.5',
+                                            'i,n,1,1.5\ni,n,2,2.5\ni,n,3,3.5',
+                                            'i,n,4,4.5\n'])
+        stats = pub.stats
+        self.assertEqual(stats['depth'], 0)
+        self.assertEqual(stats['queued'], 5)
+        self.assertEqual(stats['sent'], 5)
+        self.assertEqual(stats['messages'], 3)
+        self.assertEqual(stats['max_depth'], 4)
+        self.assertTrue(stats['max_latency'] >= 0.05)
+        self.assertTrue(0 < stats['avg_latency'] <= stats['max_latency'])
+        pub.close()
+
+    def test_separator(self):
+        pub = self.publisher(queue_size=10, blocksize=3, format='properties',
+                             separator='---')
+        self.hold(pub)
+        pub.send('id=1\nx=a-')
+        pub.send('id=2\nx=b---')
+        pub.send('id=3\nx=c')
+        time.sleep(0.05)
+        self.ws.gate.set()
+        pub.close()
+
+        # Only a trailing separator is removed before joining
+        self.assertEqual(self.ws.messages[1], 'id=1\nx=a----id=2\nx=b---id=3\nx=c')
+
+    def test_error_on_send(self):
+        pub = self.publisher(queue_size=10)
+        self.hold(pub)
+        pub.send('i,n,1,1.5')
+        self.ws.error = IOError('connection lost')
+        self.ws.gate.set()
+
+        end = time.time() + 5
+        while pub.stats['dropped'] < 2 and time.time() < end:
+            time.sleep(0.01)
+        self.assertEqual(pub.stats['dropped'], 2)
+
+        with self.assertRaises(IOError):
+            pub.send('i,n,2,2.5')
+
+        # The error is only raised once
+        self.ws.error = None
+        self.assertTrue(pub.send('i,n,3,3.5'))
+        pub.close()
+        self.assertEqual(self.ws.messages, ['i,n,3,3.5'])
+
+    def test_error_on_close(self):
+        pub = self.publisher(queue_size=10)
+        self.ws.error = IOError('connection lost')
+        pub.send('i,n,1,1.5')
+        with self.assertRaises(IOError):
+            pub.close()
+        self.assertFalse(pub.is_active)
+
+
+if __name__ == '__main__':
+    tm.runtests()
@@ -25,10 +25,14 @@
 import datetime
 import esppy
 import os
+import requests
 import six
 import sys
+import threading
+import time
 import unittest
-from esppy.utils.rest import get_params, RESTHelpers, to_underscore, to_camel
+from esppy.utils.rest import (get_params, RESTHelpers, to_underscore, to_camel,
+                              get_response_cache, configure_session)
 from . import utils as tm
 
 USER, PASSWD = tm.get_user_pass()
@@ -77,5 +81,117 @@ class TestRESTUtils(tm.TestCase):
                               g='ESPUnitTestProjectSA|contquery'))
 
 
+def respond(request):
+    ''' Answer requests with the server info and a revalidating ETag '''
+    headers = {'ETag': '"v1"'}
+    if request.headers.get('If-None-Match') == '"v1"':
+        return 304, b'', headers
+    return 200, '<server version="7.1"/>', headers
+
+
+class TestResponseCache(tm.TestCase):
+
+    def setUp(self):
+        session, self.adapter = tm.fake_session(respond)
+        self.helper = RESTHelpers(session=session)
+        self.cache = get_response_cache(session)
+        self.cache.enabled = True
+
+    def test_disabled(self):
+        self.cache.enabled = False
+        self.helper._get('server')
+        self.helper._get('server')
+        self.assertEqual(len(self.adapter.requests), 2)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_hits(self):
+        out = self.helper._get('server', params=dict(config='true'))
+        self.assertEqual(out.attrib['version'], '7.1')
+        self.assertTrue(self.helper._get('server', params=dict(config='true')) is out)
+        self.assertEqual(self.helper._get('server', params=dict(config='true'), raw=True),
+                         '<server version="7.1"/>')
+        self.assertEqual(len(self.adapter.requests), 1)
+
+        # Parameters are part of the key and live data is never cached
+        self.helper._get('server')
+        self.helper._get('events/p/cq/w')
+        self.helper._get('events/p/cq/w')
+        self.assertEqual(len(self.adapter.requests), 4)
+        self.assertEqual(self.cache.stats['hits'], 2)
+        self.assertEqual(self.cache.stats['misses'], 2)
+
+    def test_revalidate(self):
+        self.cache.set_ttl('server', 1e-6)
+        out = self.helper._get('server')
+        self.assertTrue(self.helper._get('server') is out)
+        self.assertEqual(len(self.adapter.requests), 2)
+        self.assertEqual(self.adapter.requests[1].headers['If-None-Match'], '"v1"')
+        self.assertEqual(self.cache.stats['revalidations'], 1)
+
+    def test_invalidate(self):
+        self.helper._get('server')
+        self.helper._get('windowXml', params=dict(project='p'))
+        self.assertEqual(len(self.cache), 2)
+
+        self.helper._delete('projects/p')
+        self.assertEqual(len(self.cache), 1)
+        self.helper._get('windowXml', params=dict(project='p'))
+        self.assertEqual(len(self.adapter.requests), 4)
+
+        self.cache.invalidate()
+        self.assertEqual(len(self.cache), 0)
+        self.assertEqual(self.cache.stats['invalidations'], 3)
+
+        with self.assertRaises(ValueError):
+            self.cache.set_ttl('events', 10)
+
+
+class TestBulk(tm.TestCase):
+
+    def setUp(self):
+        session, self.adapter = tm.fake_session(respond)
+        self.helper = RESTHelpers(session=session)
+
+    def test_configure_session(self):
+        session = configure_session(requests.Session(), pool_size=4, retries=2)
+        adapter = session.get_adapter('https://localhost/')
+        self.assertEqual(adapter._pool_maxsize, 4)
+        self.assertEqual(adapter.max_retries.total, 2)
+        self.assertEqual(adapter.max_retries.connect, 1)
+        self.assertTrue(503 in adapter.max_retries.status_forcelist)
+
+    def test_concurrent(self):
+        barrier = threading.Barrier(4, timeout=5)
+
+        def func(item):
+            barrier.wait()
+            return item * 2
+
+        self.assertEqual(self.helper._bulk(func, range(4), max_workers=4), [0, 2, 4, 6])
+        self.assertEqual(self.helper._bulk(func, []), [])
+
+    def test_errors(self):
+        done = []
+
+        def func(item):
+            if item == 1:
+                raise ValueError('bad item')
+            time.sleep(0.05)
+            done.append(item)
+
+        with self.assertRaises(ValueError):
+            self.helper._bulk(func, range(4), max_workers=4)
+        self.assertEqual(sorted(done), [0, 2, 3])
+
+    def test_metadata(self):
+        proj = esppy.project.Project('p')
+        proj.session = self.helper.session
+        proj._set_metadata(dict(a=1, b=2, c=3))
+        urls = sorted(req.url for req in self.adapter.requests)
+        self.assertEqual(urls, ['http://localhost:9/SASESP/projectMetadata/p/a',
+                                'http://localhost:9/SASESP/projectMetadata/p/b',
+                                'http://localhost:9/SASESP/projectMetadata/p/c'])
+
+
 if __name__ == '__main__':
    tm.runtests()
@@ -29,6 +29,7 @@ import six
 import esppy
 import sys
 import unittest
+from esppy.espapi import codec
 from esppy.schema import SchemaField, Schema
 from esppy.utils import xml
 from . import utils as tm
@@ -151,6 +152,23 @@ class TestSchemaField(tm.TestCase):
         self.assertEqual(repr(field), 'foo:int64')
 
 
+class TestSchemaUbjson(tm.TestCase):
+
+    def test_from_ubjson(self):
+        data = codec.JsonEncoder({'schema': {'fields': [
+            {'@name': 'foo', '@type': 'int64', '@key': 'true'},
+            {'@name': 'bar', '@type': 'utf8str'},
+            {'@name': 'baz', '@type': 'array(double)'}]}}).data
+        sch = Schema.from_ubjson(data)
+
+        self.assertEqual(len(sch), 3)
+        self.assertEqual(sch.fields['foo'].type, 'int64')
+        self.assertEqual(sch.fields['foo'].key, True)
+        self.assertEqual(sch.fields['bar'].type, 'string')
+        self.assertEqual(sch.fields['bar'].key, False)
+        self.assertEqual(sch.fields['baz'].type, 'array(dbl)')
+
+
 class TestSchema(tm.TestCase):
 
     def setUp(self):
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import requests
+import unittest
+from esppy.espapi import codec
+from esppy.espapi.connections import ServerConnection
+from esppy.windows import Subscriber, SourceWindow
+from esppy.windows.subscriptions import SubscriptionManager, get_subscription_manager
+from . import utils as tm
+
+
+class TestSubscriptionManager(tm.TestCase):
+
+    def setUp(self):
+        self.session = requests.Session()
+        self.session.base_url = 'http://localhost:9/SASESP/'
+        self.session.conn_url = 'http://localhost:9/'
+
+        self.windows = []
+        for name in ['w_a', 'w_b']:
+            win = SourceWindow(schema=('id*:int64', 'x:double', 's:string'), name=name)
+            win.session = self.session
+            win.project = 'p'
+            win.contquery = 'cq'
+            self.windows.append(win)
+
+        # The connection is not started, so messages are routed by
+        # calling the connection directly
+        self.manager = get_subscription_manager(self.session)
+        self.manager._connection = ServerConnection(self.windows[0], None, columns=True)
+        self.events = {}
+
+    def on_event(self, name):
+        def on_event(sock, event):
+            self.events.setdefault(name, []).append(event)
+        return on_event
+
+    def send(self, message):
+        self.manager.connection.data(codec.JsonEncoder(message).data)
+
+    def send_schema(self, subscription):
+        self.send({'schema': {'@id': subscription.id, 'fields': [
+            {'@name': 'id', '@type': 'int64', '@key': 'true'},
+            {'@name': 'x', '@type': 'double'},
+            {'@name': 's', '@type': 'utf8str'}]}})
+
+    def test_get_subscription_manager(self):
+        self.assertTrue(isinstance(self.manager, SubscriptionManager))
+        self.assertTrue(get_subscription_manager(self.session) is self.manager)
+
+    def test_routing(self):
+        upd = Subscriber(self.windows[0], mode='updating', shared=True,
+                         on_event=self.on_event('upd'))
+        strm = Subscriber(self.windows[1], mode='streaming', shared=True,
+                          on_event=self.on_event('strm'), opcodes=True)
+        upd.start()
+        strm.start()
+
+        self.assertTrue(upd.is_active)
+        self.assertEqual(len(self.manager.subscriptions), 2)
+
+        sub_upd = upd._subscription
+        sub_strm = strm._subscription
+        self.assertTrue(sub_upd.id != sub_strm.id)
+        self.assertEqual(list(sub_upd.get_request()), ['event-collection'])
+        self.assertEqual(sub_upd.get_request()['event-collection']['window'], 'p/cq/w_a')
+        self.assertEqual(list(sub_strm.get_request()), ['event-stream'])
+
+        self.send_schema(sub_upd)
+        self.send_schema(sub_strm)
+
+        self.send({'events': {'@id': sub_upd.id, 'entries': [
+            {'@opcode': 'insert', 'id': '1', 'x': '1.5', 's': 'a'},
+            {'@opcode': 'insert', 'id': '2', 'x': '2.5', 's': 'b'}]}})
+        self.send({'events': {'@id': sub_strm.id, 'entries': [
+            {'@opcode': 'insert', 'id': '3', 'x': '3.5', 's': 'c'}]}})
+        self.send({'events': {'@id': sub_upd.id, 'entries': [
+            {'@opcode': 'delete', 'id': '1', 'x': '1.5', 's': 'a'}]}})
+
+        self.assertEqual(len(self.events['upd']), 2)
+        self.assertEqual(len(self.events['strm']), 1)
+        self.assertEqual(list(self.events['upd'][0]['x']), [1.5, 2.5])
+        self.assertTrue('_opcode' not in self.events['upd'][0].columns)
+        self.assertEqual(list(self.events['strm'][0]['_opcode']), ['insert'])
+        self.assertEqual(list(upd.data.index), [2])
+        self.assertTrue(strm.data is None)
+
+        # A page of an event collection replaces the window state
+        self.send({'events': {'@id': sub_upd.id, 'info': {'page': 0, 'pages': 1},
+                              'entries': [{'@opcode': 'insert', 'id': '5',
+                                           'x': '5.5', 's': 'e'}]}})
+        self.assertEqual(list(upd.data.index), [5])
+
+        upd.stop()
+        self.assertFalse(upd.is_active)
+        self.assertEqual(self.manager.subscriptions, [sub_strm])
+
+        # Messages for removed subscriptions are ignored
+        self.send({'events': {'@id': sub_upd.id, 'entries': [
+            {'@opcode': 'insert', 'id': '6', 'x': '6.5', 's': 'f'}]}})
+        self.assertEqual(len(self.events['upd']), 3)
+
+        strm.stop()
+        self.assertEqual(self.manager.subscriptions, [])
+
+    def test_errors(self):
+        errors = []
+
+        def on_event(sock, event):
+            raise ValueError('bad event')
+
+        bad = Subscriber(self.windows[0], mode='streaming', shared=True,
+                         on_event=on_event,
+                         on_error=lambda sock, error: errors.append(error))
+        good = Subscriber(self.windows[1], mode='streaming', shared=True,
+                          on_event=self.on_event('good'))
+        bad.start()
+        good.start()
+
+        for sub in [bad, good]:
+            self.send_schema(sub._subscription)
+            self.send({'events': {'@id': sub._subscription.id, 'entries': [
+                {'@opcode': 'insert', 'id': '1', 'x': '1.5', 's': 'a'}]}})
+
+        self.assertEqual(len(errors), 1)
+        self.assertTrue(isinstance(errors[0], ValueError))
+        self.assertEqual(len(self.events['good']), 1)
+
+        bad.stop()
+        good.stop()
+
+    def test_open_once(self):
+        sent = []
+        self.manager.send = sent.append
+
+        sub = Subscriber(self.windows[0], mode='streaming', shared=True)
+        sub.start()
+        self.assertFalse(sub._subscription.is_open)
+
+        # The subscribing thread and the handshake can both open it
+        sub._subscription.open()
+        self.manager.connection.handshakeComplete()
+        self.assertTrue(sub._subscription.is_open)
+        self.assertEqual(len(sent), 1)
+        self.assertEqual(list(sent[0]), ['event-stream'])
+
+        self.manager.connection._autoReconnect = False
+        self.manager.connection.closed()
+        self.assertFalse(sub._subscription.is_open)
+        self.manager.connection.handshakeComplete()
+        self.assertEqual(len(sent), 2)
+
+        del self.manager.send
+        sub.stop()
+
+
+if __name__ == '__main__':
+    tm.runtests()
@@ -31,9 +31,10 @@ import six
 import sys
 import time
 import unittest
+from esppy.base import attribute
 from esppy.config import ESP_ROOT
 from esppy.plotting import ChartLayout
-from esppy.windows import Subscriber, Publisher, Window
+from esppy.windows import Subscriber, Publisher, Window, CopyWindow, SourceWindow
 from esppy.windows.base import param_iter, var_mapper, Target
 from esppy.utils import xml
 from . import utils as tm
@@ -130,6 +131,94 @@ class TestTarget(tm.TestCase):
         self.assertEqual(repr(self.target6), "Target('T6')")
 
 
+class StubSubscriber(object):
+
+    def __init__(self, on_event=None, **kwargs):
+        self.on_event = on_event
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+class TestWindowSubscribe(tm.TestCase):
+
+    def setUp(self):
+        self.win = SourceWindow(schema=('id*:int64', 'x:double'), name='w')
+        self.win.create_subscriber = lambda **kwargs: StubSubscriber(**kwargs)
+
+    def events(self, ids, opcodes):
+        events = pd.DataFrame(dict(x=[float(x) for x in ids]),
+                              index=pd.Index(ids, name='id'))
+        events['_opcode'] = opcodes
+        return events
+
+    def run_events(self):
+        self.win.subscribe(mode='updating')
+        on_event = self.win._subscriber.on_event
+        on_event(None, self.events([1, 2, 3], ['insert'] * 3))
+        on_event(None, self.events([1, 3, 4], ['delete', 'upsert', 'insert']))
+        return self.win.data
+
+    def test_filter_transformer(self):
+        self.win.add_event_transformer(lambda df: df[df['x'] != 4.0])
+        out = self.run_events()
+        self.assertEqual(sorted(out.index), [2, 3])
+        self.assertTrue('_opcode' not in out.columns)
+
+    def test_reorder_transformer(self):
+        self.win.add_event_transformer('sort_values', 'x', ascending=False)
+        out = self.run_events()
+        self.assertEqual(sorted(out.index), [2, 3, 4])
+
+
+class TestAttributes(tm.TestCase):
+
+    def test_attribute_table(self):
+        fields, names, _ = SourceWindow._get_attribute_table()
+        fields = [x[0] for x in fields]
+        self.assertTrue('insert_only' in fields)
+        self.assertTrue('pubsub' in fields)
+        self.assertTrue('insert_only' not in
+                        [x[0] for x in CopyWindow._get_attribute_table()[0]])
+        self.assertEqual(names['insert-only'], 'insert_only')
+        self.assertEqual(names['insert_only'], 'insert_only')
+
+    def test_subclass_table(self):
+        SourceWindow(name='w')._get_attributes()
+
+        class MySourceWindow(SourceWindow):
+            extra = attribute('extra-attr', dtype='string')
+
+        win = MySourceWindow(name='w', insert_only=True)
+        win.extra = 'x'
+        attrs = win._get_attributes()
+        self.assertEqual(attrs['extra-attr'], 'x')
+        self.assertEqual(attrs['insert-only'], 'true')
+        self.assertTrue('extra' not in
+                        [x[0] for x in SourceWindow._get_attribute_table()[0]])
+
+    def test_get_attributes(self):
+        win = SourceWindow(name='w', insert_only=True, index_type='pi_HASH')
+        attrs = win._get_attributes()
+        self.assertEqual(attrs['insert-only'], 'true')
+        self.assertEqual(attrs['index'], 'pi_HASH')
+        self.assertEqual(attrs['name'], 'w')
+
+        attrs = win._get_attributes(use_xml_values=False)
+        self.assertEqual(attrs['insert_only'], True)
+
+        out = SourceWindow()
+        out._set_attributes({'insert-only': 'false', 'index': 'pi_RBTREE', 'name': 'x'})
+        self.assertEqual(out.insert_only, False)
+        self.assertEqual(out.index_type, 'rbtree')
+        self.assertEqual(out.name, 'x')
+
+        self.assertEqual(win.copy()._get_attributes(), win._get_attributes())
+
+
 class TestSubscriber(tm.TestCase):
 
     def setUp(self):
@@ -28,8 +28,12 @@ import os
 import six
 import sys
 import unittest
+from esppy.contquery import ContinuousQuery
+from esppy.project import Project
+from esppy.windows import SourceWindow, CopyWindow, FilterWindow
 from esppy.utils.xml import (new_elem, add_elem, add_properties, from_xml,
-                             to_xml, xml_indent, get_attrs)
+                             to_xml, xml_indent, get_attrs, build_element,
+                             iter_xml, XMLStream)
 from . import utils as tm
 
 USER, PASSWD = tm.get_user_pass()
@@ -195,5 +199,69 @@ class TestXMLUtils(tm.TestCase):
         self.assertEqual(out, {'a': '1000', 'b': '2000', 'class': '20',
                                'my-project': 'ESPUnitTestProjectSA'})
 
+class TestStreaming(tm.TestCase):
+
+    def setUp(self):
+        self.project = Project('p', n_threads=2)
+        self.project.metadata['k'] = 'v'
+        query = ContinuousQuery('cq')
+        self.project.add_query(query)
+        src = SourceWindow(schema=('id*:int64', 'x:double'), name='src')
+        cpy = CopyWindow(name='cpy')
+        flt = FilterWindow(name='flt')
+        flt.set_expression('x > 1')
+        query.add_windows(src, cpy, flt)
+        src.add_targets(cpy, flt)
+        self.project.add_connectors('grp', {'c1': 'running'})
+        self.project.add_edge('grp', 'grp')
+
+    def test_iter_xml(self):
+        def events():
+            yield 'start', new_elem('a', dict(x='1&2'))
+            yield 'element', new_elem('b', text_content='<t>')
+            yield 'start', new_elem('c')
+            yield 'end', None
+            yield 'end', None
+
+        elem = build_element(events())
+        self.assertEqual(elem.tag, 'a')
+        self.assertEqual([x.tag for x in elem], ['b', 'c'])
+
+        for pretty in [False, True]:
+            self.assertEqual(''.join(iter_xml(events(), pretty=pretty)),
+                             to_xml(build_element(events()), pretty=pretty))
+
+        self.assertEqual(b''.join(iter_xml(events(), encoding='utf-8')),
+                         to_xml(elem).encode('utf-8'))
+
+    def test_project(self):
+        for pretty in [False, True]:
+            self.assertEqual(self.project.to_xml(pretty=pretty),
+                             to_xml(self.project.to_element(), pretty=pretty))
+
+        chunks = list(self.project.iter_xml(chunk_size=100))
+        self.assertTrue(len(chunks) > 1)
+        self.assertEqual(''.join(chunks), self.project.to_xml())
+
+        out = six.StringIO()
+        self.project.save_xml(out)
+        self.assertEqual(out.getvalue(), self.project.to_xml(pretty=True))
+
+    def test_sync(self):
+        self.project.session, adapter = tm.fake_session(lambda request: '<response/>')
+
+        self.project.sync()
+
+        request = adapter.requests[-1]
+        self.assertEqual(request.method, 'PUT')
+        self.assertEqual(request.headers.get('Transfer-Encoding'), 'chunked')
+        self.assertTrue(isinstance(request.body, XMLStream))
+
+        # The body can be iterated again when a request is retried
+        body = b''.join(request.body)
+        self.assertEqual(body, self.project.to_xml().encode('utf-8'))
+        self.assertEqual(b''.join(request.body), body)
+
+
 if __name__ == '__main__':
    tm.runtests()
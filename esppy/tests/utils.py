@@ -28,6 +28,7 @@ import difflib
 import os
 import re
 import sys
+import requests
 import unittest
 import six
 from ..utils import xml
@@ -75,6 +76,71 @@ class TestCase(unittest.TestCase):
         return self.assertEquals(*args, **kwargs)
 
 
+class FakeAdapter(requests.adapters.BaseAdapter):
+    '''
+    Transport adapter that answers requests without a server
+
+    Parameters
+    ----------
+    respond : callable
+        Function that takes a request and returns the response body,
+        or a (status, body, headers) tuple
+
+    Attributes
+    ----------
+    requests : list of requests.PreparedRequest
+        The requests that were sent
+
+    '''
+
+    def __init__(self, respond):
+        super(FakeAdapter, self).__init__()
+        self.respond = respond
+        self.requests = []
+
+    def send(self, request, **kwargs):
+        self.requests.append(request)
+        status, headers = 200, {}
+        body = self.respond(request)
+        if isinstance(body, tuple):
+            status, body, headers = body
+        if isinstance(body, six.text_type):
+            body = body.encode('utf-8')
+        resp = requests.Response()
+        resp.request = request
+        resp.url = request.url
+        resp.status_code = status
+        resp.headers.update(headers)
+        resp._content = body or b''
+        return resp
+
+    def close(self):
+        pass
+
+
+def fake_session(respond, base_url='http://localhost:9/SASESP/'):
+    '''
+    Return a session whose requests are answered by a :class:`FakeAdapter`
+
+    Parameters
+    ----------
+    respond : callable
+        The response function of the adapter
+    base_url : string, optional
+        The base URL of the ESP REST API
+
+    Returns
+    -------
+    (requests.Session, :class:`FakeAdapter`)
+
+    '''
+    adapter = FakeAdapter(respond)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.base_url = base_url
+    return session, adapter
+
+
 def get_data_dir():
     ''' Return the testing data directory '''
     return os.path.join(os.path.dirname(__file__), 'data')
@@ -21,11 +21,13 @@
 from __future__ import print_function, division, absolute_import, unicode_literals
 
 import io
-import numpy as np
-import pandas as pd
 import re
 import six
-from PIL import Image
+from .utils.lazy import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+Image = lazy_import('PIL.Image')
 
 
 def _bgr2rgb(pil_image):
@@ -0,0 +1,483 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+''' Event Buffers '''
+
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import collections
+import threading
+from .events import OPCODE_COLUMN
+from .lazy import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+MIN_CAPACITY = 64
+
+DELETE_OPCODES = set(['delete', 'safedelete'])
+
+
+def _numpy_dtype(dtype):
+    ''' Return the NumPy storage type for a pandas dtype '''
+    if isinstance(dtype, np.dtype):
+        return dtype
+    return np.dtype(object)
+
+
+def _promote(dtype, other):
+    ''' Return a dtype that can hold values of both types '''
+    if dtype == other:
+        return dtype
+    try:
+        return np.result_type(dtype, other)
+    except TypeError:
+        return np.dtype(object)
+
+
+class ColumnBuffer(object):
+    '''
+    Preallocated columnar buffer of event rows
+
+    Rows are appended in place into one NumPy array per column.  When
+    a capacity is given, the arrays are used as a ring and the oldest
+    (or newest) rows are discarded once it is full.  A DataFrame
+    is only built when :meth:`to_frame` is called.
+
+    Parameters
+    ----------
+    template : DataFrame
+        A DataFrame defining the columns, index, and initial data types
+        of the buffer.  Any rows in the template are appended.
+    capacity : int, optional
+        The maximum number of rows to keep.  If not specified, the
+        buffer grows as needed.
+    keep : string, optional
+        Which rows to keep when the capacity is reached: 'last' discards
+        the oldest rows, 'first' discards incoming rows.
+
+    Returns
+    -------
+    :class:`ColumnBuffer`
+
+    '''
+
+    def __init__(self, template, capacity=None, keep='last'):
+        if keep not in ['first', 'last']:
+            raise ValueError('keep must be one of: first, last')
+        if capacity is not None and capacity < 1:
+            raise ValueError('capacity must be a positive integer')
+        self.capacity = capacity
+        self.keep = keep
+        self._lock = threading.RLock()
+        self.reset(template)
+
+    def reset(self, template):
+        '''
+        Discard all rows and redefine the buffer from a template
+
+        Parameters
+        ----------
+        template : DataFrame
+            A DataFrame defining the columns, index, and initial data types
+            of the buffer.  Any rows in the template are appended.
+
+        '''
+        with self._lock:
+            self.index = [x for x in template.index.names if x is not None]
+            self.columns = list(template.columns)
+            self._template = template.iloc[0:0]
+            dtypes = collections.OrderedDict()
+            for name in self.index:
+                dtypes[name] = _numpy_dtype(template.index.get_level_values(name).dtype)
+            for name in self.columns:
+                dtypes[name] = _numpy_dtype(template[name].dtype)
+            self._dtypes = dtypes
+            self._allocated = self.capacity or MIN_CAPACITY
+            self._arrays = collections.OrderedDict(
+                (name, np.empty(self._allocated, dtype=dtype))
+                for name, dtype in dtypes.items())
+            self._start = 0
+            self._size = 0
+            self._frame = None
+        if len(template):
+            self.append(template)
+
+    def clear(self):
+        ''' Discard all rows '''
+        with self._lock:
+            self._start = 0
+            self._size = 0
+            self._frame = None
+
+    def __len__(self):
+        return self._size
+
+    def _grow(self, size):
+        ''' Reallocate the (unbounded) column arrays to hold `size` rows '''
+        allocated = self._allocated
+        while allocated < size:
+            allocated *= 2
+        for name, array in self._arrays.items():
+            new = np.empty(allocated, dtype=array.dtype)
+            new[:self._size] = array[:self._size]
+            self._arrays[name] = new
+        self._allocated = allocated
+
+    def _get_values(self, data, name, nrows):
+        ''' Extract column values from an event DataFrame '''
+        if name in self.index and name in data.index.names:
+            return np.asarray(data.index.get_level_values(name))
+        if name in data.columns:
+            return np.asarray(data[name])
+        return np.full(nrows, np.nan)
+
+    def _write(self, name, pos, values):
+        ''' Write values to a column, promoting its type if needed '''
+        array = self._arrays[name]
+        dtype = _promote(array.dtype, values.dtype)
+        if dtype != array.dtype:
+            array = self._arrays[name] = array.astype(dtype)
+        array[pos:pos + len(values)] = values
+
+    def append(self, data):
+        '''
+        Append the rows of a DataFrame
+
+        Parameters
+        ----------
+        data : DataFrame
+            The rows to append.  Columns that are not in the buffer
+            are ignored.  Missing columns are filled with NaN.
+
+        '''
+        nrows = len(data)
+        if not nrows:
+            return
+
+        with self._lock:
+            capacity = self.capacity
+
+            if capacity is None:
+                if self._size + nrows > self._allocated:
+                    self._grow(self._size + nrows)
+                for name in self._arrays:
+                    self._write(name, self._size,
+                                self._get_values(data, name, nrows))
+                self._size += nrows
+                self._frame = None
+                return
+
+            offset = 0
+            if self.keep == 'first':
+                nrows = min(nrows, capacity - self._size)
+                if nrows <= 0:
+                    return
+            elif nrows >= capacity:
+                offset = nrows - capacity
+                nrows = capacity
+                self._start = 0
+                self._size = 0
+
+            end = (self._start + self._size) % capacity
+            first = min(nrows, capacity - end)
+
+            for name in self._arrays:
+                values = self._get_values(data, name, len(data))[offset:offset + nrows]
+                self._write(name, end, values[:first])
+                if first < nrows:
+                    self._write(name, 0, values[first:])
+
+            overflow = self._size + nrows - capacity
+            if overflow > 0:
+                self._start = (self._start + overflow) % capacity
+                self._size = capacity
+            else:
+                self._size += nrows
+
+            self._frame = None
+
+    def _column(self, name):
+        ''' Return the rows of a column in order '''
+        array = self._arrays[name]
+        start, size = self._start, self._size
+        if start + size <= len(array):
+            return array[start:start + size].copy()
+        return np.concatenate([array[start:], array[:(start + size) - len(array)]])
+
+    def to_frame(self):
+        '''
+        Return the buffered rows as a DataFrame
+
+        The DataFrame is cached until more rows are appended.
+
+        Returns
+        -------
+        :class:`pandas.DataFrame`
+
+        '''
+        with self._lock:
+            if self._frame is not None:
+                return self._frame
+
+            if not self._size:
+                self._frame = self._template
+                return self._frame
+
+            data = collections.OrderedDict()
+            for name in self._arrays:
+                data[name] = self._column(name)
+
+            out = pd.DataFrame(data, columns=list(data.keys()))
+            if self.index:
+                out = out.set_index(self.index)
+
+            self._frame = out
+            return out
+
+
+class KeyedBuffer(object):
+    '''
+    Keyed columnar state of an updating window
+
+    Rows are stored in one NumPy array per column and located through
+    a hash index from the key field values to a row slot.  Inserts,
+    updates, upserts, and deletes are each applied in constant time,
+    and the slots of deleted rows are reused by later inserts.  A
+    DataFrame is only built when :meth:`to_frame` is called.
+
+    Parameters
+    ----------
+    template : DataFrame
+        A DataFrame defining the columns, index (key fields), and initial
+        data types of the buffer.  Any rows in the template are inserted.
+
+    Notes
+    -----
+    Rows of windows without key fields can not be updated or deleted,
+    so every non-delete event is added as a new row.
+
+    Returns
+    -------
+    :class:`KeyedBuffer`
+
+    '''
+
+    def __init__(self, template):
+        self._lock = threading.RLock()
+        self.reset(template)
+
+    def reset(self, template):
+        '''
+        Discard all rows and redefine the buffer from a template
+
+        Parameters
+        ----------
+        template : DataFrame
+            A DataFrame defining the columns, index (key fields), and
+            initial data types of the buffer.  Any rows in the template
+            are inserted.
+
+        '''
+        with self._lock:
+            self.index = [x for x in template.index.names if x is not None]
+            self.columns = [x for x in template.columns if x != OPCODE_COLUMN]
+            self._template = template.iloc[0:0][self.columns]
+            dtypes = collections.OrderedDict()
+            for name in self.index:
+                dtypes[name] = _numpy_dtype(template.index.get_level_values(name).dtype)
+            for name in self.columns:
+                dtypes[name] = _numpy_dtype(template[name].dtype)
+            self._allocated = MIN_CAPACITY
+            self._arrays = collections.OrderedDict(
+                (name, np.empty(self._allocated, dtype=dtype))
+                for name, dtype in dtypes.items())
+            self._valid = np.zeros(self._allocated, dtype=bool)
+            self._slots = {}
+            self._free = []
+            self._high = 0
+            self._size = 0
+            self._frame = None
+        if len(template):
+            self.append(template)
+
+    def clear(self):
+        ''' Discard all rows '''
+        with self._lock:
+            self._valid[:] = False
+            self._slots.clear()
+            self._free = []
+            self._high = 0
+            self._size = 0
+            self._frame = None
+
+    def __len__(self):
+        return self._size
+
+    def _grow(self):
+        ''' Double the size of the column arrays '''
+        allocated = self._allocated * 2
+        for name, array in self._arrays.items():
+            new = np.empty(allocated, dtype=array.dtype)
+            new[:self._high] = array[:self._high]
+            self._arrays[name] = new
+        valid = np.zeros(allocated, dtype=bool)
+        valid[:self._high] = self._valid[:self._high]
+        self._valid = valid
+        self._allocated = allocated
+
+    def _new_slot(self):
+        ''' Return an unused row slot '''
+        if self._free:
+            return self._free.pop()
+        if self._high == self._allocated:
+            self._grow()
+        self._high += 1
+        return self._high - 1
+
+    def _get_values(self, data, name):
+        ''' Extract column values from an event DataFrame '''
+        if name in self.index and name in data.index.names:
+            return np.asarray(data.index.get_level_values(name))
+        if name in data.columns:
+            return np.asarray(data[name])
+
+    def _get_keys(self, data):
+        ''' Return the key of each row in an event DataFrame '''
+        if not self.index:
+            return None
+        levels = []
+        for name in self.index:
+            values = self._get_values(data, name)
+            if values is None:
+                raise ValueError('Events do not contain the key field: %s' % name)
+            levels.append(values.tolist())
+        if len(levels) == 1:
+            return levels[0]
+        return list(zip(*levels))
+
+    def _write(self, name, rows, values):
+        ''' Write values to rows of a column, promoting its type if needed '''
+        array = self._arrays[name]
+        dtype = _promote(array.dtype, values.dtype)
+        if dtype != array.dtype:
+            array = self._arrays[name] = array.astype(dtype)
+        array[rows] = values
+
+    def append(self, data, opcodes=None):
+        '''
+        Apply the rows of a DataFrame according to their opcodes
+
+        Parameters
+        ----------
+        data : DataFrame
+            The events to apply.  Columns that are not in the buffer
+            are ignored.  Columns that are missing keep their current
+            values (or NaN for new rows).
+        opcodes : list-of-strings, optional
+            The opcode of each event.  If not specified, the ``_opcode``
+            column of `data` is used.  Without opcodes, every event is
+            treated as an upsert.
+
+        '''
+        nrows = len(data)
+        if not nrows:
+            return
+
+        if opcodes is None and OPCODE_COLUMN in data.columns:
+            opcodes = data[OPCODE_COLUMN].tolist()
+
+        keys = self._get_keys(data)
+
+        with self._lock:
+            index = self._slots
+            slots = np.full(nrows, -1, dtype=np.intp)
+            created = []
+
+            for i in range(nrows):
+                key = keys[i] if keys is not None else None
+
+                if opcodes is not None and opcodes[i] in DELETE_OPCODES:
+                    slot = index.pop(key, None) if keys is not None else None
+                    if slot is not None:
+                        self._valid[slot] = False
+                        self._free.append(slot)
+                        self._size -= 1
+                    continue
+
+                slot = index.get(key) if keys is not None else None
+                if slot is None:
+                    slot = self._new_slot()
+                    if keys is not None:
+                        index[key] = slot
+                    self._valid[slot] = True
+                    self._size += 1
+                    created.append(slot)
+                slots[i] = slot
+
+            self._frame = None
+
+            positions = np.flatnonzero(slots >= 0)
+            if not len(positions):
+                return
+
+            # Only the last event for a slot in this batch is written
+            rows = slots[positions]
+            if len(np.unique(rows)) < len(rows):
+                last = len(rows) - 1 - np.unique(rows[::-1], return_index=True)[1]
+                positions = positions[np.sort(last)]
+                rows = slots[positions]
+
+            for name in self._arrays:
+                values = self._get_values(data, name)
+                if values is not None:
+                    self._write(name, rows, values[positions])
+                elif created:
+                    self._write(name, created, np.full(len(created), np.nan))
+
+    def to_frame(self):
+        '''
+        Return the current rows as a DataFrame
+
+        Rows are returned in slot order.  The DataFrame is cached until
+        more events are applied.
+
+        Returns
+        -------
+        :class:`pandas.DataFrame`
+
+        '''
+        with self._lock:
+            if self._frame is not None:
+                return self._frame
+
+            if not self._size:
+                self._frame = self._template
+                return self._frame
+
+            valid = self._valid[:self._high]
+            data = collections.OrderedDict()
+            for name, array in self._arrays.items():
+                data[name] = array[:self._high][valid]
+
+            out = pd.DataFrame(data, columns=list(data.keys()))
+            if self.index:
+                out = out.set_index(self.index)
+
+            self._frame = out
+            return out
@@ -23,7 +23,6 @@ from __future__ import print_function, division, absolute_import, unicode_litera
 import base64
 import datetime
 import decimal
-import numpy as np
 import os
 import re
 import io
@@ -33,6 +32,9 @@ from six.moves import urllib
 from . import xml
 from .rest import get_params
 from ..base import ESPObject
+from .lazy import lazy_import
+
+np = lazy_import('numpy')
 
 EPOCH = datetime.datetime(1970, 1, 1)
 
@@ -106,6 +108,32 @@ def get_project_data(project):
     return data
 
 
+def get_project_body(project):
+    '''
+    Retrieve project data as a request body
+
+    Project objects are serialized while the request is sent, using
+    chunked transfer encoding, rather than being converted to one XML
+    string first.  Other types are handled by :func:`get_project_data`.
+
+    Parameters
+    ----------
+    project : Project or file-like or string or ElementTree.Element
+        The data itself or a path to it
+
+    Returns
+    -------
+    :class:`esppy.utils.xml.XMLStream`
+        If ``project`` is a Project object
+    bytes
+        Otherwise
+
+    '''
+    if isinstance(project, ESPObject) and hasattr(project, '_iter_elements'):
+        return xml.XMLStream(project._iter_elements, encoding='utf-8')
+    return get_project_data(project).encode('utf-8')
+
+
 def get_server_info(obj):
     '''
     Retrieve information about the server
@@ -122,6 +150,23 @@ def get_server_info(obj):
     '''
     res = obj._get(urllib.parse.urljoin(obj.base_url, 'server'),
                    params=get_params(config=True))
+    return parse_server_info(res)
+
+
+def parse_server_info(res):
+    '''
+    Convert the server information response to a dictionary
+
+    Parameters
+    ----------
+    res : ElementTree.Element
+        The response of the ``server`` endpoint
+
+    Returns
+    -------
+    dict
+
+    '''
     out = {}
 
     for key, value in res.attrib.items():
@@ -141,3 +186,195 @@ def get_server_info(obj):
         out[key] = value
 
     return out
+
+
+def guess_event_format(data):
+    '''
+    Guess the format of event data from its first characters
+
+    Parameters
+    ----------
+    data : string
+        The beginning of the event data
+
+    Returns
+    -------
+    string
+        'xml', 'json', 'properties', or 'csv'
+
+    '''
+    data = data.lstrip()
+    if data.startswith('<'):
+        return 'xml'
+    if data.startswith('{'):
+        return 'json'
+    if re.match(r'\w+=', data):
+        return 'properties'
+    return 'csv'
+
+
+_XML_PROLOG_RE = re.compile(r'<\?.*?\?>|<!DOCTYPE[^>]*>|<!--.*?-->', re.S)
+
+
+class _CSVRecordEnds(object):
+    '''
+    Find the ends of CSV records in data that is read in pieces
+
+    The quoting state is carried from one piece to the next, so each
+    piece is only scanned once.
+
+    '''
+
+    def __init__(self):
+        self.quoted = False
+
+    def find(self, piece):
+        '''
+        Return the index after the last record end in the piece
+
+        Parameters
+        ----------
+        piece : string
+            The next piece of the data
+
+        Returns
+        -------
+        int
+            The index after the last line end that is not in a quoted
+            field, or -1 if there is none
+
+        '''
+        end = -1
+        quoted = self.quoted
+        for match in re.finditer(r'["\n]', piece):
+            if match.group() == '"':
+                quoted = not quoted
+            elif not quoted:
+                end = match.end()
+        self.quoted = quoted
+        return end
+
+
+class _DelimitedRecordEnds(object):
+    '''
+    Find the ends of delimited records in data that is read in pieces
+
+    The end of the previous data is kept so that delimiters split
+    across pieces are found without scanning the data again.
+
+    Parameters
+    ----------
+    delimiter : string
+        The string that ends each record
+
+    '''
+
+    def __init__(self, delimiter):
+        self.delimiter = delimiter
+        self.tail = ''
+
+    def find(self, piece):
+        '''
+        Return the index after the last record end in the piece
+
+        Parameters
+        ----------
+        piece : string
+            The next piece of the data
+
+        Returns
+        -------
+        int
+            The index after the last delimiter, or -1 if there is none
+
+        '''
+        size = len(self.delimiter)
+        data = self.tail + piece
+        end = data.rfind(self.delimiter)
+        if end >= 0:
+            end += size - len(self.tail)
+            data = piece[end:]
+        self.tail = size > 1 and data[-(size - 1):] or ''
+        return end
+
+
+def iter_event_chunks(read, chunksize, format='csv', separator=None):
+    '''
+    Split event data into chunks that end on event boundaries
+
+    Data is read `chunksize` characters at a time, so at most about
+    two chunks are held in memory at once.  'csv' events are split
+    at line ends outside of quoted fields, 'properties' events at the
+    separator, and 'xml' events after each ``</event>``, with each
+    chunk wrapped in its own ``<events>`` element after removing any
+    XML declaration, DOCTYPE, or comments.  'json' data can not be
+    split and is returned as a single chunk.
+
+    Parameters
+    ----------
+    read : callable
+        Function that takes a number of characters and returns the
+        next piece of data, or an empty string at the end of the data
+    chunksize : int
+        The approximate number of characters in each chunk
+    format : string, optional
+        The format of the events: 'csv', 'xml', 'json', or 'properties'
+    separator : string, optional
+        The separator between 'properties' events
+
+    Returns
+    -------
+    generator of strings
+
+    '''
+    format = (format or 'csv').lower()
+
+    if format == 'json':
+        pieces = []
+        while True:
+            piece = read(chunksize)
+            if not piece:
+                break
+            pieces.append(piece)
+        if pieces:
+            yield ''.join(pieces)
+        return
+
+    if format == 'xml':
+        delimiter = '</event>'
+    elif format == 'properties':
+        delimiter = separator or '\n\n'
+    else:
+        delimiter = '\n'
+
+    def finish(chunk):
+        if format == 'xml':
+            chunk = _XML_PROLOG_RE.sub('', chunk)
+            chunk = re.sub(r'</?events(\s[^>]*)?>', '', chunk).strip()
+            if chunk:
+                return '<events>%s</events>' % chunk
+        return chunk
+
+    if format == 'csv':
+        record_ends = _CSVRecordEnds()
+    else:
+        record_ends = _DelimitedRecordEnds(delimiter)
+
+    pieces = []
+    while True:
+        piece = read(chunksize)
+        if not piece:
+            break
+        end = record_ends.find(piece)
+        if end < 0:
+            pieces.append(piece)
+            continue
+        pieces.append(piece[:end])
+        chunk = finish(''.join(pieces))
+        pieces = [piece[end:]]
+        if chunk.strip():
+            yield chunk
+
+    chunk = finish(''.join(pieces))
+    if chunk.strip():
+        yield chunk
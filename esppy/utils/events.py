@@ -21,20 +21,26 @@
 from __future__ import print_function, division, absolute_import, unicode_literals
 
 import base64
+import collections
 import csv
 import datetime
 import decimal
 import json
-import numpy as np
 import os
-import pandas as pd
 import re
 import six
 import sys
+import threading
+import time
 import xml.etree.ElementTree as ET
 from six.moves import urllib
 from ..base import ESPObject
 from ..config import get_option
+from ..espapi import codec
+from .lazy import lazy_import, lazy_attributes
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
 
 EPOCH = datetime.datetime(1970, 1, 1)
 
@@ -119,24 +125,515 @@ ESP2PY_MAP = {
     'array(int64)': int64_array,
 }
 
-ESP2DF_TYPEMAP = {
-    'date': datetime.datetime.now(),
-    'stamp': datetime.datetime.now(),
-    'double': np.float64(0),
-    'int64': np.int64(0),
-    'int32': np.int32(0),
-    'money': decimal.Decimal(0),
-    'blob': b'bytes',
-    'string': u'string',
-    'array(dbl)': pd.Series(dtype=np.float64),
-    'array(double)': pd.Series(dtype=np.float64),
-    'array(i32)': pd.Series(dtype=np.int32),
-    'array(int32)': pd.Series(dtype=np.int32),
-    'array(i64)': pd.Series(dtype=np.int64),
-    'array(int64)': pd.Series(dtype=np.int64),
+
+_ESP2DF_TYPEMAP = None
+
+
+def _get_esp2df_typemap():
+    ''' Return the sample value of each ESP type used to build DataFrames '''
+    global _ESP2DF_TYPEMAP
+    typemap = _ESP2DF_TYPEMAP
+    if typemap is None:
+        typemap = _ESP2DF_TYPEMAP = {
+            'date': datetime.datetime.now(),
+            'stamp': datetime.datetime.now(),
+            'double': np.float64(0),
+            'int64': np.int64(0),
+            'int32': np.int32(0),
+            'money': decimal.Decimal(0),
+            'blob': b'bytes',
+            'string': u'string',
+            'array(dbl)': pd.Series(dtype=np.float64),
+            'array(double)': pd.Series(dtype=np.float64),
+            'array(i32)': pd.Series(dtype=np.int32),
+            'array(int32)': pd.Series(dtype=np.int32),
+            'array(i64)': pd.Series(dtype=np.int64),
+            'array(int64)': pd.Series(dtype=np.int64),
+        }
+    return typemap
+
+
+# ESP2DF_TYPEMAP holds numpy and pandas values, so it is built on first access
+lazy_attributes(__name__, ESP2DF_TYPEMAP=_get_esp2df_typemap)
+
+
+def _to_numeric(values):
+    ''' Convert a column of raw values to a numeric array '''
+    return pd.to_numeric(np.asarray(values, dtype=object), errors='coerce')
+
+
+def float_column(values):
+    ''' Convert a column of raw values to an array of doubles '''
+    return np.asarray(_to_numeric(values), dtype=np.float64)
+
+
+def int32_column(values):
+    ''' Convert a column of raw values to an array of int32s '''
+    out = _to_numeric(values)
+    if out.dtype.kind == 'f' and np.isnan(out).any():
+        return out
+    return out.astype(np.int32)
+
+
+def int64_column(values):
+    ''' Convert a column of raw values to an array of int64s '''
+    out = _to_numeric(values)
+    if out.dtype.kind == 'f' and np.isnan(out).any():
+        return out
+    return out.astype(np.int64)
+
+
+def date_column(values):
+    ''' Convert a column of seconds since the epoch to datetimes '''
+    return np.asarray(pd.to_datetime(_to_numeric(values), unit='s'))
+
+
+def stamp_column(values):
+    ''' Convert a column of microseconds since the epoch to datetimes '''
+    return np.asarray(pd.to_datetime(_to_numeric(values), unit='us'))
+
+
+def object_column(func):
+    '''
+    Create a column converter from a scalar converter
+
+    Missing values are passed through as None.
+
+    '''
+    def convert(values):
+        out = np.empty(len(values), dtype=object)
+        out[:] = [x if x is None else func(x) for x in values]
+        return out
+    return convert
+
+
+def _decode_string(value):
+    return hasattr(value, 'decode') and value.decode('utf-8') or value
+
+
+ESP2COLUMN_MAP = {
+    'date': date_column,
+    'stamp': stamp_column,
+    'double': float_column,
+    'int64': int64_column,
+    'int32': int32_column,
+    'money': object_column(decimal.Decimal),
+    'blob': object_column(base64.b64decode),
+    'string': object_column(_decode_string),
+    'array(dbl)': object_column(double_array),
+    'array(double)': object_column(double_array),
+    'array(i32)': object_column(int32_array),
+    'array(int32)': object_column(int32_array),
+    'array(i64)': object_column(int64_array),
+    'array(int64)': object_column(int64_array),
+}
+
+
+OPCODE_COLUMN = '_opcode'
+
+OPCODE_MAP = {
+    'i': 'insert',
+    'u': 'update',
+    'p': 'upsert',
+    'd': 'delete',
+    'sd': 'safedelete',
 }
 
 
+def normalize_opcode(value):
+    ''' Return the full name of an event opcode '''
+    if not value:
+        return 'insert'
+    value = value.strip().lower()
+    return OPCODE_MAP.get(value, value)
+
+
+class EventDecoder(object):
+    '''
+    Event decoder compiled from a window schema
+
+    The decoder fills one buffer per schema field as events are
+    read and converts each buffer to a typed array in a single step
+    when the DataFrame is built.
+
+    Parameters
+    ----------
+    schema : Schema
+        The schema of the window the events belong to
+
+    Attributes
+    ----------
+    schema_string : string
+        The schema string the decoder was compiled from
+    columns : list-of-strings
+        The field names in schema order
+    dtypes : list-of-strings
+        The ESP data types of the fields
+    index : list-of-strings
+        The key field names
+
+    Returns
+    -------
+    :class:`EventDecoder`
+
+    '''
+
+    def __init__(self, schema):
+        self.schema_string = schema.schema_string
+        self.columns = []
+        self.dtypes = []
+        self.index = []
+        self.converters = []
+        for field in schema.fields.values():
+            self.columns.append(field.name)
+            self.dtypes.append(field.type)
+            self.converters.append(ESP2COLUMN_MAP.get(field.type, object_column(lambda x: x)))
+            if field.key:
+                self.index.append(field.name)
+        self.positions = {name: i for i, name in enumerate(self.columns)}
+
+    def new_buffers(self, nrows):
+        ''' Create empty column buffers for `nrows` events '''
+        return [[None] * nrows for _ in self.columns]
+
+    def decode_elements(self, events, opcodes=False):
+        '''
+        Decode a list of XML event elements
+
+        Parameters
+        ----------
+        events : list-of-ElementTree.Elements
+            The ``<event>`` elements to decode
+        opcodes : bool, optional
+            Should the event opcodes be included in the output?
+
+        Returns
+        -------
+        :class:`pandas.DataFrame`
+
+        '''
+        buffers = self.new_buffers(len(events))
+        present = [False] * len(self.columns)
+        positions = self.positions
+        for i, event in enumerate(events):
+            for item in event:
+                pos = positions.get(item.tag)
+                if pos is not None:
+                    buffers[pos][i] = item.text
+                    present[pos] = True
+        if opcodes:
+            opcodes = [event.attrib.get('opcode') for event in events]
+        return self.to_dataframe(buffers, present, opcodes=opcodes or None)
+
+    def decode_rows(self, rows, opcodes=None):
+        '''
+        Decode a list of field values in schema order
+
+        Parameters
+        ----------
+        rows : list-of-lists
+            The events to decode
+        opcodes : list-of-strings, optional
+            The opcode of each event to include in the output
+
+        Returns
+        -------
+        :class:`pandas.DataFrame`
+
+        '''
+        buffers = self.new_buffers(len(rows))
+        ncols = len(self.columns)
+        for i, row in enumerate(rows):
+            for pos, value in enumerate(row[:ncols]):
+                buffers[pos][i] = value
+        return self.to_dataframe(buffers, opcodes=opcodes)
+
+    def decode_records(self, records, opcodes=None):
+        '''
+        Decode a list of dictionaries keyed by field name
+
+        Parameters
+        ----------
+        records : list-of-dicts
+            The events to decode
+        opcodes : list-of-strings, optional
+            The opcode of each event to include in the output
+
+        Returns
+        -------
+        :class:`pandas.DataFrame`
+
+        '''
+        buffers = self.new_buffers(len(records))
+        positions = self.positions
+        for i, record in enumerate(records):
+            for key, value in record.items():
+                pos = positions.get(key)
+                if pos is not None:
+                    buffers[pos][i] = value
+        return self.to_dataframe(buffers, opcodes=opcodes)
+
+    def decode_columns(self, columns, opcodes=None):
+        '''
+        Decode lists of column values keyed by field name
+
+        Parameters
+        ----------
+        columns : dict-of-lists
+            The raw values of each field
+        opcodes : list-of-strings, optional
+            The opcode of each event to include in the output
+
+        Returns
+        -------
+        :class:`pandas.DataFrame`
+
+        '''
+        nrows = max([len(x) for x in columns.values()] or [0])
+        buffers = []
+        for name in self.columns:
+            values = columns.get(name)
+            buffers.append(values if values is not None else [None] * nrows)
+        return self.to_dataframe(buffers, opcodes=opcodes)
+
+    def to_dataframe(self, buffers, present=None, opcodes=None):
+        '''
+        Convert filled column buffers to a DataFrame
+
+        Parameters
+        ----------
+        buffers : list-of-lists
+            The raw column values in schema order
+        present : list-of-bools, optional
+            Flags indicating which columns were seen in the events.
+            Columns that were not seen are dropped from the output.
+        opcodes : list-of-strings, optional
+            The raw event opcodes.  If specified, the normalized opcodes
+            are added to the output in the ``_opcode`` column.
+
+        Returns
+        -------
+        :class:`pandas.DataFrame`
+
+        '''
+        data = collections.OrderedDict()
+        for i, name in enumerate(self.columns):
+            if present is not None and not present[i]:
+                continue
+            data[name] = self.converters[i](buffers[i])
+
+        if opcodes is not None:
+            data[OPCODE_COLUMN] = np.array([normalize_opcode(x) for x in opcodes],
+                                           dtype=object)
+
+        out = pd.DataFrame(data, columns=list(data.keys()))
+
+        index = [x for x in self.index if x in data]
+        if index:
+            out = out.set_index(index)
+
+        return out
+
+
+def get_decoder(schema):
+    '''
+    Return the compiled event decoder for the given schema
+
+    The decoder is stored on the schema and is recompiled only
+    if the schema fields change.
+
+    Parameters
+    ----------
+    schema : Schema
+        The schema of the window
+
+    Returns
+    -------
+    :class:`EventDecoder`
+
+    '''
+    decoder = getattr(schema, '_event_decoder', None)
+    if decoder is None or decoder.schema_string != schema.schema_string:
+        decoder = EventDecoder(schema)
+        schema._event_decoder = decoder
+    return decoder
+
+
+class SchemaCache(object):
+    '''
+    Session-scoped cache of window schemas and their event decoders
+
+    Entries are keyed by window path (``project/contquery/window``).
+    Each entry holds the :class:`Schema` retrieved from the server and
+    the :class:`EventDecoder` compiled from it.
+
+    Parameters
+    ----------
+    ttl : float, optional
+        The number of seconds an entry is valid.  By default, the
+        ``cache.schema_ttl`` option is used.
+
+    Attributes
+    ----------
+    hits : int
+        The number of lookups satisfied from the cache
+    misses : int
+        The number of lookups that required a server request
+    invalidations : int
+        The number of entries removed by :meth:`invalidate`
+
+    Returns
+    -------
+    :class:`SchemaCache`
+
+    '''
+
+    def __init__(self, ttl=None):
+        self._ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def ttl(self):
+        ''' The number of seconds an entry is valid '''
+        if self._ttl is None:
+            return get_option('cache.schema_ttl')
+        return self._ttl
+
+    @ttl.setter
+    def ttl(self, value):
+        self._ttl = value
+
+    @staticmethod
+    def _normalize(path):
+        return path.replace('.', '/').strip('/')
+
+    def get(self, path):
+        '''
+        Return the cached schema and decoder for a window
+
+        Parameters
+        ----------
+        path : string
+            The window path
+
+        Returns
+        -------
+        (:class:`Schema`, :class:`EventDecoder`)
+            If the window is in the cache
+        None
+            If the window is not in the cache or the entry has expired
+
+        '''
+        path = self._normalize(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and (time.time() - entry[2]) > self.ttl:
+                del self._entries[path]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def set(self, path, schema):
+        '''
+        Add a window schema to the cache
+
+        Parameters
+        ----------
+        path : string
+            The window path
+        schema : Schema
+            The schema of the window
+
+        Returns
+        -------
+        :class:`EventDecoder`
+
+        '''
+        decoder = get_decoder(schema)
+        if self.ttl > 0:
+            with self._lock:
+                self._entries[self._normalize(path)] = (schema, decoder, time.time())
+        return decoder
+
+    def invalidate(self, path=None):
+        '''
+        Remove entries from the cache
+
+        Parameters
+        ----------
+        path : string, optional
+            A project, continuous query, or window path.  All windows
+            at or below the path are removed.  If no path is specified,
+            the entire cache is cleared.
+
+        '''
+        with self._lock:
+            if path is None:
+                self.invalidations += len(self._entries)
+                self._entries.clear()
+                return
+            path = self._normalize(path)
+            for key in list(self._entries.keys()):
+                if key == path or key.startswith(path + '/'):
+                    del self._entries[key]
+                    self.invalidations += 1
+
+    def clear(self):
+        ''' Remove all entries and reset the counters '''
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.invalidations = 0
+
+    @property
+    def stats(self):
+        '''
+        Cache statistics
+
+        Returns
+        -------
+        dict
+
+        '''
+        total = self.hits + self.misses
+        return dict(size=len(self._entries), hits=self.hits, misses=self.misses,
+                    invalidations=self.invalidations,
+                    hit_rate=total and (self.hits / total) or 0.0)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def get_schema_cache(session):
+    '''
+    Return the schema cache for the given session
+
+    Parameters
+    ----------
+    session : requests.Session
+        The ESP session object
+
+    Returns
+    -------
+    :class:`SchemaCache`
+
+    '''
+    cache = getattr(session, 'schema_cache', None)
+    if cache is None:
+        cache = SchemaCache()
+        if session is not None:
+            session.schema_cache = cache
+    return cache
+
+
 def get_dataframe(obj):
     '''
     Get an empty DataFrame that represents the Window schema
@@ -171,7 +668,7 @@ def get_dataframe(obj):
     int32_arrays = []
     for field in schema.fields.values():
         columns.append(field.name)
-        row.append(ESP2DF_TYPEMAP[field.type])
+        row.append(_get_esp2df_typemap()[field.type])
         if field.type == 'int32':
             int32s.append(field.name)
         elif field.type in ['array(int32)', 'array(i32)']:
@@ -193,19 +690,17 @@ def get_dataframe(obj):
     return out.iloc[0:0]
 
 
-def get_schema(obj, window):
-    ''' Retrieve the schema for the specified window '''
+def _fetch_schema(obj, path):
+    ''' Retrieve the schema and decoder for a window path, using the cache '''
     try:
         get_window_class    # noqa: F821
     except:
         from ..windows import get_window_class
 
-    if isinstance(window, six.string_types):
-        path = window.replace('.', '/')
-    else:
-        if getattr(window, 'schema') and window.schema.fields:
-            return window.schema.copy(deep=True)
-        path = window.fullname.replace('.', '/')
+    cache = get_schema_cache(obj.session)
+    entry = cache.get(path)
+    if entry is not None:
+        return entry
 
     res = obj._get(urllib.parse.urljoin(obj.base_url, 'windows/%s' % path),
                    params=dict(schema='true'))
@@ -215,10 +710,34 @@ def get_schema(obj, window):
             wcls = get_window_class(item.tag)
         except KeyError:
             raise TypeError('Unknown window type: %s' % item.tag)
-        return wcls.from_xml(item, session=obj.session).schema
+        schema = wcls.from_xml(item, session=obj.session).schema
+        return schema, cache.set(path, schema)
+
+    return None, None
+
+
+def get_schema(obj, window):
+    '''
+    Retrieve the schema for the specified window
+
+    Schemas retrieved from the server are stored in the session's
+    :class:`SchemaCache`.
+
+    '''
+    if isinstance(window, six.string_types):
+        path = window.replace('.', '/')
+    else:
+        if getattr(window, 'schema') and window.schema.fields:
+            return window.schema.copy(deep=True)
+        path = window.fullname.replace('.', '/')
+
+    schema = _fetch_schema(obj, path)[0]
+    if schema is not None:
+        return schema.copy(deep=True)
 
 
-def get_events(obj, data, format='xml', separator=None, single=False, server_info=None):
+def get_events(obj, data, format='xml', separator=None, single=False,
+               server_info=None, opcodes=False):
     '''
     Convert events to DataFrames
 
@@ -228,10 +747,11 @@ def get_events(obj, data, format='xml', separator=None, single=False, server_inf
         The calling object.  If this is a Schema, that schema is used
         for the events.  If it is a Window, the schema for tha window
         is used for the events.
-    data : xml-string or ElementTree.Element
+    data : xml-string or ElementTree.Element or bytes
         The events to process
     format : string, optional
-        The format of the events
+        The format of the events: 'xml', 'csv', 'json', 'properties',
+        or 'ubjson' (binary)
     separator : string, optional
         The separator between each 'properties' events
     single : bool, optional
@@ -239,6 +759,8 @@ def get_events(obj, data, format='xml', separator=None, single=False, server_inf
         If there is more than one DataFrame, raise an exception.
     server_info : dict, optional
         Information about the server, for version-specific behaviors
+    opcodes : bool, optional
+        Should the event opcodes be included in the ``_opcode`` column?
 
     Returns
     -------
@@ -260,14 +782,17 @@ def get_events(obj, data, format='xml', separator=None, single=False, server_inf
         sys.stderr.write('%s\n' % data)
 
     if format.lower() == 'csv':
-        return get_csv_events(obj, data)
+        return get_csv_events(obj, data, opcodes=opcodes)
 
     if format.lower() == 'json':
-        return get_json_events(obj, data)
+        return get_json_events(obj, data, opcodes=opcodes)
+
+    if format.lower() == 'ubjson':
+        return get_ubjson_events(obj, data, opcodes=opcodes)
 
     if format.lower() == 'properties':
         try:
-            return get_properties_events(obj, data, separator)
+            return get_properties_events(obj, data, separator, opcodes=opcodes)
         except:
             import traceback
             traceback.print_exc()
@@ -276,60 +801,25 @@ def get_events(obj, data, format='xml', separator=None, single=False, server_inf
     if isinstance(data, six.string_types):
         data = ET.fromstring(data)
 
-    windows = dict()
-    from . import xml
+    windows = collections.OrderedDict()
     for event in data.findall('./event'):
+        windows.setdefault(event.attrib.get('window', ''), []).append(event)
 
-        wname = event.attrib.get('window', '')
-
-        if wname not in windows:
-
-            current = windows[wname] = dict(transformers={}, columns=[],
-                                            index=[], events=[], dtypes=[])
-
-            if isinstance(obj, Schema):
-                schema = obj
-            elif isinstance(obj, BaseWindow) and obj.fullname == wname.replace('/', '.') and obj.schema.fields:
-                schema = obj.schema
-            elif not wname:
-                if isinstance(obj, BaseWindow):
-                    schema = get_schema(obj, obj.fullname)
-                else:
-                    raise ValueError('Could not determine window schema')
+    out = dict()
+    for wname, events in windows.items():
+        if isinstance(obj, Schema):
+            decoder = get_decoder(obj)
+        elif isinstance(obj, BaseWindow) and obj.fullname == wname.replace('/', '.') and obj.schema.fields:
+            decoder = get_decoder(obj.schema)
+        elif not wname:
+            if isinstance(obj, BaseWindow):
+                decoder = _fetch_schema(obj, obj.fullname.replace('.', '/'))[1]
             else:
-                schema = get_schema(obj, wname)
-
-            for field in schema.fields.values():
-                current['transformers'][field.name] = ESP2PY_MAP.get(field.type,
-                                                                     lambda x: x)
-                current['columns'].append(field.name)
-                current['dtypes'].append(field.type)
-                if field.key:
-                    current['index'].append(field.name)
-
+                raise ValueError('Could not determine window schema')
         else:
-            current = windows[wname]
+            decoder = _fetch_schema(obj, wname)[1]
 
-        row = dict()
-        for item in event.findall('./*'):
-            row[item.tag] = current['transformers'].get(item.tag, lambda x: x)(item.text)
-        current['events'].append(row)
-
-    out = dict()
-    for wname, window in windows.items():
-        orig_wname = wname
-        wname = wname.replace('/', '.')
-        out[wname] = pd.DataFrame(window['events'])
-        columns = [x for x in window['columns'] if x in out[wname].columns]
-        out[wname] = out[wname][columns]
-        for colname, dtype in zip(windows[orig_wname]['columns'],
-                                  windows[orig_wname]['dtypes']):
-            if dtype == 'int32':
-                out[wname][colname] = out[wname][colname].astype('int32', copy=False)
-        if window['index']:
-            index = [x for x in window['index'] if x in out[wname].columns]
-            if index:
-                out[wname] = out[wname].set_index(index)
+        out[wname.replace('/', '.')] = decoder.decode_elements(events, opcodes=opcodes)
 
     if single:
         if len(out) == 1:
@@ -341,7 +831,7 @@ def get_events(obj, data, format='xml', separator=None, single=False, server_inf
     return out
 
 
-def get_csv_events(obj, data):
+def get_csv_events(obj, data, opcodes=False):
     '''
     Convert CSV events to DataFrames
 
@@ -353,6 +843,8 @@ def get_csv_events(obj, data):
         is used for the events.
     data : csv-string
         The events to process
+    opcodes : bool, optional
+        Should the event opcodes be included in the ``_opcode`` column?
 
     Returns
     -------
@@ -371,37 +863,17 @@ def get_csv_events(obj, data):
         if obj.schema.fields:
             schema = obj.schema
         else:
-            schema = get_schema(obj, obj)
+            schema = _fetch_schema(obj, obj.fullname.replace('.', '/'))[0]
     else:
         raise ValueError('Can not obtain window schema from given object')
 
-    transformers = []
-    columns = []
-    index = []
-    dtypes = []
-    for fname, field in schema.fields.items():
-        transformers.append(ESP2PY_MAP.get(field.type, lambda x: x))
-        columns.append(fname)
-        dtypes.append(field.type)
-        if field.key:
-            index.append(fname)
-
-    rows = []
-    for row in csv.reader(data.rstrip().split('\n')):
-        row = list(row)[2:]
-        for i, item in enumerate(row):
-            row[i] = transformers[i](item)
-        rows.append(row)
-
-    out = pd.DataFrame(data=rows, columns=columns)
-    out = out.set_index(index)
-    for colname, dtype in zip(columns, dtypes):
-        if dtype == 'int32':
-            out[colname] = out[colname].astype('int32', copy=False)
-    return out
+    rows = [row for row in csv.reader(data.rstrip().split('\n')) if row]
 
+    return get_decoder(schema).decode_rows([row[2:] for row in rows],
+                                           opcodes=opcodes and [row[0] for row in rows] or None)
 
-def get_json_events(obj, data):
+
+def get_json_events(obj, data, opcodes=False):
     '''
     Convert JSON events to DataFrames
 
@@ -413,6 +885,8 @@ def get_json_events(obj, data):
         is used for the events.
     data : json-string
         The events to process
+    opcodes : bool, optional
+        Should the event opcodes be included in the ``_opcode`` column?
 
     Returns
     -------
@@ -431,38 +905,80 @@ def get_json_events(obj, data):
         if obj.schema.fields:
             schema = obj.schema
         else:
-            schema = get_schema(obj, obj)
+            schema = _fetch_schema(obj, obj.fullname.replace('.', '/'))[0]
     else:
         raise ValueError('Can not obtain window schema from given object')
 
-    transformers = {}
-    columns = []
-    index = []
-    dtypes = []
-    for fname, field in schema.fields.items():
-        transformers[fname] = ESP2PY_MAP.get(field.type, lambda x: x)
-        columns.append(fname)
-        dtypes.append(field.type)
-        if field.key:
-            index.append(fname)
-
-    rows = []
-    for event in json.loads(data)['events']:
-        event = event['event']
-        row = []
-        for col in columns:
-            row.append(transformers[col](event[col]))
-        rows.append(row)
-
-    out = pd.DataFrame(data=rows, columns=columns)
-    out = out.set_index(index)
-    for colname, dtype in zip(columns, dtypes):
-        if dtype == 'int32':
-            out[colname] = out[colname].astype('int32', copy=False)
-    return out
+    records = [event['event'] for event in json.loads(data)['events']]
 
+    if opcodes:
+        opcodes = [record.get('opcode') for record in records]
 
-def get_properties_events(obj, data, separator=None):
+    return get_decoder(schema).decode_records(records, opcodes=opcodes or None)
+
+
+def get_ubjson_events(obj, data, opcodes=False):
+    '''
+    Convert binary (ubjson) events to DataFrames
+
+    Parameters
+    ----------
+    obj : ESPObject
+        The calling object.  If this is a Schema, that schema is used
+        for the events.  If it is a Window, the schema for tha window
+        is used for the events.
+    data : bytes or dict
+        The encoded events to process, or the decoded message
+    opcodes : bool, optional
+        Should the event opcodes be included in the ``_opcode`` column?
+
+    Returns
+    -------
+    :class:`pandas.DataFrame`
+
+    '''
+    try:
+        BaseWindow, Schema    # noqa: F821
+    except:
+        from ..schema import Schema
+        from ..windows import BaseWindow
+
+    if isinstance(obj, Schema):
+        schema = obj
+    elif isinstance(obj, BaseWindow):
+        if obj.schema.fields:
+            schema = obj.schema
+        else:
+            schema = _fetch_schema(obj, obj.fullname.replace('.', '/'))[0]
+    else:
+        raise ValueError('Can not obtain window schema from given object')
+
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = codec.JsonDecoder(data, columns=True).data
+
+    # Events are either a list or an object with an 'entries' list,
+    # which the decoder returns as columns
+    events = data.get('events', []) if isinstance(data, dict) else data
+    if isinstance(events, dict):
+        events = events.get('entries', [])
+
+    if isinstance(events, dict):
+        codes = events.get('@opcode', events.get('opcode'))
+        if opcodes and codes is None:
+            codes = [None] * max([len(x) for x in events.values()] or [0])
+        return get_decoder(schema).decode_columns(events, opcodes=opcodes and codes or None)
+
+    records = []
+    codes = []
+    for event in events or []:
+        event = event.get('event', event)
+        records.append(event)
+        codes.append(event.get('@opcode', event.get('opcode')))
+
+    return get_decoder(schema).decode_records(records, opcodes=opcodes and codes or None)
+
+
+def get_properties_events(obj, data, separator=None, opcodes=False):
     '''
     Convert properties events to DataFrames
 
@@ -474,6 +990,8 @@ def get_properties_events(obj, data, separator=None):
         is used for the events.
     data : json-string
         The events to process
+    opcodes : bool, optional
+        Should the event opcodes be included in the ``_opcode`` column?
 
     Returns
     -------
@@ -495,29 +1013,22 @@ def get_properties_events(obj, data, separator=None):
         if obj.schema.fields:
             schema = obj.schema
         else:
-            schema = get_schema(obj, obj)
+            schema = _fetch_schema(obj, obj.fullname.replace('.', '/'))[0]
     else:
         raise ValueError('Can not obtain window schema from given object: %s' % obj)
 
-    transformers = {}
-    columns = []
-    index = []
-    for fname, field in schema.fields.items():
-        transformers[fname] = ESP2PY_MAP.get(field.type, lambda x: x)
-        columns.append(fname)
-        if field.key:
-            index.append(fname)
-
-    rows = []
+    records = []
+    codes = []
     for event in [x for x in data.split(separator) if x.strip()]:
-        row = []
+        record = {}
+        opcode = None
         for i, col in enumerate(x for x in event.split('\n') if x.strip()):
             if i == 0 and col.startswith('opcode='):
+                opcode = col.split('=', 1)[1]
                 continue
             col, value = col.split('=', 1)
-            row.append(transformers[col](value))
-        rows.append(row)
+            record[col] = value
+        records.append(record)
+        codes.append(opcode)
 
-    out = pd.DataFrame(data=rows, columns=columns)
-    out = out.set_index(index)
-    return out
+    return get_decoder(schema).decode_records(records, opcodes=opcodes and codes or None)
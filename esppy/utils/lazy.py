@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+''' Lazy Module Imports '''
+
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import sys
+import types
+
+
+class LazyModule(types.ModuleType):
+    '''
+    Module that is imported on first attribute access
+
+    Once the module is imported, its attributes are copied to the
+    proxy so that later lookups do not go through :meth:`__getattr__`.
+
+    Parameters
+    ----------
+    name : string
+        The name of the module
+
+    Returns
+    -------
+    :class:`LazyModule`
+
+    '''
+
+    def __getattr__(self, name):
+        # Imported with __import__ so that the import is attributed to
+        # the module in ``python -X importtime`` reports
+        __import__(self.__name__)
+        module = sys.modules[self.__name__]
+        self.__dict__.update(module.__dict__)
+        return getattr(module, name)
+
+    def __repr__(self):
+        return '<lazy module %s>' % repr(self.__name__)
+
+
+def lazy_import(name):
+    '''
+    Return a module that is imported on first use
+
+    Parameters
+    ----------
+    name : string
+        The name of the module
+
+    Returns
+    -------
+    module
+        If the module is already imported
+    :class:`LazyModule`
+        Otherwise
+
+    '''
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return LazyModule(str(name))
+
+
+def lazy_attributes(name, **getters):
+    '''
+    Add attributes to a module that are computed on each access
+
+    This keeps module constants that depend on heavy imports
+    available without computing them when the module is imported.
+
+    Parameters
+    ----------
+    name : string
+        The name of the module
+    **getters : keyword-arguments
+        Functions that return the value of each attribute
+
+    '''
+    module = sys.modules[name]
+    props = dict((key, property(lambda self, func=func: func()))
+                 for key, func in getters.items())
+    cls = type(str('LazyAttributeModule'), (types.ModuleType,), props)
+    try:
+        module.__class__ = cls
+    except TypeError:
+        # Module classes can not be changed before Python 3.5, so the
+        # module is replaced by an instance of the new class instead
+        new = cls(str(name), module.__doc__)
+        new.__dict__.update(module.__dict__)
+        sys.modules[name] = new
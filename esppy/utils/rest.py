@@ -25,6 +25,9 @@ import re
 import requests
 import logging
 import sys
+import threading
+import time
+import concurrent.futures
 import xml.etree.ElementTree as ET
 from six.moves import urllib
 from ..config import get_option
@@ -118,6 +121,409 @@ def get_params(**kwargs):
     return out
 
 
+def configure_session(session, pool_size=None, retries=None, backoff_factor=None):
+    '''
+    Mount a pooled HTTP adapter with retries on a session
+
+    Connections are kept alive and reused by the pool.  Dropped
+    connections and idempotent requests answered with 502, 503, or
+    504 are retried with exponential backoff.
+
+    Parameters
+    ----------
+    session : requests.Session
+        The session to configure
+    pool_size : int, optional
+        The maximum number of connections kept per host.  By default,
+        the ``http.pool_size`` option is used.
+    retries : int, optional
+        The number of retries.  By default, the ``http.retries`` option
+        is used.
+    backoff_factor : float, optional
+        The backoff factor of retries.  By default, the
+        ``http.backoff_factor`` option is used.
+
+    Returns
+    -------
+    requests.Session
+
+    '''
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    if pool_size is None:
+        pool_size = get_option('http.pool_size')
+    if retries is None:
+        retries = get_option('http.retries')
+    if backoff_factor is None:
+        backoff_factor = get_option('http.backoff_factor')
+
+    # Refused connections are only retried once so that an unavailable
+    # server is reported quickly.  Error responses are not raised so that
+    # the server message can still be reported by RESTHelpers._error_check.
+    retry = Retry(total=retries, connect=min(retries, 1),
+                  backoff_factor=backoff_factor,
+                  status_forcelist=(502, 503, 504), raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size,
+                          max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class CachedResponse(object):
+    '''
+    Response stored in a :class:`ResponseCache`
+
+    Parameters
+    ----------
+    family : string
+        The endpoint family of the request
+    content : string
+        The body of the response
+    etag : string, optional
+        The ``ETag`` header of the response
+    last_modified : string, optional
+        The ``Last-Modified`` header of the response
+
+    Returns
+    -------
+    :class:`CachedResponse`
+
+    '''
+
+    def __init__(self, family, content, etag=None, last_modified=None):
+        self.family = family
+        self.content = content
+        self.etag = etag
+        self.last_modified = last_modified
+        self.timestamp = time.time()
+        self._element = None
+
+    @property
+    def element(self):
+        '''
+        The parsed response
+
+        The element is parsed once and shared by all cache hits, so it
+        must not be modified.
+
+        '''
+        if self._element is None:
+            self._element = ET.fromstring(self.content)
+        return self._element
+
+
+class ResponseCache(object):
+    '''
+    Session-scoped cache of REST GET responses
+
+    Responses are keyed by URL, including the URL parameters.  Only
+    the metadata endpoint families are cached, each with its own
+    time-to-live:
+
+        * server : server information and engine metadata
+        * algorithms : algorithm definitions
+        * projects : project, window, MAS module, and connector information
+
+    Expired entries that carry an ``ETag`` or ``Last-Modified`` header
+    are revalidated with a conditional request rather than fetched again.
+    Any POST, PUT, or DELETE request of the session invalidates the
+    ``projects`` family.
+
+    Parameters
+    ----------
+    enabled : bool, optional
+        Should responses be cached?  By default, the ``cache.rest``
+        option is used.
+
+    Attributes
+    ----------
+    hits : int
+        The number of requests satisfied from the cache
+    misses : int
+        The number of requests sent to the server
+    revalidations : int
+        The number of expired entries the server reported as unchanged
+    invalidations : int
+        The number of entries removed by :meth:`invalidate`
+
+    Returns
+    -------
+    :class:`ResponseCache`
+
+    '''
+
+    FAMILIES = {
+        'server': 'server',
+        'engineMetadata': 'server',
+        'algorithms': 'algorithms',
+        'projectXml': 'projects',
+        'projectMetadata': 'projects',
+        'runningProjects': 'projects',
+        'stoppedProjects': 'projects',
+        'windows': 'projects',
+        'windowXml': 'projects',
+        'masModules': 'projects',
+        'connectorInfo': 'projects',
+    }
+
+    def __init__(self, enabled=None):
+        self._enabled = enabled
+        self._ttls = {}
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        ''' Should responses be cached? '''
+        if self._enabled is None:
+            return get_option('cache.rest')
+        return self._enabled
+
+    @enabled.setter
+    def enabled(self, value):
+        self._enabled = value
+
+    def get_ttl(self, family):
+        '''
+        Return the number of seconds the entries of a family are valid
+
+        Parameters
+        ----------
+        family : string
+            The endpoint family: 'server', 'algorithms', or 'projects'
+
+        Returns
+        -------
+        float
+
+        '''
+        if family in self._ttls:
+            return self._ttls[family]
+        return get_option('cache.rest_%s_ttl' % family)
+
+    def set_ttl(self, family, ttl):
+        '''
+        Set the number of seconds the entries of a family are valid
+
+        Parameters
+        ----------
+        family : string
+            The endpoint family: 'server', 'algorithms', or 'projects'
+        ttl : float
+            The number of seconds.  A value of zero disables caching
+            of the family.  None reverts to the option value.
+
+        '''
+        if family not in set(self.FAMILIES.values()):
+            raise ValueError('%s is not a cached endpoint family' % family)
+        if ttl is None:
+            self._ttls.pop(family, None)
+        else:
+            self._ttls[family] = ttl
+
+    def get_family(self, url, base_url):
+        '''
+        Return the endpoint family of a URL
+
+        Parameters
+        ----------
+        url : string
+            The request URL
+        base_url : string
+            The base server URL
+
+        Returns
+        -------
+        string
+            If responses of the URL are cached
+        None
+            If the cache is disabled or the URL is not cached
+
+        '''
+        if not self.enabled or not base_url or not url.startswith(base_url):
+            return None
+        name = re.split(r'[/?]', url[len(base_url):].lstrip('/'), 1)[0]
+        family = self.FAMILIES.get(name)
+        if family is None or self.get_ttl(family) <= 0:
+            return None
+        return family
+
+    def get(self, url):
+        '''
+        Return a valid cached response
+
+        Parameters
+        ----------
+        url : string
+            The request URL
+
+        Returns
+        -------
+        :class:`CachedResponse`
+            If the URL is in the cache and the entry has not expired
+        None
+            Otherwise
+
+        '''
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None:
+                if (time.time() - entry.timestamp) <= self.get_ttl(entry.family):
+                    self.hits += 1
+                    return entry
+                if entry.etag is None and entry.last_modified is None:
+                    del self._entries[url]
+            self.misses += 1
+            return None
+
+    def get_validators(self, url):
+        '''
+        Return the headers of a conditional request for an expired entry
+
+        Parameters
+        ----------
+        url : string
+            The request URL
+
+        Returns
+        -------
+        dict
+
+        '''
+        headers = {}
+        entry = self._entries.get(url)
+        if entry is not None:
+            if entry.etag is not None:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified is not None:
+                headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def revalidate(self, url):
+        '''
+        Renew an entry the server reported as not modified
+
+        Parameters
+        ----------
+        url : string
+            The request URL
+
+        Returns
+        -------
+        :class:`CachedResponse`
+            If the URL is still in the cache
+        None
+            If the entry was invalidated during the request
+
+        '''
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None:
+                entry.timestamp = time.time()
+                self.revalidations += 1
+            return entry
+
+    def set(self, url, family, content, headers=None):
+        '''
+        Add a response to the cache
+
+        Parameters
+        ----------
+        url : string
+            The request URL
+        family : string
+            The endpoint family of the URL
+        content : string
+            The body of the response
+        headers : dict, optional
+            The response headers
+
+        Returns
+        -------
+        :class:`CachedResponse`
+
+        '''
+        headers = headers or {}
+        entry = CachedResponse(family, content, etag=headers.get('ETag'),
+                               last_modified=headers.get('Last-Modified'))
+        with self._lock:
+            self._entries[url] = entry
+        return entry
+
+    def invalidate(self, family=None):
+        '''
+        Remove entries from the cache
+
+        Parameters
+        ----------
+        family : string, optional
+            The endpoint family to remove.  If no family is specified,
+            the entire cache is cleared.
+
+        '''
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if family is None or entry.family == family:
+                    del self._entries[key]
+                    self.invalidations += 1
+
+    def clear(self):
+        ''' Remove all entries and reset the counters '''
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.revalidations = 0
+            self.invalidations = 0
+
+    @property
+    def stats(self):
+        '''
+        Cache statistics
+
+        Returns
+        -------
+        dict
+
+        '''
+        total = self.hits + self.misses
+        return dict(size=len(self._entries), hits=self.hits, misses=self.misses,
+                    revalidations=self.revalidations,
+                    invalidations=self.invalidations,
+                    hit_rate=total and (self.hits / total) or 0.0)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def get_response_cache(session):
+    '''
+    Return the REST response cache for the given session
+
+    Parameters
+    ----------
+    session : requests.Session
+        The ESP session object
+
+    Returns
+    -------
+    :class:`ResponseCache`
+
+    '''
+    cache = getattr(session, 'response_cache', None)
+    if cache is None:
+        cache = ResponseCache()
+        if session is not None:
+            session.response_cache = cache
+    return cache
+
+
 class RESTHelpers(object):
     '''
     Helper methods for running REST requests against an ESP server
@@ -227,23 +633,94 @@ class RESTHelpers(object):
 
         url, kwargs = self._insert_params(url, **kwargs)
 
+        # Only plain requests of the metadata endpoints are cached
+        cache = get_response_cache(self.session)
+        family = None
+        if not kwargs:
+            family = cache.get_family(url, getattr(self.session, 'base_url', None))
+
+        if family is not None:
+            entry = cache.get(url)
+            if entry is not None:
+                return entry.content if raw else entry.element
+            headers = cache.get_validators(url)
+            if headers:
+                kwargs['headers'] = headers
+
         if get_option('debug.requests'):
             sys.stderr.write('GET %s\n' % url)
 
         if get_option('debug.request_bodies') and kwargs.get('data'):
             sys.stderr.write('%s\n' % kwargs['data'])
 
-        content = self._error_check(self.session.get(url,
-                                                     **kwargs)).content.decode('utf-8')
+        resp = self.session.get(url, **kwargs)
+
+        if family is not None and resp.status_code == 304:
+            entry = cache.revalidate(url)
+            if entry is not None:
+                return entry.content if raw else entry.element
+            kwargs.pop('headers', None)
+            resp = self.session.get(url, **kwargs)
+
+        content = self._error_check(resp).content.decode('utf-8')
 
         if get_option('debug.responses'):
             sys.stderr.write('%s\n' % content)
 
+        if family is not None:
+            entry = cache.set(url, family, content, resp.headers)
+            return content if raw else entry.element
+
         if raw:
             return content
 
         return ET.fromstring(content)
 
+    def _bulk(self, func, items, max_workers=None):
+        '''
+        Call a function for each item concurrently
+
+        The calls share the connection pool of the session.  All calls
+        are completed before the first exception, if any, is raised.
+
+        Parameters
+        ----------
+        func : callable
+            The function to call with each item, typically issuing
+            one REST request
+        items : iterable
+            The items to pass to `func`
+        max_workers : int, optional
+            The maximum number of concurrent calls.  By default, the
+            ``http.max_workers`` option is used.
+
+        Returns
+        -------
+        list
+            The results of the calls in the order of `items`
+
+        '''
+        items = list(items)
+
+        if max_workers is None:
+            max_workers = get_option('http.max_workers')
+        max_workers = min(max_workers, len(items))
+
+        if max_workers <= 1:
+            return [func(item) for item in items]
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = [pool.submit(func, item) for item in items]
+            concurrent.futures.wait(futures)
+
+        return [future.result() for future in futures]
+
+    def _invalidate_cache(self):
+        # Requests that change the server may change any project
+        cache = getattr(self.session, 'response_cache', None)
+        if cache is not None:
+            cache.invalidate('projects')
+
     def _post(self, path=None, **kwargs):
         '''
         POST the specified path
@@ -274,7 +751,9 @@ class RESTHelpers(object):
         if get_option('debug.requests'):
             sys.stderr.write('POST %s\n' % url)
 
-        content = self._error_check(self.session.post(url, **kwargs)).content.decode('utf-8')
+        resp = self.session.post(url, **kwargs)
+        self._invalidate_cache()
+        content = self._error_check(resp).content.decode('utf-8')
 
         if get_option('debug.responses'):
             sys.stderr.write('%s\n' % content)
@@ -311,7 +790,9 @@ class RESTHelpers(object):
         if get_option('debug.requests'):
             sys.stderr.write('PUT %s\n' % url)
 
-        content = self._error_check(self.session.put(url, **kwargs)).content.decode('utf-8')
+        resp = self.session.put(url, **kwargs)
+        self._invalidate_cache()
+        content = self._error_check(resp).content.decode('utf-8')
 
         if get_option('debug.responses'):
             sys.stderr.write('%s\n' % content)
@@ -348,7 +829,9 @@ class RESTHelpers(object):
         if get_option('debug.requests'):
             sys.stderr.write('DELETE %s' % url)
 
-        content = self._error_check(self.session.delete(url, **kwargs)).content.decode('utf-8')
+        resp = self.session.delete(url, **kwargs)
+        self._invalidate_cache()
+        content = self._error_check(resp).content.decode('utf-8')
 
         if get_option('debug.responses'):
             sys.stderr.write('%s\n' % content)
@@ -28,6 +28,9 @@ import xml.etree.ElementTree as ET
 from .keyword import keywordify
 from ..base import ESPObject
 
+# Default size of the chunks generated by iter_xml
+CHUNK_SIZE = 64 * 1024
+
 
 def _cast_attrs(attrs):
     out = {}
@@ -253,6 +256,156 @@ def to_xml(elem, encoding=None, pretty=False):
     return ET.tostring(elem, encoding=encoding)
 
 
+def build_element(events):
+    '''
+    Build an element tree from serialization events
+
+    Parameters
+    ----------
+    events : iterable of (string, ElementTree.Element) tuples
+        A 'start' event opens an element that contains all of the
+        following elements up to the matching 'end' event.  An
+        'element' event adds a complete element.
+
+    Returns
+    -------
+    :class:`ElementTree.Element`
+
+    '''
+    root = None
+    stack = []
+    for event, elem in events:
+        if event == 'end':
+            stack.pop()
+            continue
+        if stack:
+            stack[-1].append(elem)
+        elif root is None:
+            root = elem
+        if event == 'start':
+            stack.append(elem)
+    return root
+
+
+def iter_xml(events, pretty=False, encoding=None, chunk_size=CHUNK_SIZE):
+    '''
+    Serialize events to XML incrementally
+
+    Only the element of the current event is held in memory, so large
+    documents can be written to a file or a socket without building
+    the complete tree.  The output is the same as :func:`to_xml` of the
+    tree built by :func:`build_element`.
+
+    Parameters
+    ----------
+    events : iterable of (string, ElementTree.Element) tuples
+        The serialization events.  See :func:`build_element`.
+    pretty : bool, optional
+        Should the XML include whitespace for readability?
+    encoding : string, optional
+        The output encoding.  By default, strings are generated.
+    chunk_size : int, optional
+        The minimum number of characters in each chunk
+
+    Returns
+    -------
+    generator of strings or bytes
+
+    '''
+    chunks = []
+    size = 0
+
+    # Open elements as [tag, has-children] pairs
+    stack = []
+
+    # Start tag of an open element that has no children yet
+    pending = None
+
+    for event, elem in events:
+        out = []
+        has_children = False
+        if event == 'end':
+            tag, has_children = stack.pop()
+            if pending is not None:
+                out.append(pending)
+                pending = None
+            else:
+                if pretty:
+                    out.append('\n' + '  ' * len(stack))
+                out.append('</%s>' % tag)
+        else:
+            if pending is not None:
+                # Empty elements are serialized as '<tag attr="value" />'
+                out.append(pending[:-3] + '>')
+                pending = None
+            if stack:
+                stack[-1][1] = True
+                if pretty:
+                    out.append('\n' + '  ' * len(stack))
+            if event == 'start':
+                pending = ET.tostring(elem, encoding='unicode')
+                stack.append([elem.tag, False])
+            else:
+                if pretty:
+                    xml_indent(elem, len(stack))
+                    elem.tail = None
+                has_children = len(elem) > 0
+                out.append(ET.tostring(elem, encoding='unicode'))
+
+        # xml_indent ends a root element that has children with a newline
+        if pretty and not stack and has_children:
+            out.append('\n')
+
+        out = ''.join(out)
+        chunks.append(out)
+        size += len(out)
+        if size >= chunk_size:
+            out = ''.join(chunks)
+            yield out if encoding is None else out.encode(encoding, 'xmlcharrefreplace')
+            chunks = []
+            size = 0
+
+    if chunks:
+        out = ''.join(chunks)
+        yield out if encoding is None else out.encode(encoding, 'xmlcharrefreplace')
+
+
+class XMLStream(object):
+    '''
+    Re-iterable XML request body
+
+    The XML is serialized while the request is sent, using chunked
+    transfer encoding.  Each iteration serializes the document again,
+    so a request that is retried sends the complete document.
+
+    Parameters
+    ----------
+    events : callable
+        Function that returns the serialization events
+    pretty : bool, optional
+        Should the XML include whitespace for readability?
+    encoding : string, optional
+        The output encoding
+    chunk_size : int, optional
+        The minimum number of characters in each chunk
+
+    Returns
+    -------
+    :class:`XMLStream`
+
+    '''
+
+    def __init__(self, events, pretty=False, encoding='utf-8', chunk_size=CHUNK_SIZE):
+        self.events = events
+        self.pretty = pretty
+        self.encoding = encoding
+        self.chunk_size = chunk_size
+
+    def __iter__(self):
+        return iter_xml(self.events(), pretty=self.pretty, encoding=self.encoding,
+                        chunk_size=self.chunk_size)
+
+
 def get_attrs(obj, extra=[], exclude=[]):
     '''
     Retrieve XML attributes from object
@@ -27,9 +27,9 @@ import csv
 import datetime
 import functools
 import inspect
+import io
 import itertools
 import os
-import pandas as pd
 import re
 import requests
 import six
@@ -47,7 +47,7 @@ from .publisher import Publisher
 from .utils import listify, get_args, ensure_element, connectors_to_end
 from .. import transformers
 from ..base import ESPObject, attribute
-from ..config import get_option, ESP_ROOT, CONCAT_OPTIONS
+from ..config import get_option, ESP_ROOT
 from ..exceptions import ESPError
 from ..plotting import StreamingChart, StreamingImages, split_chart_params
 from ..schema import Schema
@@ -55,8 +55,13 @@ from ..utils.keyword import dekeywordify
 from ..utils import xml
 from ..utils.notebook import scale_svg
 from ..utils.rest import get_params
-from ..utils.data import get_project_data, gen_name, get_server_info
-from ..utils.events import get_events, get_dataframe, get_schema
+from ..utils.buffers import ColumnBuffer, KeyedBuffer
+from ..utils.data import (get_project_data, gen_name, get_server_info,
+                          guess_event_format, iter_event_chunks)
+from ..utils.events import get_events, get_dataframe, get_schema, OPCODE_COLUMN
+from ..utils.lazy import lazy_import
+
+pd = lazy_import('pandas')
 
 INDEX_TYPES = {
     'rbtree': 'pi_RBTREE',
@@ -174,6 +179,30 @@ def param_iter(params):
                 yield copy.copy(value)
 
 
+def _align_opcodes(opcodes, event):
+    '''
+    Return the opcodes of the rows of a transformed event DataFrame
+
+    Parameters
+    ----------
+    opcodes : pandas.Series
+        The opcodes of the received events, indexed like the events
+    event : pandas.DataFrame
+        The events after the event transformers
+
+    Returns
+    -------
+    list of strings or None
+        None if the rows can not be matched to the received events
+
+    '''
+    if opcodes.index.is_unique and event.index.isin(opcodes.index).all():
+        return opcodes.loc[event.index].tolist()
+    if len(opcodes) == len(event):
+        return opcodes.tolist()
+    return None
+
+
 class Target(object):
     '''
     Window target
@@ -285,6 +314,10 @@ class BaseWindow(ESPObject):
     pubsub = attribute('pubsub', dtype='bool')
 
     _all_windows = []
+    _all_window_ids = set()
+
+    _data = None
+    _data_buffer = None
 
     def __init__(self, name=None, **kwargs):
         schema = kwargs.pop('schema', None)
@@ -315,7 +348,10 @@ class BaseWindow(ESPObject):
                 item.__init__(self)
 
     def _register_to_all_windows(self):
-        if self not in type(self)._all_windows:
+        # Windows compare by identity, so the ids are enough to check
+        # membership without scanning the list
+        if id(self) not in type(self)._all_window_ids:
+            type(self)._all_window_ids.add(id(self))
             type(self)._all_windows.append(self)
 
     @classmethod
@@ -428,6 +464,33 @@ class BaseWindow(ESPObject):
 
         return out
 
+    @property
+    def data(self):
+        '''
+        The cached rows of event data
+
+        While the window is subscribed, the rows are held in a
+        :class:`ColumnBuffer` (or a :class:`KeyedBuffer` in 'updating'
+        mode) and the DataFrame is built when this attribute is read.
+
+        Returns
+        -------
+        :class:`pandas.DataFrame`
+
+        '''
+        if self._data_buffer is not None:
+            return self._data_buffer.to_frame()
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        if self._data_buffer is not None:
+            if value is None:
+                self._data_buffer = None
+            else:
+                self._data_buffer.reset(value)
+        self._data = value
+
     @property
     def path(self):
         return (self.project + "/" + self.contquery + "/" + self.name)
@@ -579,7 +642,8 @@ class BaseWindow(ESPObject):
                           sort=None, format='xml', separator=None,
                           interval=None, schema=False,
                           on_event=None, on_message=None, on_error=None,
-                          on_close=None, on_open=None, precision=6):
+                          on_close=None, on_open=None, precision=6,
+                          opcodes=False, keep_state=None, shared=None):
         '''
         Create a new websocket subscriber for the window
 
@@ -594,7 +658,8 @@ class BaseWindow(ESPObject):
         sort : string, optional
             Sort order for the events (updating mode only)
         format : string, optional
-            The format of the received data: 'xml', 'json', 'csv', 'properties'
+            The format of the received data: 'xml', 'json', 'csv', 'properties',
+            or 'ubjson' (binary)
         separator : string, optional
             The separator to use between events in the 'properties' format
         interval : int, optional
@@ -614,6 +679,16 @@ class BaseWindow(ESPObject):
             The object to call when the websocket is opened
         on_open : callable, optional
             The object to call when the websocket is closed
+        opcodes : bool, optional
+            Should the event opcodes be included in the ``_opcode`` column
+            of the DataFrames passed to `on_event`?
+        keep_state : bool, optional
+            Should the subscriber maintain the current contents of the
+            window?  By default, this is done in 'updating' mode.
+        shared : bool, optional
+            Should the subscriber share one websocket with the other
+            subscribers of the session?  By default, the
+            ``subscriber.shared`` option is used.
 
         Examples
         --------
@@ -644,11 +719,13 @@ class BaseWindow(ESPObject):
                           interval=interval, schema=schema,
                           on_event=on_event, on_message=on_message,
                           on_error=on_error, on_close=on_close, on_open=on_open,
-                          precision=precision)
+                          precision=precision, opcodes=opcodes, keep_state=keep_state,
+                          shared=shared)
 
     def create_publisher(self, blocksize=1, rate=0, pause=0,
                          dateformat='%Y%m%dT%H:%M:%S.%f', opcode='insert',
-                         format='csv', separator=None):
+                         format='csv', separator=None, queue_size=0,
+                         on_full='block'):
         '''
         Create a publisher for the given window
 
@@ -669,6 +746,12 @@ class BaseWindow(ESPObject):
         opcode : string, optional
             Opcode to use if an input event does not include one:
             'insert', 'upsert', 'delete'
+        queue_size : int, optional
+            The maximum number of records waiting to be sent by a
+            background thread.  If zero, records are sent synchronously.
+        on_full : string, optional
+            What to do when the send queue is full: 'block', 'drop',
+            or 'drop_oldest'
 
         Examples
         --------
@@ -690,12 +773,13 @@ class BaseWindow(ESPObject):
 
         '''
         return Publisher(self, blocksize=blocksize, rate=rate, pause=pause,
-                         dateformat=dateformat, format=format,
-                         separator=separator)
+                         dateformat=dateformat, opcode=opcode, format=format,
+                         separator=separator, queue_size=queue_size,
+                         on_full=on_full)
 
     def publish_events(self, data, blocksize=1, rate=0, pause=0,
                        dateformat='%Y%m%dT%H:%M:%S.%f', opcode='insert',
-                       format=None, separator=None):
+                       format=None, separator=None, chunksize=None):
         '''
         Publish events to the window
 
@@ -718,6 +802,12 @@ class BaseWindow(ESPObject):
             The data format of inputs: 'csv', 'xml', 'json', 'properties'
         separator : string
             The separator string to use between events in 'properties' format
+        chunksize : int, optional
+            Publish the data in pieces rather than as a single message.
+            For DataFrames, this is the number of rows in each message.
+            For files and strings, it is the approximate number of
+            characters in each message; messages are split on event
+            boundaries.  'json' data is always sent as a single message.
 
         Examples
         --------
@@ -731,53 +821,99 @@ class BaseWindow(ESPObject):
 
         >>> win.publish_events(dframe, pause=200)
 
+        Publish a large file in messages of about 1MB.
+
+        >>> win.publish_events('replay.csv', chunksize=2**20)
+
         '''
         data_file = None
 
-        if isinstance(data, pd.DataFrame):
-            index = False
-            if hasattr(self, 'schema') and self.schema.fields:
-                data = data.reset_index().loc[:, list(self.schema.fields.keys())]
+        try:
+            if isinstance(data, pd.DataFrame):
+                chunks = self._iter_dataframe_chunks(data, chunksize)
+                format = 'csv'
+
             else:
-                if len(data.index.names) > 1 or data.index.names[0] is not None:
-                    index = True
-            data = data.to_csv(header=False, index=index, na_rep='')
-            format = 'csv'
+                if isinstance(data, six.string_types):
+                    try:
+                        if os.path.isfile(data):
+                            data_file = open(data, 'r')
+                            data = data_file
+                    except:
+                        pass
+
+                if isinstance(data, six.string_types):
+                    first = data
+                    if chunksize:
+                        data = io.StringIO(data)
+                        first = data.read(chunksize)
+                elif hasattr(data, 'read'):
+                    first = data.read(chunksize or -1)
+                else:
+                    raise TypeError('Unknown data type: %s' % data)
 
-        elif isinstance(data, six.string_types):
-            try:
-                if os.path.isfile(data):
-                    data_file = open(data, 'r')
-                    data = data_file.read()
-            except:
-                pass
-        elif hasattr(data, 'read'):
-            data = data.read()
+                if format is None:
+                    format = guess_event_format(first)
 
-        else:
-            raise TypeError('Unknown data type: %s' % data)
-
-        if format is None:
-            if data.startswith('<'):
-                format = 'xml'
-            elif data.startswith('{'):
-                format = 'json'
-            elif re.match(r'\w+=', data):
-                format = 'properties'
-            else:
-                format = 'csv'
+                if chunksize:
+                    pending = [first]
+
+                    def read(size):
+                        if pending:
+                            return pending.pop()
+                        return data.read(size)
+
+                    chunks = iter_event_chunks(read, chunksize, format=format,
+                                               separator=separator)
+                else:
+                    chunks = [first]
 
-        try:
             pub = self.create_publisher(blocksize=blocksize, rate=rate, pause=pause,
                                         dateformat=dateformat, opcode=opcode,
                                         format=format, separator=separator)
-            pub.send(data)
-            pub.close()
+            try:
+                for chunk in chunks:
+                    pub.send(chunk)
+            finally:
+                pub.close()
 
         finally:
             if data_file is not None:
                 data_file.close()
 
+    def _iter_dataframe_chunks(self, data, chunksize=None):
+        '''
+        Convert a DataFrame to CSV events in row slices
+
+        Only columns that match the window's schema are included.
+
+        Parameters
+        ----------
+        data : DataFrame
+            The events to convert
+        chunksize : int, optional
+            The number of rows in each chunk.  By default, all rows are
+            converted at once.
+
+        Returns
+        -------
+        generator of strings
+
+        '''
+        columns = None
+        index = False
+        if hasattr(self, 'schema') and self.schema.fields:
+            columns = list(self.schema.fields.keys())
+        elif len(data.index.names) > 1 or data.index.names[0] is not None:
+            index = True
+
+        chunksize = chunksize or max(len(data), 1)
+        for start in range(0, len(data), chunksize):
+            chunk = data.iloc[start:start + chunksize]
+            if columns is not None:
+                chunk = chunk.reset_index().loc[:, columns]
+            yield chunk.to_csv(header=False, index=index, na_rep='')
+
     def _get_event_horizon(self, value):
         '''
         Set a timespan or deadline for event collection
@@ -834,7 +970,7 @@ class BaseWindow(ESPObject):
 
     def subscribe(self, mode='streaming', pagesize=50, filter=None,
                   sort=None, interval=None, limit=None, horizon=None, reset=True,
-                  precision=6):
+                  precision=6, shared=None):
         '''
         Subscribe to events
 
@@ -860,7 +996,8 @@ class BaseWindow(ESPObject):
             The floating point precision
         limit : int, optional
             The maximum number of rows of data to keep in the internal
-            DataFrame object.
+            DataFrame object ('streaming' mode only).  In 'updating' mode,
+            the internal DataFrame holds the current contents of the window.
         horizon : int or datetime.datetime or string, optional
             Specifies a condition that stops the subscriber.
             If an int, the subscriber stops after than many events.
@@ -872,6 +1009,10 @@ class BaseWindow(ESPObject):
         reset : bool, optional
             If True, the internal data is reset on subsequent calls
             to the :meth:`subscribe` method.
+        shared : bool, optional
+            Should the subscription share one websocket with the other
+            subscribers of the session?  By default, the
+            ``subscriber.shared`` option is used.
 
         See Also
         --------
@@ -884,13 +1025,22 @@ class BaseWindow(ESPObject):
         if self.data is None or reset:
             self.data = get_dataframe(self)
 
-        state = dict(total=0, limit=limit or sys.maxsize,
-                     horizon=self._get_event_horizon(horizon))
+        state = dict(total=0, horizon=self._get_event_horizon(horizon))
 
         if self.data is None:
             self.data = get_dataframe(self)
 
+        updating = mode == 'updating'
+        if updating:
+            buffer = KeyedBuffer(self.data)
+        else:
+            buffer = ColumnBuffer(self.data, capacity=limit or None)
+
         def on_event(ws, event):
+            opcodes = None
+            if OPCODE_COLUMN in event.columns:
+                opcodes = event[OPCODE_COLUMN]
+                event = event.drop(OPCODE_COLUMN, axis=1)
             if state['horizon'] is not None:
                 for item in state['horizon']:
                     if isinstance(item, int):
@@ -911,15 +1061,21 @@ class BaseWindow(ESPObject):
                 else:
                     args = [event] + list(args)
                     event = method(*args, **kwargs)
-            columns = self.data.columns
-            self.data = pd.concat([self.data, event],
-                                  **CONCAT_OPTIONS)[-state['limit']:][columns]
+            if updating:
+                if opcodes is not None:
+                    opcodes = _align_opcodes(opcodes, event)
+                buffer.append(event, opcodes=opcodes)
+            else:
+                buffer.append(event)
             state['total'] += len(event)
 
+        self._data_buffer = buffer
         self._subscriber = self.create_subscriber(mode=mode, pagesize=pagesize,
                                                   filter=filter, sort=sort,
                                                   interval=interval, format='xml',
-                                                  on_event=on_event, precision=precision)
+                                                  on_event=on_event, precision=precision,
+                                                  opcodes=updating, keep_state=False,
+                                                  shared=shared)
         self._subscriber.start()
 
     def unsubscribe(self):
@@ -934,6 +1090,9 @@ class BaseWindow(ESPObject):
         if self._subscriber is not None:
             self._subscriber.close()
         self._subscriber = None
+        if self._data_buffer is not None:
+            self._data = self._data_buffer.to_frame()
+            self._data_buffer = None
 
     def apply_transformers(self, data):
         '''
@@ -1873,17 +2032,15 @@ class BaseWindow(ESPObject):
             var_generator = functools.partial(var_mapper, mapping=var_generator)
 
         empty = self.apply_transformers(get_dataframe(self))
-        state = dict(events=empty, reset=False)
+        state = dict(events=ColumnBuffer(empty, capacity=max_data, keep='first'),
+                     reset=False)
 
         def on_event(sock, event):
             try:
                 if state['reset']:
                     state['reset'] = False
-                    state['events'] = self.apply_transformers(event)[:max_data]
-                else:
-                    state['events'] = pd.concat([state['events'],
-                                                 self.apply_transformers(event)],
-                                                **CONCAT_OPTIONS)[:max_data]
+                    state['events'].clear()
+                state['events'].append(self.apply_transformers(event))
             except:
                 import traceback
                 traceback.print_exc()
@@ -1916,12 +2073,12 @@ class BaseWindow(ESPObject):
                 state['events'] = None
                 return
 
-            data = state['events']
-            state['reset'] = True
-
-            if data is None:
+            if state['events'] is None:
                 return {}
 
+            data = state['events'].to_frame()
+            state['reset'] = True
+
             out = {}
             for name in x + y + extra:
                 if name in data.index.names:
@@ -27,12 +27,12 @@ import datetime
 import functools
 import itertools
 import os
-import pandas as pd
 import re
 import requests
 import six
 import sys
 import threading
+import time
 import types
 import weakref
 import xml.etree.ElementTree as ET
@@ -51,6 +51,17 @@ from ..utils.rest import get_params
 from ..utils.data import get_project_data, gen_name, get_server_info
 from ..utils.events import get_events, get_dataframe, get_schema
 from ..websocket import createWebSocket
+from ..utils.lazy import lazy_import
+
+pd = lazy_import('pandas')
+
+
+def _strip_suffix(data, suffix):
+    ''' Remove one trailing occurrence of `suffix` from `data` '''
+    if suffix and data.endswith(suffix):
+        return data[:-len(suffix)]
+    return data
+
 
 class Publisher(object):
     '''
@@ -66,15 +77,23 @@ class Publisher(object):
         The data format of inputs: 'csv', 'xml', 'json', 'properties'
     is_active : bool
         Is the web socket currently active?
+    on_full : string
+        What to do when the send queue is full: 'block', 'drop', or
+        'drop_oldest'
     opcode : string
         Opcode to use if an input event does not include one:
         'insert', 'upsert', 'delete'
     pause : int
         Number of milliseconds to pause between each injection of events
+    queue_size : int
+        The maximum number of records waiting in the send queue.
+        If zero, records are sent synchronously.
     rate : int
         Maximum number of events to inject per second
     separator : string
         The separator string to use between events in 'properties' format
+    stats : dict
+        Send queue metrics
     window_schema : Schema
         The schema of the window that was subscribed to
     window_url : string
@@ -99,6 +118,20 @@ class Publisher(object):
         The data format of inputs: 'csv', 'xml', 'json', 'properties'
     separator : string
         The separator string to use between events in 'properties' format
+    queue_size : int, optional
+        The maximum number of records waiting to be sent.  If greater
+        than zero, :meth:`send` only adds the record to a queue and a
+        background thread sends the queued records, joining up to
+        `blocksize` 'csv' or 'properties' records into each message.
+    on_full : string, optional
+        What to do when the send queue is full: 'block' waits for space,
+        'drop' discards the new record, and 'drop_oldest' discards the
+        oldest queued record.
+
+    Notes
+    -----
+    Errors that occur in the background thread are raised by the next
+    call to :meth:`send`, :meth:`flush`, or :meth:`close`.
 
     Examples
     --------
@@ -115,6 +148,11 @@ class Publisher(object):
 
     >>> pub.close()
 
+    Create a publisher that queues up to 10000 records and sends them
+    in blocks of 100 from a background thread.
+
+    >>> pub = Publisher(window, blocksize=100, queue_size=10000)
+
     Returns
     -------
     :class:`Publisher`
@@ -123,7 +161,9 @@ class Publisher(object):
 
     def __init__(self, window, blocksize=1, rate=0, pause=0,
                  dateformat='%Y%m%dT%H:%M:%S.%f', opcode='insert',
-                 format='csv', separator=None):
+                 format='csv', separator=None, queue_size=0, on_full='block'):
+        if on_full not in ['block', 'drop', 'drop_oldest']:
+            raise ValueError('on_full must be one of: block, drop, drop_oldest')
         self.blocksize = int(blocksize)
         self.rate = int(rate)
         self.pause = int(pause)
@@ -135,6 +175,17 @@ class Publisher(object):
         self.window_fullname = window.fullname
         self.window_schema = get_schema(window, window)
         self.window_url = window.publisher_url
+        self.queue_size = int(queue_size or 0)
+        self.on_full = on_full
+
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._sender = None
+        self._closing = False
+        self._error = None
+        self._sending = 0
+        self._metrics = dict(queued=0, sent=0, dropped=0, messages=0, max_depth=0,
+                             total_latency=0.0, max_latency=0.0)
 
         if not verify_window(window):
             raise ESPError('There is no window at %s' % window.fullname)
@@ -152,6 +203,11 @@ class Publisher(object):
         self._ws = createWebSocket(self.url,self.session, headers=headers, ws4py=False)
         self._ws.connect()
 
+        if self.queue_size > 0:
+            self._sender = threading.Thread(target=self._run_sender)
+            self._sender.daemon = True
+            self._sender.start()
+
     @property
     def url(self):
         '''
@@ -184,10 +240,93 @@ class Publisher(object):
         '''
         return self._ws is not None
 
+    @property
+    def stats(self):
+        '''
+        Send queue metrics
+
+        The metrics include the current and maximum queue depths, the
+        number of records queued, sent, and dropped, the number of
+        messages sent, and the average and maximum number of seconds
+        records waited in the queue.
+
+        Returns
+        -------
+        dict
+
+        '''
+        with self._cond:
+            out = dict(self._metrics)
+            out['depth'] = len(self._queue)
+        total = out.pop('total_latency')
+        out['avg_latency'] = out['sent'] and (total / out['sent']) or 0.0
+        return out
+
+    @property
+    def _record_separator(self):
+        ''' The separator used to join queued records, if they can be joined '''
+        fmt = (self.format or 'csv').lower()
+        if fmt == 'csv':
+            return '\n'
+        if fmt == 'properties':
+            return self.separator or '\n\n'
+
+    def _check_error(self):
+        ''' Raise any error from the sender thread '''
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _run_sender(self):
+        ''' Send queued records until the publisher is closed '''
+        separator = self._record_separator
+        blocksize = separator is not None and max(self.blocksize, 1) or 1
+        while True:
+            with self._cond:
+                while not self._queue and not self._closing:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                items = [self._queue.popleft()
+                         for _ in range(min(blocksize, len(self._queue)))]
+                self._sending = len(items)
+                self._cond.notify_all()
+
+            try:
+                if len(items) == 1:
+                    self._ws.send(items[0][1])
+                else:
+                    self._ws.send(separator.join(_strip_suffix(x[1], separator)
+                                                 for x in items))
+            except Exception as exc:
+                with self._cond:
+                    self._error = exc
+                    self._metrics['dropped'] += len(items) + len(self._queue)
+                    self._queue.clear()
+                    self._sending = 0
+                    self._cond.notify_all()
+                continue
+
+            now = time.time()
+            with self._cond:
+                metrics = self._metrics
+                metrics['sent'] += len(items)
+                metrics['messages'] += 1
+                for item in items:
+                    latency = now - item[0]
+                    metrics['total_latency'] += latency
+                    if latency > metrics['max_latency']:
+                        metrics['max_latency'] = latency
+                self._sending = 0
+                self._cond.notify_all()
+
     def send(self, data):
         '''
         Send data to the web socket
 
+        If the publisher has a send queue, the data is added to the
+        queue and sent by a background thread.
+
         Examples
         --------
         Create the publisher instance using CSV and an event rate of 200
@@ -204,15 +343,77 @@ class Publisher(object):
         data : string
             The data to send
 
+        Returns
+        -------
+        bool
+            If the publisher has a send queue, False if the record
+            was dropped because the queue is full
+
         '''
         if self._ws is None:
             raise ValueError('The connection is closed')
-        return self._ws.send(data)
+
+        if self._sender is None:
+            return self._ws.send(data)
+
+        with self._cond:
+            self._check_error()
+            metrics = self._metrics
+            while len(self._queue) >= self.queue_size:
+                if self.on_full == 'drop':
+                    metrics['dropped'] += 1
+                    return False
+                if self.on_full == 'drop_oldest':
+                    self._queue.popleft()
+                    metrics['dropped'] += 1
+                    break
+                self._cond.wait()
+                self._check_error()
+            self._queue.append((time.time(), data))
+            metrics['queued'] += 1
+            if len(self._queue) > metrics['max_depth']:
+                metrics['max_depth'] = len(self._queue)
+            self._cond.notify_all()
+
+        return True
+
+    def flush(self, timeout=None):
+        '''
+        Wait for all queued records to be sent
+
+        Parameters
+        ----------
+        timeout : float, optional
+            The maximum number of seconds to wait
+
+        Returns
+        -------
+        bool
+            False if the timeout expired before the queue was empty
+
+        '''
+        if self._sender is None:
+            return True
+        end = None
+        if timeout is not None:
+            end = time.time() + timeout
+        with self._cond:
+            while self._queue or self._sending:
+                remaining = None
+                if end is not None:
+                    remaining = end - time.time()
+                    if remaining <= 0:
+                        return False
+                self._cond.wait(remaining)
+            self._check_error()
+        return True
 
     def close(self):
         '''
         Close the web socket connection
 
+        Any queued records are sent before the connection is closed.
+
         Examples
         --------
         Create the publisher instance using CSV and an event rate of 200
@@ -229,6 +430,13 @@ class Publisher(object):
         >>> pub.close()
 
         '''
+        if self._sender is not None:
+            with self._cond:
+                self._closing = True
+                self._cond.notify_all()
+            self._sender.join()
+            self._sender = None
         if self._ws is not None:
             self._ws.close()
             self._ws = None
+        self._check_error()
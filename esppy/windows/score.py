@@ -19,11 +19,13 @@
 from __future__ import print_function, division, absolute_import, unicode_literals
 
 import os
-import pandas as pd
 import six
 from .base import BaseWindow, attribute
 from .features import SchemaFeature, ModelsFeature, ConnectorsFeature
 from .utils import get_args, ensure_element
+from ..utils.lazy import lazy_import
+
+pd = lazy_import('pandas')
 
 
 class ScoreWindow(BaseWindow, SchemaFeature, ModelsFeature, ConnectorsFeature):
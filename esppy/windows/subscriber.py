@@ -27,7 +27,6 @@ import datetime
 import functools
 import itertools
 import os
-import pandas as pd
 import re
 import requests
 import six
@@ -40,7 +39,7 @@ from ..utils.authorization import Authorization
 from six.moves import urllib
 from .utils import verify_window
 from ..base import ESPObject, attribute
-from ..config import get_option, CONCAT_OPTIONS
+from ..config import get_option
 from ..exceptions import ESPError
 from ..schema import Schema
 from ..utils.keyword import dekeywordify
@@ -48,8 +47,14 @@ from ..utils import xml
 from ..utils.notebook import scale_svg
 from ..utils.rest import get_params
 from ..utils.data import get_project_data, gen_name, get_server_info
-from ..utils.events import get_events, get_dataframe, get_schema
+from ..utils.buffers import KeyedBuffer
+from ..utils.events import get_events, get_dataframe, get_schema, OPCODE_COLUMN
+from ..espapi import codec
 from ..websocket import createWebSocket
+from .subscriptions import get_subscription_manager
+from ..utils.lazy import lazy_import
+
+pd = lazy_import('pandas')
 
 class Subscriber(object):
     '''
@@ -59,22 +64,30 @@ class Subscriber(object):
     ----------
     callbacks : dict
         The dictionary of callback functions
+    data : DataFrame
+        The current contents of the window ('updating' mode only)
     filter : string
         Functional filter to subset events
     format : string, optional
-        The format of the received data: 'xml', 'json', 'csv', 'properties'
+        The format of the received data: 'xml', 'json', 'csv', 'properties',
+        or 'ubjson' (binary)
     interval : int
         Interval between event sends in milliseconds
     is_active : bool
         Is the web socket currently active?
     mode : string
         The mode of subscriber: 'updating' or 'streaming'
+    opcodes : bool
+        Are the event opcodes included in the ``_opcode`` column?
     pagesize : int
         The maximum number of events in a page
     separator : string, optional
         The separator to use between events in the 'properties' format
     schema : bool
         Should the schema be sent with the first event?
+    shared : bool
+        Is the subscription multiplexed over the connection shared
+        by the subscribers of the session?
     sort : string
         Sort order for the events (updating mode only)
     window_schema : Schema
@@ -95,7 +108,8 @@ class Subscriber(object):
     sort : string, optional
         Sort order for the events (updating mode only)
     format : string, optional
-        The format of the received data: 'xml', 'json', 'csv', 'properties'
+        The format of the received data: 'xml', 'json', 'csv', 'properties',
+        or 'ubjson' (binary)
     separator : string, optional
         The separator to use between events in the 'properties' format
     interval : int, optional
@@ -115,6 +129,18 @@ class Subscriber(object):
         The object to call when the websocket is opened
     on_open : callable, optional
         The object to call when the websocket is closed
+    opcodes : bool, optional
+        Should the event opcodes be included in the ``_opcode`` column
+        of the DataFrames passed to `on_event`?
+    keep_state : bool, optional
+        Should the current contents of the window be maintained in
+        :attr:`data` by applying the opcode of each event?  By default,
+        this is done in 'updating' mode.
+    shared : bool, optional
+        Should the subscription share one websocket with the other
+        subscribers of the session?  Shared subscriptions always receive
+        binary (ubjson) events and do not verify the window before
+        subscribing.  By default, the ``subscriber.shared`` option is used.
 
     Examples
     --------
@@ -144,8 +170,17 @@ class Subscriber(object):
     def __init__(self, window, mode='updating', pagesize=50, filter=None,
                  sort=None, format='xml', separator=None, interval=None,
                  schema=False, on_event=None, on_message=None, on_error=None,
-                 on_close=None, on_open=None, precision=6):
+                 on_close=None, on_open=None, precision=6, opcodes=False,
+                 keep_state=None, shared=None):
         self._ws = None
+        self._subscription = None
+        self._state = None
+        self._status = None
+        self._window = window
+        self._server_info = None
+        self._window_schema = None
+        self._event_schema = None
+        self._empty = None
         self.mode = mode
         self.pagesize = pagesize
         self.filter = filter
@@ -155,9 +190,12 @@ class Subscriber(object):
         self.interval = interval
         self.precision = precision
         self.schema = schema
-        self.server_info = get_server_info(window)
+        self.opcodes = opcodes
+        self.keep_state = keep_state
+        if shared is None:
+            shared = get_option('subscriber.shared')
+        self.shared = shared
         self.session = window.session
-        self.window_schema = get_schema(window, window)
         self.window_url = window.subscriber_url
         self.window_fullname = window.fullname
         self.callbacks = {k: v for k, v in dict(on_message=on_message,
@@ -189,6 +227,54 @@ class Subscriber(object):
         url_params = '&'.join(['%s=%s' % (k, v) for k, v in sorted(url_params.items())])
         return self.window_url + '?' + url_params
 
+    @property
+    def server_info(self):
+        '''
+        Information about the ESP server
+
+        Returns
+        -------
+        dict
+
+        '''
+        if self._server_info is None:
+            self._server_info = get_server_info(self._window)
+        return self._server_info
+
+    @property
+    def window_schema(self):
+        '''
+        The schema of the window being subscribed to
+
+        Returns
+        -------
+        :class:`Schema`
+
+        '''
+        if self._window_schema is None:
+            self._window_schema = get_schema(self._window, self._window)
+        return self._window_schema
+
+    @property
+    def data(self):
+        '''
+        The current contents of the window
+
+        The contents are maintained from the insert, update, upsert,
+        and delete events received in 'updating' mode.
+
+        Returns
+        -------
+        :class:`pandas.DataFrame`
+            If the subscriber keeps the window state
+        None
+            If the subscriber does not keep the window state
+
+        '''
+        if self._state is None:
+            return None
+        return self._state.to_frame()
+
     @property
     def is_active(self):
         '''
@@ -199,7 +285,14 @@ class Subscriber(object):
         bool
 
         '''
-        return self._ws is not None
+        return self._ws is not None or self._subscription is not None
+
+    def _update(self, message):
+        ''' Send changed settings to the server '''
+        if self._ws is not None:
+            self._ws.send(message)
+        elif self._subscription is not None:
+            self._subscription.set()
 
     @property
     def mode(self):
@@ -217,8 +310,8 @@ class Subscriber(object):
     def mode(self, value):
         ''' Set the mode of the subscriber '''
         self._mode = value
-        if self._ws is not None and self._mode is not None:
-            self._ws.send('<properties mode="%s"></properties>' % self._mode)
+        if self._mode is not None:
+            self._update('<properties mode="%s"></properties>' % self._mode)
 
     @property
     def pagesize(self):
@@ -236,8 +329,8 @@ class Subscriber(object):
     def pagesize(self, value):
         ''' Set the pagesize '''
         self._pagesize = value
-        if self._ws is not None and self._pagesize is not None:
-            self._ws.send('<properties pagesize="%s"></properties>' % self._pagesize)
+        if self._pagesize is not None:
+            self._update('<properties pagesize="%s"></properties>' % self._pagesize)
 
     @property
     def sort(self):
@@ -255,8 +348,8 @@ class Subscriber(object):
     def sort(self, value):
         ''' Set the sort order for the events '''
         self._sort = value
-        if self._ws is not None and self._sort is not None:
-            self._ws.send('<properties sort="%s"></properties>' % self._sort)
+        if self._sort is not None:
+            self._update('<properties sort="%s"></properties>' % self._sort)
 
     @property
     def interval(self):
@@ -274,8 +367,8 @@ class Subscriber(object):
     def interval(self, value):
         ''' Set the event interval '''
         self._interval = value
-        if self._ws is not None and self._interval is not None:
-            self._ws.send('<properties interval="%s"></properties>' % self._interval)
+        if self._interval is not None:
+            self._update('<properties interval="%s"></properties>' % self._interval)
 
     @property
     def filter(self):
@@ -293,8 +386,8 @@ class Subscriber(object):
     def filter(self, value):
         ''' Set the filter string '''
         self._filter = value
-        if self._ws is not None and self._filter is not None:
-            self._ws.send(('<properties><filter><![CDATA[%s]]>'
+        if self._filter is not None:
+            self._update(('<properties><filter><![CDATA[%s]]>'
                            '</filter></properties>') % self._filter)
 
     @property
@@ -313,8 +406,8 @@ class Subscriber(object):
     def separator(self, value):
         ''' Set the separator string '''
         self._separator = value
-        if self._ws is not None and self._separator is not None:
-            self._ws.send('<properties separator="%s"></properties>' % self._separator)
+        if self._separator is not None:
+            self._update('<properties separator="%s"></properties>' % self._separator)
 
     def start(self):
         '''
@@ -336,66 +429,24 @@ class Subscriber(object):
         >>> sub.start()
 
         '''
-        if self._ws is not None:
+        if self.is_active:
             return
 
-        if not verify_window(self.window_fullname, session=self.session):
-            raise ESPError('There is no window at %s' % self.window_fullname)
-
-        state = dict(status=None, schema=None, dataframe=None)
-
-        def on_message(sock, message):
-            # HTTP status messages
-            if state['status'] is None and re.match(r'^\s*\w+\s*\:\s*\d+\s*\n', message):
-                state['status'] = int(re.match(r'^\s*\w+\s*\:\s*(\d+)', message).group(1))
-                if state['status'] >= 400:
-                    raise ESPError('Subscriber message returned with status: %s' %
-                                   state['status'])
-                return
-
-            if state['schema'] is None:
-                if message.startswith('<schema>'):
-                    state['schema'] = Schema.from_xml(message)
-
-                elif re.match(r'^\s*{\s*["\']?schema["\']?\s*:', message):
-                    state['schema'] = Schema.from_json(message)
+        self._event_schema = None
+        self._empty = None
 
-                else:
-                    raise ValueError('Unrecognized schema definition format: %s...' %
-                                     message[:40])
+        if self.shared:
+            manager = get_subscription_manager(self.session)
+            self._subscription = manager.subscribe(self, self._window)
+            return
 
-                state['dataframe'] = get_dataframe(state['schema'])
-                if self.schema:
-                    return message
-                return
+        if not verify_window(self.window_fullname, session=self.session):
+            raise ESPError('There is no window at %s' % self.window_fullname)
 
-            if 'on_message' in self.callbacks:
-                self.callbacks['on_message'](sock, message)
+        # Fetched up front rather than from the websocket thread
+        self.server_info
 
-            if 'on_event' in self.callbacks:
-                try:
-                    df = get_events(state['schema'], message,
-                                    single=True, format=self.format,
-                                    separator=self.separator,
-                                    server_info=self.server_info)
-                    #self.callbacks['on_event'](sock, pd.concat([state['dataframe'], df], **CONCAT_OPTIONS))
-                    self.callbacks['on_event'](sock, pd.concat([state['dataframe'], df]))
-                except:
-                    import traceback
-                    traceback.print_exc()
-                    raise
-
-        def on_error(sock, error):
-            if 'on_error' in self.callbacks:
-                self.callbacks['on_error'](sock, error)
-
-        def on_open(sock):
-            if 'on_open' in self.callbacks:
-                self.callbacks['on_open'](sock)
-
-        def on_close(sock, code, reason=None):
-            if 'on_close' in self.callbacks:
-                self.callbacks['on_close'](sock, code, reason=None)
+        self._status = None
 
         if get_option('debug.requests'):
             sys.stderr.write('WEBSOCKET %s\n' % self.url)
@@ -409,10 +460,11 @@ class Subscriber(object):
 
         self._ws = createWebSocket(self.url,
                                    self.session,
-                                   on_message=on_message,
-                                   on_error=on_error,
-                                   on_open=on_open,
-                                   on_close=on_close,
+                                   on_message=self._on_text,
+                                   on_data=self._on_data,
+                                   on_error=self._on_error,
+                                   on_open=self._on_open,
+                                   on_close=self._on_close,
                                    headers=headers,
                                    ws4py=False)
 
@@ -440,5 +492,112 @@ class Subscriber(object):
         if self._ws is not None:
             self._ws.close()
             self._ws = None
+        if self._subscription is not None:
+            self._subscription.manager.unsubscribe(self._subscription)
+            self._subscription = None
 
     close = stop
+
+    def _on_text(self, sock, message):
+        ''' Handle a text message of the websocket '''
+        # HTTP status messages
+        if self._status is None and re.match(r'^\s*\w+\s*\:\s*\d+\s*\n', message):
+            self._status = int(re.match(r'^\s*\w+\s*\:\s*(\d+)', message).group(1))
+            if self._status >= 400:
+                raise ESPError('Subscriber message returned with status: %s' %
+                               self._status)
+            return
+
+        if self._event_schema is None:
+            if message.startswith('<schema>'):
+                self._set_schema(Schema.from_xml(message))
+
+            elif re.match(r'^\s*{\s*["\']?schema["\']?\s*:', message):
+                self._set_schema(Schema.from_json(message))
+
+            else:
+                raise ValueError('Unrecognized schema definition format: %s...' %
+                                 message[:40])
+
+            if self.schema:
+                return message
+            return
+
+        self._on_message(sock, message)
+        self._process_events(sock, message)
+
+    def _on_data(self, sock, data):
+        ''' Handle a binary message of the websocket '''
+        # Binary messages are only sent in the 'ubjson' format
+        if self._event_schema is None:
+            message = codec.JsonDecoder(data).data
+            if not isinstance(message, dict) or 'schema' not in message:
+                raise ValueError('Unrecognized binary schema definition')
+            self._set_schema(Schema.from_ubjson(message))
+            return
+
+        self._process_events(sock, data)
+
+    def _set_schema(self, schema):
+        ''' Set the schema of the events and reset the window state '''
+        self._event_schema = schema
+        self._empty = get_dataframe(schema)
+        keep_state = self.keep_state
+        if keep_state is None:
+            keep_state = self.mode == 'updating'
+        if keep_state:
+            self._state = KeyedBuffer(self._empty)
+
+    def _process_events(self, sock, message, format=None, reset=False):
+        '''
+        Convert events to a DataFrame and deliver it
+
+        Parameters
+        ----------
+        sock : websocket
+            The websocket the events were received on
+        message : string or bytes or dict
+            The encoded events
+        format : string, optional
+            The format of the events.  By default, :attr:`format` is used.
+        reset : bool, optional
+            Do the events replace the current window state?
+
+        '''
+        if 'on_event' not in self.callbacks and self._state is None:
+            return
+        try:
+            df = get_events(self._event_schema, message,
+                            single=True, format=format or self.format,
+                            separator=self.separator,
+                            server_info=self._server_info,
+                            opcodes=self.opcodes or self._state is not None)
+            if self._state is not None:
+                if reset:
+                    self._state.clear()
+                self._state.append(df)
+                if not self.opcodes and OPCODE_COLUMN in df.columns:
+                    df = df.drop(OPCODE_COLUMN, axis=1)
+            if 'on_event' in self.callbacks:
+                #self.callbacks['on_event'](sock, pd.concat([self._empty, df], **CONCAT_OPTIONS))
+                self.callbacks['on_event'](sock, pd.concat([self._empty, df]))
+        except:
+            import traceback
+            traceback.print_exc()
+            raise
+
+    def _on_message(self, sock, message):
+        if 'on_message' in self.callbacks:
+            self.callbacks['on_message'](sock, message)
+
+    def _on_error(self, sock, error):
+        if 'on_error' in self.callbacks:
+            self.callbacks['on_error'](sock, error)
+
+    def _on_open(self, sock):
+        if 'on_open' in self.callbacks:
+            self.callbacks['on_open'](sock)
+
+    def _on_close(self, sock, code, reason=None):
+        if 'on_close' in self.callbacks:
+            self.callbacks['on_close'](sock, code, reason=None)
@@ -0,0 +1,313 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+''' ESP Shared Window Subscriptions '''
+
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import threading
+import xml.etree.ElementTree as ET
+from ..espapi import tools
+from ..schema import Schema
+
+
+class Subscription(object):
+    '''
+    Subscription to a window over a shared connection
+
+    The connection routes the schema and event messages carrying the
+    ID of the subscription to this object, which passes them on to
+    its subscriber.
+
+    Parameters
+    ----------
+    manager : SubscriptionManager
+        The manager that owns the shared connection
+    subscriber : Subscriber
+        The subscriber that receives the events
+    path : string
+        The path of the window: 'project/contquery/window'
+
+    Returns
+    -------
+    :class:`Subscription`
+
+    '''
+
+    def __init__(self, manager, subscriber, path):
+        self._id = tools.guid()
+        self._type = None
+        self.manager = manager
+        self.subscriber = subscriber
+        self.path = path
+
+    @property
+    def id(self):
+        ''' The ID used to route messages to the subscription '''
+        return self._id
+
+    @property
+    def is_open(self):
+        ''' Has the subscription request been sent to the server? '''
+        return self._type is not None
+
+    @property
+    def request_type(self):
+        '''
+        The type of request for the subscriber mode
+
+        Returns
+        -------
+        string
+            'event-stream' for streaming subscribers, 'event-collection'
+            for updating subscribers
+
+        '''
+        if self.subscriber.mode == 'streaming':
+            return 'event-stream'
+        return 'event-collection'
+
+    def get_request(self, action='set'):
+        '''
+        Return the request that sets up the subscription
+
+        Parameters
+        ----------
+        action : string, optional
+            The request action
+
+        Returns
+        -------
+        dict
+
+        '''
+        sub = self.subscriber
+        request = dict(id=self._id, action=action, window=self.path,
+                       schema=True, format='ubjson',
+                       interval=sub.interval or 0, filter=sub.filter or '')
+        if self.request_type == 'event-collection':
+            if sub.pagesize is not None:
+                request['pagesize'] = sub.pagesize
+            if sub.sort is not None:
+                request['sort'] = sub.sort
+        return {self.request_type: request}
+
+    def open(self):
+        '''
+        Send the subscription request to the server
+
+        The request is only sent once, since both the subscribing thread
+        and the completed handshake of the connection can open it.
+
+        '''
+        with self.manager._lock:
+            if self._type is not None:
+                return
+            self._type = self.request_type
+            self.manager.send(self.get_request())
+        self.subscriber._on_open(self.manager.websocket)
+
+    def set(self):
+        ''' Send the current subscriber settings to the server '''
+        if not self.is_open:
+            return
+        if self._type != self.request_type:
+            self.close()
+            self.open()
+            return
+        self.manager.send(self.get_request())
+
+    def close(self):
+        ''' Remove the subscription from the server '''
+        if self._type is not None:
+            self.manager.send({self._type: dict(id=self._id, action='close')})
+            self._type = None
+
+    def clear(self):
+        ''' The shared connection was closed '''
+        self._type = None
+        self.subscriber._on_close(self.manager.websocket, None)
+
+    def setSchemaFromJson(self, data):
+        self.subscriber._set_schema(Schema.from_ubjson(dict(schema=data),
+                                                       session=self.subscriber.session))
+
+    def setSchemaFromXml(self, data):
+        self.subscriber._set_schema(Schema.from_xml(data,
+                                                    session=self.subscriber.session))
+
+    def events(self, data):
+        # Event collections send the entire page along with its info
+        self._deliver(dict(events=data), 'ubjson', reset='info' in data)
+
+    def eventsXml(self, data):
+        self._deliver(ET.tostring(data), 'xml', reset=data.get('page') is not None)
+
+    def _deliver(self, message, format, reset=False):
+        # Errors are reported to this subscriber only, so that they do
+        # not stop the connection shared with the other subscriptions
+        sock = self.manager.websocket
+        try:
+            self.subscriber._on_message(sock, message)
+            self.subscriber._process_events(sock, message, format=format,
+                                            reset=reset)
+        except Exception as exc:
+            self.subscriber._on_error(sock, exc)
+
+    def info(self, data):
+        pass
+
+    def deliverInfo(self, data):
+        pass
+
+
+class SubscriptionManager(object):
+    '''
+    Manager of the window subscriptions that share one connection
+
+    All subscriptions of a session are multiplexed over a single
+    websocket to the server.  Each subscription sends its own
+    event-collection or event-stream request, and the server messages
+    are routed back to it by ID.  The connection is opened with the
+    first subscription and closed with the last one.
+
+    Parameters
+    ----------
+    session : requests.Session
+        The ESP session object
+
+    Returns
+    -------
+    :class:`SubscriptionManager`
+
+    '''
+
+    def __init__(self, session=None):
+        self.session = session
+        self._connection = None
+        self._lock = threading.RLock()
+
+    @property
+    def connection(self):
+        ''' The shared :class:`ServerConnection` '''
+        return self._connection
+
+    @property
+    def websocket(self):
+        ''' The websocket of the shared connection '''
+        if self._connection is None:
+            return None
+        return self._connection._websocket
+
+    @property
+    def subscriptions(self):
+        ''' The active subscriptions '''
+        if self._connection is None:
+            return []
+        return list(self._connection._datasources.values())
+
+    def subscribe(self, subscriber, window):
+        '''
+        Add a subscription to the shared connection
+
+        Parameters
+        ----------
+        subscriber : Subscriber
+            The subscriber that receives the events
+        window : Window
+            The window to subscribe to
+
+        Returns
+        -------
+        :class:`Subscription`
+
+        '''
+        with self._lock:
+            conn = self._get_connection(window)
+            subscription = Subscription(self, subscriber, window.path)
+            conn._datasources[subscription.id] = subscription
+            if conn.isHandshakeComplete:
+                subscription.open()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        '''
+        Remove a subscription from the shared connection
+
+        The connection is closed when no subscriptions remain.
+
+        Parameters
+        ----------
+        subscription : Subscription
+            The subscription to remove
+
+        '''
+        with self._lock:
+            conn = self._connection
+            if conn is None:
+                return
+            conn._datasources.pop(subscription.id, None)
+            if conn.isHandshakeComplete:
+                subscription.close()
+            if not conn._datasources and conn.isConnected:
+                conn._autoReconnect = False
+                conn.stop()
+                self._connection = None
+
+    def send(self, message):
+        '''
+        Send a request over the shared connection
+
+        Parameters
+        ----------
+        message : dict
+            The request to send
+
+        '''
+        if self._connection is not None:
+            self._connection.send(message)
+
+    def _get_connection(self, obj):
+        if self._connection is None:
+            # Imported here since the espapi connections import the windows
+            from ..espapi.connections import ServerConnection
+            self._connection = ServerConnection(obj, None, columns=True)
+            self._connection.start()
+        return self._connection
+
+
+def get_subscription_manager(session):
+    '''
+    Return the subscription manager for the given session
+
+    Parameters
+    ----------
+    session : requests.Session
+        The ESP session object
+
+    Returns
+    -------
+    :class:`SubscriptionManager`
+
+    '''
+    manager = getattr(session, 'subscription_manager', None)
+    if manager is None:
+        manager = SubscriptionManager(session)
+        if session is not None:
+            session.subscription_manager = manager
+    return manager
@@ -55,6 +55,9 @@ setup(
         'ws4py',
         # 'wsaccel',
     ],
+    extras_require={
+        'aio': ['aiohttp'],
+    },
     classifiers=[
         'Development Status :: 5 - Production/Stable',
         'Environment :: Console',